@@ -0,0 +1,129 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from straw.lpc import ext_lpc, steps
+
+"""
+LPC prediction microbenchmark
+Compares the throughput of the order-specialized residual and restoration kernels with the generic ones
+in samples per second, the frames are strided views of an interleaved buffer like in the codec
+Run with: PYTHONPATH=src python benchmarks/lpc_throughput.py
+"""
+
+
+def signal(channels: int, samples: int, seed: int = 0) -> np.array:
+    """
+    Generate a tonal signal with a random walk, similar to a recording
+    :param channels: number of channels
+    :param samples: samples in each channel
+    :param seed: random seed
+    :return: (samples, channels) int16 interleaved signal
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(samples)
+    channels = [3000 * np.sin(2 * np.pi * (220 + 110 * c) * t / 48000) + np.cumsum(rng.normal(0, 20, samples))
+                for c in range(channels)]
+    return np.clip(np.stack(channels, axis=1), -32768, 32767).astype(np.int16)
+
+
+def coefficients(data: np.array, order: int, precision: int = 12) -> (np.array, int):
+    """
+    Quantized LPC coefficients of the signal, see lpc.steps.compute_lpc
+    :param data: (samples, channels) signal
+    :param order: LPC order
+    :param precision: precision of the coefficients in bits
+    :return: tuple(qlp, shift)
+    """
+    qlp, _, shift = steps.quantize_lpc_cython(steps.compute_lpc(list(data.T), order), precision)
+    return qlp, shift
+
+
+def residual_throughput(kernel: callable, data: np.array, blocksize: int, qlp: np.array, shift: int,
+                        repeat: int) -> float:
+    """
+    Measure the throughput of a residual kernel
+    :param kernel: kernel with the signature of ext_lpc.compute_residual
+    :param data: (samples, channels) signal
+    :param blocksize: samples in each frame
+    :param qlp: quantized coefficients
+    :param shift: quantization shift
+    :param repeat: number of repetitions, the best one is used
+    :return: samples per second
+    """
+    residuals = np.zeros_like(data)
+    frames = [(data[i:i + blocksize, c], residuals[i:i + blocksize, c])
+              for i in range(0, data.shape[0], blocksize) for c in range(data.shape[1])]
+    best = np.inf
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        for frame, residual in frames:
+            kernel(frame, residual, qlp, shift)
+        best = min(best, timeit.default_timer() - start)
+    return data.size / best
+
+
+def restore_throughput(kernel: callable, data: np.array, blocksize: int, qlp: np.array, shift: int,
+                       repeat: int) -> float:
+    """
+    Measure the throughput of a restoration kernel
+    :param kernel: kernel with the signature of ext_lpc.restore_signal
+    :param data: (samples, channels) signal
+    :param blocksize: samples in each frame
+    :param qlp: quantized coefficients
+    :param shift: quantization shift
+    :param repeat: number of repetitions, the best one is used
+    :return: samples per second
+    """
+    coded = data.copy()
+    for i in range(0, data.shape[0], blocksize):
+        for c in range(data.shape[1]):
+            ext_lpc.compute_residual(data[i:i + blocksize, c], coded[i:i + blocksize, c], qlp, shift)
+    buffer = np.empty_like(coded)
+    frames = [buffer[i:i + blocksize, c] for i in range(0, data.shape[0], blocksize) for c in range(data.shape[1])]
+    best = np.inf
+    for _ in range(repeat):
+        buffer[:] = coded
+        start = timeit.default_timer()
+        for frame in frames:
+            kernel(frame, qlp, shift)
+        best = min(best, timeit.default_timer() - start)
+    if not np.array_equal(buffer, data):
+        raise RuntimeError("The signal was not restored")
+    return data.size / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LPC prediction microbenchmark")
+    parser.add_argument("--channels", type=int, default=8, help="Number of channels")
+    parser.add_argument("--seconds", type=float, default=4, help="Length of the signal at 48 kHz")
+    parser.add_argument("--blocksize", type=int, default=4096, help="Samples in each frame")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions")
+    args = parser.parse_args()
+
+    data = signal(args.channels, int(args.seconds * 48000))
+    kernels = {
+        "residual": (residual_throughput, {
+            "generic": ext_lpc.compute_residual_generic,
+            "specialized": ext_lpc.compute_residual,
+        }),
+        "restore": (restore_throughput, {
+            "generic": ext_lpc.restore_signal_generic,
+            "specialized": ext_lpc.restore_signal,
+        }),
+    }
+
+    print(f"{'order':>8} {'direction':>10} {'kernel':>12} {'Msamples/s':>12} {'speedup':>8}")
+    for order in (4, 8, 12, 16, 20, 32):
+        qlp, shift = coefficients(data, order)
+        for direction, (throughput, variants) in kernels.items():
+            baseline = None
+            for name, kernel in variants.items():
+                result = throughput(kernel, data, args.blocksize, qlp, shift, args.repeat)
+                baseline = baseline or result
+                print(f"{order:>8} {direction:>10} {name:>12} {result / 1e6:>12.2f} {result / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import straw
+from straw.io.straw import StrawFormatReader
+
+"""
+Reader memory benchmark
+Measures the peak heap usage of loading a Straw file compared to the size of the file and the samplebuffer
+Run with: PYTHONPATH=src python benchmarks/reader_memory.py [-i FILE.straw]
+"""
+
+
+def synthetic_file(target: Path, channels: int, seconds: int, sample_rate: int = 48000):
+    """
+    Encode a synthetic multichannel signal into the given file
+    :param target: target Straw file
+    :param channels: number of channels
+    :param seconds: length of the signal in seconds
+    :param sample_rate: sample rate of the signal
+    :return: None
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(seconds * sample_rate)
+    base = 4000 * np.sin(2 * np.pi * 440 * t / sample_rate) + rng.normal(0, 300, t.shape[0])
+    data = np.stack([base + rng.normal(0, 100, t.shape[0]) for _ in range(channels)], axis=1).astype(np.int16)
+    straw.write(target, data, sample_rate)
+
+
+def measure(input_file: Path):
+    """
+    Load the given file and report the traced peak memory
+    :param input_file: Straw file
+    :return: None
+    """
+    tracemalloc.start()
+    start = timeit.default_timer()
+    reader = StrawFormatReader(show_progress=False)
+    reader.load(input_file)
+    stop = timeit.default_timer()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    file_size = input_file.stat().st_size
+    buffer_size = reader.get_buffer().nbytes
+    mib = 1 << 20
+    print(f"File size:          {file_size / mib:9.2f} MiB")
+    print(f"Samplebuffer size:  {buffer_size / mib:9.2f} MiB")
+    print(f"Peak traced memory: {peak / mib:9.2f} MiB")
+    print(f"Peak minus buffer:  {(peak - buffer_size) / mib:9.2f} MiB "
+          f"({(peak - buffer_size) / file_size:.2f}x file size)")
+    print(f"Load time:          {stop - start:9.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Straw reader memory benchmark")
+    parser.add_argument("-i", "--input", dest="input_file", type=str, help="Existing Straw file")
+    parser.add_argument("--channels", type=int, default=8, help="Channels of the synthetic signal")
+    parser.add_argument("--seconds", type=int, default=60, help="Length of the synthetic signal")
+    args = parser.parse_args()
+
+    if args.input_file:
+        measure(Path(args.input_file))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / "benchmark.straw"
+        synthetic_file(target, args.channels, args.seconds)
+        measure(target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from straw.rice import Ricer, ext_rice
+from straw.static import Default
+
+"""
+Rice coding microbenchmark
+Compares the throughput of the Rice coding kernels in samples per second
+Run with: PYTHONPATH=src python benchmarks/rice_throughput.py
+"""
+
+
+def residuals(frames: int, blocksize: int, scale: float, seed: int = 0) -> list:
+    """
+    Generate Laplace distributed residual frames, similar to an LPC residual
+    :param frames: number of frames
+    :param blocksize: samples in each frame
+    :param scale: scale of the distribution
+    :param seed: random seed
+    :return: list of int16 frames
+    """
+    rng = np.random.default_rng(seed)
+    return [np.clip(rng.laplace(0, scale, blocksize), -32768, 32767).astype(np.int16) for _ in range(frames)]
+
+
+def encode_throughput(kernel: callable, frames: list, ks: list, repeat: int) -> float:
+    """
+    Measure the throughput of an encoding kernel
+    :param kernel: kernel with the signature of ext_rice.encode_frame
+    :param frames: residual frames
+    :param ks: starting rice parameters of the frames
+    :param repeat: number of repetitions, the best one is used
+    :return: samples per second
+    """
+    buffers = [np.zeros(frame.nbytes, dtype=np.uint8) for frame in frames]
+    samples = sum(frame.shape[0] for frame in frames)
+    best = np.inf
+    for _ in range(repeat):
+        for buffer in buffers:
+            buffer[:] = 0
+        start = timeit.default_timer()
+        for buffer, frame, k in zip(buffers, frames, ks):
+            kernel(buffer, frame, k, Default.rice_responsiveness, True)
+        best = min(best, timeit.default_timer() - start)
+    return samples / best
+
+
+def decode_throughput(kernel: callable, frames: list, ks: list, repeat: int) -> float:
+    """
+    Measure the throughput of a decoding kernel
+    :param kernel: kernel with the signature of ext_rice.decode_frame
+    :param frames: residual frames
+    :param ks: starting rice parameters of the frames
+    :param repeat: number of repetitions, the best one is used
+    :return: samples per second
+    """
+    streams = []
+    for frame, k in zip(frames, ks):
+        buffer = np.zeros(frame.nbytes * 2, dtype=np.uint8)
+        ext_rice.encode_frame(buffer, frame, k, Default.rice_responsiveness, True)
+        streams.append(buffer)
+    targets = [np.zeros_like(frame) for frame in frames]
+    samples = sum(frame.shape[0] for frame in frames)
+    best = np.inf
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        for target, stream, k in zip(targets, streams, ks):
+            kernel(target, stream, k, Default.rice_responsiveness, True)
+        best = min(best, timeit.default_timer() - start)
+    return samples / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rice coding microbenchmark")
+    parser.add_argument("--frames", type=int, default=200, help="Number of frames per scale")
+    parser.add_argument("--blocksize", type=int, default=4096, help="Samples in each frame")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions")
+    args = parser.parse_args()
+
+    ricer = Ricer(responsiveness=Default.rice_responsiveness)
+    kernels = {
+        "encode": (encode_throughput, {
+            "bitwise": ext_rice.encode_frame_bitwise,
+            "accumulator": ext_rice.encode_frame,
+        }),
+        "decode": (decode_throughput, {
+            "bitwise": ext_rice.decode_frame_bitwise,
+            "refill": ext_rice.decode_frame,
+        }),
+    }
+
+    print(f"{'scale':>8} {'direction':>10} {'kernel':>12} {'Msamples/s':>12} {'speedup':>8}")
+    for scale in (4, 64, 1024):
+        frames = residuals(args.frames, args.blocksize, scale)
+        ks = [int(ricer.guess_parameter(frame)) for frame in frames]
+        for direction, (throughput, variants) in kernels.items():
+            baseline = None
+            for name, kernel in variants.items():
+                result = throughput(kernel, frames, ks, args.repeat)
+                baseline = baseline or result
+                print(f"{scale:>8} {direction:>10} {name:>12} {result / 1e6:>12.2f} {result / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
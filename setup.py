@@ -8,6 +8,7 @@ extensions = [
     Extension("straw.lpc.ext_lpc", ["src/straw/lpc/ext_lpc.pyx"]),
     Extension("straw.rice.ext_rice", ["src/straw/rice/ext_rice.pyx"]),
     Extension("straw.io.ext_io", ["src/straw/io/ext_io.pyx"]),
+    Extension("straw.io.ext_bits", ["src/straw/io/ext_bits.pyx"]),
 ]
 
 with (ROOT / "requirements.txt").open("r") as f:
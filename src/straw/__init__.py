@@ -1,2 +1,2 @@
 from .codec import Encoder, Decoder
-from .straw import read, write, run
+from .straw import read, write, blocks, info, run
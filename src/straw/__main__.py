@@ -1,6 +1,8 @@
 import argparse
 from pathlib import Path
 
+from straw.compute import ParallelCompute, available_cpus
+from straw.correctors import ShiftCorrector
 from straw.static import Default
 from straw.straw import run
 
@@ -12,11 +14,18 @@ When called parses the command line arguments and acts accordingly
 def main():
     parser = argparse.ArgumentParser(description="Lossless multi-channel audio codec")
     parser.add_argument("-i", "--input", dest="input_files", metavar="INPUT_FILE", type=str, nargs="+",
-                        help="Input files", required=True)
+                        help="Input files, directories (searched recursively) or glob patterns, "
+                             "multiple inputs are coded as a batch", required=True)
     parser.add_argument("-o", "--output", dest="output_file", metavar="OUTPUT_FILE", type=str,
                         help="Output file")
+    parser.add_argument("--output-dir", dest="output_dir", metavar="OUTPUT_DIR", type=str,
+                        help="Output directory of a batch, by default the outputs are placed next to the inputs")
+    parser.add_argument("--overwrite", dest="overwrite", action="store_true",
+                        help="Code the files of a batch even if their outputs are newer than the inputs")
     parser.add_argument("-d", "--decode", dest="decode", action="store_true",
                         help="Decode")
+    parser.add_argument("--info", dest="info", action="store_true",
+                        help="Print the stream information of the input files without decoding them")
 
     parser.add_argument("--figures", dest="figures", action="store_true",
                         help="Generate figures - temporary option for runs with non-consistent behavior")
@@ -36,9 +45,38 @@ def main():
                         default=Default.framing_resolution, help="Override framing resolution")
     parser.add_argument("--rice-responsiveness", dest="rice_responsiveness", metavar="RESPONSIVENESS", type=int,
                         default=Default.rice_responsiveness, help="Override Rice codding responsiveness")
+    parser.add_argument("--shift-limit", dest="shift_limit", metavar="LIMIT", type=int,
+                        help=f"Lag limit of the shift correction, the lags are at most LIMIT - 2 samples "
+                             f"(default={ShiftCorrector.limit}, at most {ShiftCorrector.max_limit})")
+    parser.add_argument("--lpc-order", dest="lpc_order", metavar="ORDER", type=int,
+                        help=f"Maximal LPC order (default={Default.lpc_order}, "
+                             f"{Default.fast_decode_lpc_order} with --fast-decode, at most 32)")
+    parser.add_argument("--fixed-lpc-order", dest="select_lpc_order", action="store_false",
+                        help="Use the maximal LPC order for every frame, by default the order of each frame "
+                             "is chosen by its estimated size")
+    parser.add_argument("--fast-decode", dest="decode_penalty", metavar="PENALTY", type=float, nargs="?",
+                        const=Default.fast_decode_penalty, default=0.,
+                        help="Prefer lower LPC orders and raw frames, which are faster to decode, unless they are "
+                             "larger by more than PENALTY (a fraction of the frame size, "
+                             f"default={Default.fast_decode_penalty}), the LPC order is capped as well")
+
+    parser.add_argument("--window-frames", dest="window_frames", metavar="FRAMES", type=int, default=0,
+                        help="Encode the input in windows of FRAMES frames with bounded memory "
+                             "(default=0, the whole input is loaded)")
+    parser.add_argument("--pipeline", dest="pipeline", action="store_true",
+                        help="Encode in windows of frames, reading the next window and writing the previous one "
+                             f"while a window is encoded (windows of {Default.window_frames} frames "
+                             "unless --window-frames is set), decode in blocks of "
+                             f"{Default.pipeline_window} samples, writing the previous block while a block is decoded")
 
     parser.add_argument("--no-parallel", dest="parallel", action="store_false",
                         help="Disable parallelization")
+    parser.add_argument("--jobs", dest="jobs", metavar="JOBS", type=int, default=available_cpus(),
+                        help="Number of worker processes used for encoding and decoding "
+                             "(default=number of available CPUs)")
+    parser.add_argument("--backend", dest="backend", choices=ParallelCompute.backends, default="processes",
+                        help="Run the workers as processes or as threads sharing the process memory "
+                             "(default=processes)")
     parser.add_argument("--silent", dest="silent", action="store_true",
                         help="Silence the coder completely")
     parser.add_argument("--verbose", dest="verbose", action="store_true",
@@ -48,6 +86,12 @@ def main():
 
     if args.min_frame_size > args.max_frame_size:
         raise ValueError("Minimal frame size can't be larger than maximal frame size")
+    if args.window_frames < 0:
+        raise ValueError("Number of frames in a window can't be negative")
+    if args.jobs < 1:
+        raise ValueError("Number of jobs must be at least 1")
+    if args.output_file and (args.output_dir or len(args.input_files) > 1):
+        raise ValueError("Use --output-dir for the outputs of multiple input files")
 
     # Fix args
     if args.output_file:
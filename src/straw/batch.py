@@ -0,0 +1,190 @@
+import glob
+import sys
+import timeit
+from functools import partial
+from pathlib import Path
+from typing import TextIO
+
+from straw.codec import Encoder, Decoder
+from straw.compute import ParallelCompute
+
+"""
+Batch encoding and decoding of many files
+The files are coded in parallel by the shared worker pool, each file is coded serially by one worker
+"""
+
+
+class BatchResult:
+    """
+    Outcome of coding one file of a batch
+    """
+    input_file: Path
+    output_file: Path
+    raw_size: int = 0  # size of the WAV file
+    coded_size: int = 0  # size of the Straw file
+    seconds: float = 0
+    skipped: bool = False  # the output was already up to date
+    error: str = None
+
+    def __init__(self, input_file: Path, output_file: Path):
+        self.input_file = input_file
+        self.output_file = output_file
+
+    @property
+    def ratio(self) -> float:
+        return self.coded_size / self.raw_size if self.raw_size else 0.
+
+    def __str__(self):
+        if self.skipped:
+            return f"{self.input_file}: up to date"
+        if self.error is not None:
+            return f"{self.input_file}: FAILED ({self.error})"
+        return (f"{self.input_file} -> {self.output_file}: ratio {self.ratio:.4f}, {self.seconds:.3f} s, "
+                f"{self.raw_size / (2 ** 20) / max(self.seconds, 1e-9):.2f} MiB/s")
+
+
+def expand_inputs(patterns: list, suffix: str) -> list:
+    """
+    Expand the input arguments into files, an argument can be a file, a directory or a glob pattern
+    The files of a directory (or matched by a pattern) keep their path relative to the directory (or the part of the
+    pattern before the first wildcard) in the output, the directories are searched recursively
+    :param patterns: input arguments
+    :param suffix: suffix of the files searched in directories, e.g. ".wav"
+    :return: list of (input file, relative output path without the suffix) tuples
+    """
+    files = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            files += [(f, f.relative_to(path)) for f in sorted(path.rglob(f"*{suffix}")) if f.is_file()]
+        elif path.is_file():
+            files.append((path, Path(path.name)))
+        else:
+            matches = [Path(m) for m in sorted(glob.glob(pattern, recursive=True))]
+            if not matches:
+                raise FileNotFoundError(f"No input files match '{pattern}'")
+            root = _glob_root(pattern)
+            files += [(m, m.relative_to(root)) for m in matches if m.is_file()]
+    return files
+
+
+def _glob_root(pattern: str) -> Path:
+    """
+    Directory of a glob pattern before its first wildcard, the matched files keep their path relative to it
+    :param pattern: glob pattern
+    :return: directory
+    """
+    root = Path()
+    for part in Path(pattern).parent.parts:
+        if glob.has_magic(part):
+            break
+        root /= part
+    return root
+
+
+def plan(files: list, suffix: str, output_dir: Path = None) -> list:
+    """
+    Assign the output files
+    :param files: list returned by expand_inputs
+    :param suffix: suffix of the output files
+    :param output_dir: target directory, None means next to the input files
+    :return: list of BatchResult
+    """
+    if output_dir is None:
+        return [BatchResult(f, f.with_suffix(suffix)) for f, _ in files]
+    return [BatchResult(f, (output_dir / relative).with_suffix(suffix)) for f, relative in files]
+
+
+def is_up_to_date(result: BatchResult) -> bool:
+    """
+    Check whether the output exists and is not older than the input
+    :param result: planned file
+    :return: True if the file does not need to be coded
+    """
+    output_file = result.output_file
+    return output_file.is_file() and output_file.stat().st_mtime >= result.input_file.stat().st_mtime
+
+
+def code_files(results: list, decode: bool = False, encoder_options: dict = None, window_frames: int = 0,
+               overwrite: bool = False, jobs: int = 1):
+    """
+    Encode or decode the planned files, the outputs which are up to date are skipped unless overwrite is set
+    With jobs > 1 the files are coded by the shared worker pool, see ParallelCompute.map_unordered
+    :param results: list returned by plan
+    :param decode: decode Straw files instead of encoding WAV files
+    :param encoder_options: keyword arguments of the Encoder, parallelize is always disabled
+    :param window_frames: encode in windows of frames, see Encoder.stream_file, 0 means the whole file is loaded
+    :param overwrite: code the files even if their outputs are up to date
+    :param jobs: number of files coded at once
+    :return: generator of BatchResult in the order of completion
+    """
+    pending = []
+    for result in results:
+        if not overwrite and is_up_to_date(result):
+            result.skipped = True
+            yield result
+        else:
+            pending.append(result)
+
+    code = partial(_code_file, decode=decode, encoder_options=encoder_options or {}, window_frames=window_frames)
+    if jobs > 1 and len(pending) > 1:
+        yield from ParallelCompute.get_instance().map_unordered(pending, code, processes=jobs)
+    else:
+        yield from map(code, pending)
+
+
+def print_summary(results: list, seconds: float, stream: TextIO = sys.stdout):
+    """
+    Print the totals of a batch
+    :param results: list of BatchResult
+    :param seconds: wall-clock time of the batch
+    :param stream: stream where the output should be written
+    :return: None
+    """
+    coded = [r for r in results if not r.skipped and r.error is None]
+    skipped = sum(r.skipped for r in results)
+    failed = sum(r.error is not None for r in results)
+    raw_size = sum(r.raw_size for r in coded)
+    coded_size = sum(r.coded_size for r in coded)
+    print(f"{len(coded)} files coded, {skipped} up to date, {failed} failed in {seconds:.3f} s", file=stream)
+    if coded:
+        print(f"Throughput: {raw_size / (2 ** 20) / max(seconds, 1e-9):.2f} MiB/s, "
+              f"ratio: {coded_size / raw_size if raw_size else 0.:.4f}", file=stream)
+
+
+def _code_file(result: BatchResult, decode: bool, encoder_options: dict, window_frames: int) -> BatchResult:
+    """
+    Worker coding one file, the output is written to a temporary file and renamed when it is complete,
+    so an interrupted batch never leaves an output which looks up to date
+    :param result: planned file
+    :param decode: decode a Straw file instead of encoding a WAV file
+    :param encoder_options: keyword arguments of the Encoder
+    :param window_frames: encode in windows of frames, 0 means the whole file is loaded
+    :return: the result with the sizes and the time filled in, or with the error
+    """
+    output_file = result.output_file
+    tmp_file = output_file.with_name(f".{output_file.stem}.part{output_file.suffix}")
+    start = timeit.default_timer()
+    try:
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        if decode:
+            Decoder(jobs=1).stream_file(result.input_file, tmp_file)
+        else:
+            e = Encoder(**{**encoder_options, "parallelize": False})
+            if window_frames:
+                e.stream_file(result.input_file, tmp_file, window_frames=window_frames)
+            else:
+                e.load_file(result.input_file)
+                e.encode()
+                e.save_file(tmp_file)
+        tmp_file.replace(output_file)
+    except Exception as e:
+        tmp_file.unlink(missing_ok=True)
+        result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    result.seconds = timeit.default_timer() - start
+    wav, coded = (output_file, result.input_file) if decode else (result.input_file, output_file)
+    result.raw_size = wav.stat().st_size
+    result.coded_size = coded.stat().st_size
+    return result
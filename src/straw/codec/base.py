@@ -57,7 +57,7 @@ class BaseCoder:
         Returns the deep memory usage of the given dataframe in mebibytes
         :return: memory usage of the given dataframe
         """
-        return self._data.memory_usage(index=True, deep=True).sum() / (2 ** 20)
+        return self.get_data().memory_usage(index=True, deep=True).sum() / (2 ** 20)
 
     def sample_frame(self, seq=0) -> pd.Series:
         """
@@ -65,7 +65,7 @@ class BaseCoder:
         :param seq: the sequence number of the requested frame
         :return: sample frame
         """
-        return self._data.loc[seq]
+        return self.get_data().loc[seq]
 
     def sample_frame_multichannel(self, seq=0) -> pd.DataFrame:
         """
@@ -73,7 +73,8 @@ class BaseCoder:
         :param seq: the sequence number of the requested frame
         :return: sample frame
         """
-        return self._data[self._data["seq"] == seq]
+        data = self.get_data()
+        return data[data["seq"] == seq]
 
     def samplebuffer_frame_multichannel(self, seq=0, blocksize=4096) -> np.array:
         """
@@ -1,68 +1,337 @@
+from collections import OrderedDict
+from hashlib import md5
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
 import soundfile
 
-from straw import lpc
+from straw import static
 from straw.codec.base import BaseCoder
+from straw.compute import prefetch
 from straw.correctors import Decorrelator, GainCorrector, BiasCorrector
 from straw.io import Formatter
+from straw.io.frames import FrameTable
+from straw.io.straw import StrawFormatReader
+from straw.lpc import steps
+from straw.static import Default, SubframeType
 
 
 class Decoder(BaseCoder):
+    _restored: bool = False
+    _window: tuple = None
+    _table: FrameTable = None
+
+    # Lazy mode
+    _reader: StrawFormatReader = None
+    _frame_index: np.ndarray = None
+    _frame_cache: OrderedDict = None
+
     ##########
     # Public #
     ##########
 
-    def load_file(self, input_file: Path):
+    def __init__(self, flac_mode=False, show_progress: bool = False, jobs: int = 1, lazy: bool = False,
+                 cache_frames: int = 16):
+        """
+        Decoder constructor
+        :param flac_mode: False - FLAC mode is not supported anymore
+        :param show_progress: show loading progress
+        :param jobs: number of processes decoding the frames, 1 means serial decoding
+        :param lazy: if True only the frame index is built when loading and the frames are decoded on demand,
+        see Decoder.read
+        :param cache_frames: number of decoded frames kept in memory in the lazy mode
+        """
+        super(Decoder, self).__init__(flac_mode, show_progress=show_progress)
+        self.jobs = jobs
+        self.lazy = lazy
+        self.cache_frames = cache_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def load_file(self, input_file: Path, start: int = None, stop: int = None):
         """
         Load the specified file into memory
+        With multiple jobs the frames are also restored while loading, see Decoder.decode
+        In the lazy mode the file stays mapped until Decoder.close is called
         :param input_file: file to load
+        :param start: first sample to decode, negative values count from the end (ignored in the lazy mode)
+        :param stop: sample after the last one to decode, None means until the end of the stream
+        (ignored in the lazy mode)
         :return: None
         """
-        reader = Formatter().load(input_file, self._flac_mode, show_progress=self.show_progress)
-        self._data = reader.get_data()
+        if self.lazy:
+            self._open_lazy(input_file)
+            return
+
+        self._restored = self.jobs > 1
+        reader = Formatter().load(input_file, self._flac_mode, show_progress=self.show_progress, jobs=self.jobs,
+                                  frame_hook=_restore_frame if self._restored else None, start=start, stop=stop)
+        self._table = reader.get_table()
         self._params = reader.get_params()
         self._samplebuffer = reader.get_buffer()
+        self._window = reader.get_window()
+
+    def read(self, start: int = None, stop: int = None) -> np.array:
+        """
+        Get the decoded samples in the given range
+        In the lazy mode only the frames covering the range are decoded, other modes require Decoder.decode first
+        :param start: first sample, negative values count from the end
+        :param stop: sample after the last one, None means until the end of the stream
+        :return: soundfile-compatible numpy array
+        """
+        if not self.lazy:
+            return self.get_soundfile_compatible_array()[start:stop]
+
+        if self._reader is None:
+            raise RuntimeError("No file is opened")
+        start, stop, _ = slice(start, stop).indices(self._params.total_samples)
+        stop = max(start, stop)
+        lags = self._params.lags
+        max_lag = int(np.max(lags))
+        total_size = self._params.total_samples - max_lag
+
+        dtype_bits = static.soundfile_dtype[self._params.bits_per_sample]
+        data = np.zeros((stop - start, self._params.channels), dtype=f"int{dtype_bits}")
+        samplebuffer = data.swapaxes(1, 0)
+
+        # frames starting up to max_lag before the range are needed for the shifted channels
+        frame_starts = self._frame_index[:, 1]
+        first = max(np.searchsorted(frame_starts, start - max_lag, side="right") - 1, 0)
+        last = np.searchsorted(frame_starts, stop, side="left")
+        for i in range(first, last):
+            frame_start, blocksize = int(frame_starts[i]), int(self._frame_index[i, 3])
+            frame = self._get_frame(i)
+            for c in range(self._params.channels):
+                lo = max(frame_start + lags[c], start)
+                hi = min(frame_start + lags[c] + blocksize, stop)
+                if lo < hi:
+                    samplebuffer[c][lo - start:hi - start] = frame[c][lo - frame_start:hi - frame_start]
+
+        # samples removed by the shift correction
+        for c in range(len(self._params.removed_samples_start)):
+            for values, sample in ((self._params.removed_samples_start[c], 0),
+                                   (self._params.removed_samples_end[c], total_size + lags[c])):
+                lo = max(sample, start)
+                hi = min(sample + len(values), stop)
+                if lo < hi:
+                    samplebuffer[c][lo - start:hi - start] = values[lo - sample:hi - sample]
+
+        self._revert_corrections(samplebuffer)
+        return data
+
+    def blocks(self, blocksize: int = Default.block_size, overlap: int = 0, start: int = None,
+               stop: int = None):
+        """
+        Generate the decoded samples in blocks, in the style of soundfile.blocks
+        In the lazy mode only the frames of the current block are kept in memory and when the whole stream is read
+        its integrity is verified after the last block
+        :param blocksize: number of samples in a block, the last block can be shorter
+        :param overlap: number of samples shared by two consecutive blocks
+        :param start: first sample, negative values count from the end
+        :param stop: sample after the last one, None means until the end of the stream
+        :return: generator of soundfile-compatible numpy arrays
+        """
+        if overlap >= blocksize or overlap < 0:
+            raise ValueError("Overlap must be non-negative and smaller than the blocksize")
+
+        total = self._params.total_samples if self.lazy else self._samplebuffer.shape[1]
+        start, stop, _ = slice(start, stop).indices(total)
+        digest = md5() if self.lazy and start == 0 and stop == total else None
+        pos, verified = start, start
+        while pos < stop:
+            end = min(pos + blocksize, stop)
+            block = self.read(pos, end)
+            if digest is not None:
+                digest.update(block[verified - pos:])
+                verified = end
+            yield block
+            if end == stop:
+                break
+            pos = end - overlap
+
+        if digest is not None and digest.digest() != self._params.md5:
+            raise ValueError("Non-matching md5 checksum")
+
+    def stream_file(self, input_file: Path, output_file: Path, blocksize: int = Default.block_size,
+                    pipelined: bool = False):
+        """
+        Decode the specified file block by block, see Decoder.blocks
+        The decoded blocks are written immediately, the whole signal is never held in memory
+        A pipelined decoder decodes the next block with all jobs in a background thread while the previous block
+        is verified and written, use larger blocks (e.g. Default.pipeline_window) to keep the workers busy
+        :param input_file: file to decode
+        :param output_file: target file
+        :param blocksize: number of samples decoded at once
+        :param pipelined: overlap the decoding and the writing of the blocks
+        :return: None
+        """
+        if pipelined:
+            self._stream_pipelined(Path(input_file), output_file, blocksize)
+            return
+
+        self.lazy = True
+        self.load_file(input_file)
+        try:
+            with self._open_output(output_file) as wav:
+                for block in self.blocks(blocksize):
+                    self._write_block(wav, block)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the file opened in the lazy mode and drop the decoded frames
+        :return: None
+        """
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._frame_cache = None
 
     def decode(self):
         """
         Decode the signal and verify its integrity
+        NOTE: the integrity can only be verified when the whole stream is decoded
         :return: None
         """
-        self._revert_decorrelate("residual")
-        self._data.apply(lpc.compute_original, axis=1, inplace=True)
+        if self.lazy:
+            raise RuntimeError("The lazy decoder decodes the frames on demand, use Decoder.read")
+
+        if not self._restored:
+            for i in range(self._table.frames):
+                _restore_frame(self._table, i)
         self._revert_corrections()
+
+        start, stop = self._window
+        if stop - start != self._params.total_samples:
+            # only a part of the stream was decoded, trim the surrounding frames
+            self._samplebuffer = self._samplebuffer[:, start:stop]
+            return
+
         if self.get_md5() != self._params.md5:
             print(f"md5 restored: {self.get_md5().hex(' ')}")
             print(f"md5 file:     {self._params.md5.hex(' ')}")
             raise ValueError("Non-matching md5 checksum")
 
+    def get_data(self) -> pd.DataFrame:
+        """
+        Debug view of the loaded frames, see FrameTable.to_dataframe
+        :return: DataFrame with one row for each subframe or None if no frames are loaded
+        """
+        return None if self._table is None else self._table.to_dataframe()
+
     def save_file(self, output_file: Path):
         """
         Save the decoded signal
         :param output_file: target file
         :return: None
         """
-        with soundfile.SoundFile(output_file, "w",
-                                 subtype=self._subtype_pattern.format(self._params.bits_per_sample),
-                                 samplerate=self._params.sample_rate,
-                                 channels=self._params.channels) as wav:
-            dtype_bits = self._samplebuffer.itemsize * 8
-            shift = dtype_bits - self._params.bits_per_sample
-            data = (self._samplebuffer.swapaxes(1, 0) << shift)
-            wav.write(data)
+        with self._open_output(output_file) as wav:
+            data = self.get_soundfile_compatible_array()
+            for i in range(0, data.shape[0], Default.block_size):
+                self._write_block(wav, data[i:i + Default.block_size])
 
     ###########
     # Private #
     ###########
 
-    def _revert_corrections(self):
-        BiasCorrector().apply_revert(self._samplebuffer, self._params)
-        GainCorrector().apply_revert(self._samplebuffer, self._params)
+    def _stream_pipelined(self, input_file: Path, output_file: Path, blocksize: int):
+        """
+        Decode the blocks in a background thread, each one by the workers as a batch of whole frames
+        The file is opened and indexed once, every frame is decoded once, see StrawFormatReader.load_block
+        The md5 checksum is updated with every written block and verified after the last one
+        :param input_file: file to decode
+        :param output_file: target file
+        :param blocksize: number of samples decoded at once, the blocks are cut on the frame borders
+        :return: None
+        """
+        reader = StrawFormatReader(show_progress=False)
+        self._params = reader.open(input_file)
+        lags = self._params.lags
+        max_lag = int(np.max(lags))
+
+        def decoded():
+            index = reader.get_frame_index()
+            cuts = np.unique(np.searchsorted(index[:, 1], np.arange(blocksize, self._params.total_samples, blocksize)))
+            blocks = [frames for frames in np.split(index, cuts) if frames.shape[0]]
+            tail = None
+            for n, frames in enumerate(blocks):
+                buffer, _ = reader.load_block(frames, jobs=self.jobs, frame_hook=_restore_frame)
+                # the shifted channels of the previous block end up to max_lag samples after its last frame
+                if tail is not None:
+                    for c in range(self._params.channels):
+                        buffer[c][:lags[c]] = tail[c][:lags[c]]
+                stop = buffer.shape[1] if n == len(blocks) - 1 else buffer.shape[1] - max_lag
+                tail = buffer[:, stop:]
+                self._revert_corrections(buffer[:, :stop])
+                yield buffer[:, :stop].swapaxes(1, 0)
+
+        digest = md5()
+        try:
+            with self._open_output(output_file) as wav:
+                for block in prefetch(decoded(), depth=1):
+                    digest.update(block)
+                    self._write_block(wav, block)
+        finally:
+            reader.close()
+        if digest.digest() != self._params.md5:
+            raise ValueError("Non-matching md5 checksum")
 
-    def _revert_decorrelate(self, col_name="residual"):
-        self._data = self._data.groupby("seq").apply(Decorrelator().midside_decorrelate_revert, col_name=col_name)
-        # self._data = self._data.groupby("seq").apply(Decorrelator().localized_decorrelate_revert, col_name=col_name)
+    def _open_output(self, output_file: Path) -> soundfile.SoundFile:
+        return soundfile.SoundFile(output_file, "w",
+                                   subtype=self._subtype_pattern.format(self._params.bits_per_sample),
+                                   samplerate=self._params.sample_rate,
+                                   channels=self._params.channels)
+
+    def _write_block(self, wav: soundfile.SoundFile, block: np.array):
+        """
+        Write a block of samples, the samples are shifted to the full bit width of their dtype
+        :param wav: opened target file
+        :param block: soundfile-compatible numpy array
+        :return: None
+        """
+        shift = block.itemsize * 8 - self._params.bits_per_sample
+        wav.write(block << shift if shift else block)
+
+    def _revert_corrections(self, samplebuffer: np.array = None):
+        if samplebuffer is None:
+            samplebuffer = self._samplebuffer
+        BiasCorrector().apply_revert(samplebuffer, self._params)
+        GainCorrector().apply_revert(samplebuffer, self._params)
+
+    def _open_lazy(self, input_file: Path):
+        """
+        Open the file and build the frame index without decoding any frame
+        :param input_file: file to open
+        :return: None
+        """
+        self.close()
+        self._reader = StrawFormatReader(show_progress=False)
+        self._params = self._reader.open(input_file)
+        self._frame_index = self._reader.get_frame_index()
+        self._frame_cache = OrderedDict()
+
+    def _get_frame(self, i: int) -> np.array:
+        """
+        Get the restored samples of a frame, decoding it if it is not cached
+        :param i: position of the frame in the frame index
+        :return: frame buffer, see StrawFormatReader.load_frame
+        """
+        if i in self._frame_cache:
+            self._frame_cache.move_to_end(i)
+            return self._frame_cache[i]
+
+        frame, table = self._reader.load_frame(self._frame_index[i])
+        _restore_frame(table, 0)
+        self._frame_cache[i] = frame
+        while len(self._frame_cache) > max(self.cache_frames, 1):
+            self._frame_cache.popitem(last=False)
+        return frame
 
     ###########
     # Utility #
@@ -82,3 +351,19 @@ class Decoder(BaseCoder):
             print("Lossless :)")
         else:
             print("Not lossless :|")
+
+
+def _restore_frame(table: FrameTable, i: int):
+    """
+    Restore the signal of one frame in place - reverts the decorrelation and the prediction
+    Used as the frame hook of the parallel loader, which calls it for every frame in the worker processes
+    :param table: table of the decoded frames, the residuals are stored in the samplebuffer
+    :param i: position of the frame in the table
+    :return: None
+    """
+    channels = range(table.channels)
+    Decorrelator.midside_decorrelate_revert_frames([table.residual(i, c) for c in channels], table.frame_type[i])
+    for c in channels:
+        if table.frame_type[i, c] in (SubframeType.LPC, SubframeType.LPC_COMMON):
+            qlp, _, shift = table.get_lpc(i, c)
+            steps.restore_signal_cython(table.frame(i, c), qlp, shift)
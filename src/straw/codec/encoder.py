@@ -1,16 +1,22 @@
 import sys
+from functools import partial
+from hashlib import md5
 from pathlib import Path
 from typing import TextIO
 
 import numpy as np
 import pandas as pd
 import soundfile
+from bitarray import bitarray
 
-from straw import lpc, static, correctors
+from straw import static, correctors
 from straw.codec.base import BaseCoder
-from straw.compute import ParallelCompute
+from straw.compute import Consumer, ParallelCompute, SharedArray, prefetch
 from straw.io import Formatter
+from straw.io.frames import FrameTable
+from straw.io.sizes import StrawSizes
 from straw.io.params import StreamParams
+from straw.lpc import steps
 from straw.rice import Ricer
 from straw.static import SubframeType, Default
 from straw.util import Signals
@@ -23,9 +29,11 @@ class EncoderStats:
 
 
 class Encoder(BaseCoder):
-    _lpc_order = 20  # can be sourced from len(df["qlp"]) once per group
-    _lpc_precision = 12  # bits, stored in df["qlp_precision"] once per group
+    _lpc_order = Default.lpc_order  # maximal order, the order of each frame is stored in FrameTable.order
+    _lpc_precision = 12  # bits, stored in FrameTable.qlp_precision for each frame
     _params = StreamParams()
+    _table: FrameTable
+    _stream_stats: tuple = None  # totals of a streamed encoding, see Encoder._summary
 
     ##########
     # Public #
@@ -34,36 +42,65 @@ class Encoder(BaseCoder):
     def __init__(self,
                  flac_mode=False,
                  do_corrections=("shift", "bias"),
+                 shift_limit=None,
                  dynamic_blocksize=False,
                  min_block_size=Default.min_frame_size,
                  max_block_size=Default.max_frame_size,
                  framing_treshold=Default.framing_treshold,
                  framing_resolution=Default.framing_resolution,
                  responsiveness=Default.rice_responsiveness,
+                 lpc_order=Default.lpc_order,
+                 select_lpc_order=True,
+                 decode_penalty=0.,
                  parallelize=True,
                  show_progress: bool = False):
         """
         Encoder constructor
         :param do_corrections: tuple of correction to be performed
+        :param shift_limit: lag limit of the shift correction, the lags are at most shift_limit - 2 samples,
+                            None means ShiftCorrector.limit
         :param dynamic_blocksize: whether to perform dynamic block slicing
         :param min_block_size: minimal block size
         :param max_block_size: maximal block size
         :param framing_treshold: framing treshold
         :param framing_resolution: framing resolution
         :param responsiveness: Rice coding responsiveness
+        :param lpc_order: maximal LPC order, at most 32
+        :param select_lpc_order: choose the order of each frame by its estimated size, otherwise all frames use lpc_order
+        :param decode_penalty: relative size penalty accepted for subframes which are faster to decode,
+                               lower LPC orders and raw frames, e.g. 0.02 accepts frames 2 % larger
         :param parallelize: if True use parallelization while encoding
         """
         super(Encoder, self).__init__(flac_mode, show_progress=show_progress)
+        self._params = StreamParams()
         self._ricer = Ricer(adaptive=True if not flac_mode else False, responsiveness=responsiveness)
         self._params.responsiveness = responsiveness
         self._do_corrections = do_corrections
+        if shift_limit is not None and not 2 <= shift_limit <= correctors.ShiftCorrector.max_limit:
+            raise ValueError(f"The lag limit must be between 2 and {correctors.ShiftCorrector.max_limit}")
+        self.shift_limit = shift_limit
         self._do_dynamic_blocking = dynamic_blocksize
         self.min_block_size = min_block_size
         self.max_block_size = max_block_size
         self.framing_treshold = framing_treshold
         self.framing_resolution = framing_resolution
+        if not 1 <= lpc_order <= 1 << StrawSizes.subframe_lpc.lpc_order:
+            raise ValueError(f"The LPC order must be between 1 and {1 << StrawSizes.subframe_lpc.lpc_order}")
+        self._lpc_order = lpc_order
+        self.select_lpc_order = select_lpc_order
+        if decode_penalty < 0:
+            raise ValueError("The decode penalty must not be negative")
+        self.decode_penalty = decode_penalty
         self.parallelize = parallelize
 
+    def get_data(self) -> pd.DataFrame:
+        """
+        Debug view of the frame table, see FrameTable.to_dataframe
+        NOTE: the DataFrame is built on every call
+        :return: DataFrame with one row for each subframe
+        """
+        return self._table.to_dataframe()
+
     def set_rice_responsiveness(self, responsiveness):
         """
         Set a new Rice coding responsiveness
@@ -92,6 +129,52 @@ class Encoder(BaseCoder):
 
         self.load_data(data, sr, bits_per_sample)
 
+    def stream_file(self, input_file, output_file, window_frames: int = Default.window_frames,
+                    pipelined: bool = False):
+        """
+        Encode the specified file without loading it into memory
+        The correction params are estimated in streaming passes over the file, then the signal is framed, encoded
+        and saved one window of frames at a time. Only one window is held in memory.
+        A pipelined encoder reads the next window and writes the previous one in background threads while a window
+        is encoded, a few more windows are then held in memory. The output is the same.
+        NOTE: with dynamic blocksize the frame limits are found in each window separately
+        :param input_file: str or int or file-like object - anything that soundfile accepts
+        :param output_file: seekable target file, the stream header is rewritten when all frames are saved
+        :param window_frames: number of frames (of the maximal size) in a window
+        :param pipelined: overlap reading, encoding and writing of the windows
+        :return: None
+        """
+        self._source_size = Path(input_file).stat().st_size
+        with soundfile.SoundFile(input_file, "r") as wav:
+            subtype = wav.subtype
+            if subtype not in self._supported_subtypes:
+                raise ValueError(f"Subtype '{subtype}' not supported, must be one of {self._supported_subtypes.keys()}")
+            self._params.channels = int(wav.channels)
+            self._params.total_samples = int(wav.frames)
+            self._params.bits_per_sample = self._supported_subtypes[subtype]
+            self._params.sample_rate = wav.samplerate
+            self._params.alloc_arrays()
+
+            frame_size = self.max_block_size if self._do_dynamic_blocking else self._default_frame_size
+            window = max(window_frames, 1) * frame_size
+
+            def chunks():
+                wav.seek(0)
+                while wav.tell() < self._params.total_samples:
+                    yield self._read_block(wav, window, digest=None)
+
+            correctors.estimate_corrections(chunks, self._do_corrections, self._params, shift_limit=self.shift_limit)
+
+            opened = False
+            if not hasattr(output_file, "write"):
+                output_file = open(output_file, "wb")
+                opened = True
+            try:
+                self._stream_windows(wav, output_file, window, pipelined)
+            finally:
+                if opened:
+                    output_file.close()
+
     def load_data(self, data: np.array, samplerate: int, bits_per_sample: int):
         """
         Load the given data into the internal DataFrame
@@ -118,41 +201,25 @@ class Encoder(BaseCoder):
 
         self._params.sample_rate = samplerate
         self._params.md5 = self.get_md5()
-        correctors.apply_corrections(self._samplebuffer, self._do_corrections, self._params)
-        self._create_dataframe()
+        correctors.apply_corrections(self._samplebuffer, self._do_corrections, self._params,
+                                     shift_limit=self.shift_limit)
+        self._create_frame_table()
 
     def encode(self):
         """
-        Encode the data in the internal DataFrame
+        Encode the frames in the internal frame table
         :return: None
         """
-        # Initialize frame types
-        self._init_frame_types()
-
-        groups = self._data.groupby("seq")
+        # the frames are serialized by the workers as well, see Formatter.serialize
+        serialize = partial(Formatter().serialize, params=self._params, flac_mode=self._flac_mode)
+        encode = partial(_encode_frames, ricer=self._ricer, lpc_order=self._lpc_order,
+                         lpc_precision=self._lpc_precision, bits_per_sample=self._params.bits_per_sample,
+                         select_order=self.select_lpc_order, decode_penalty=self.decode_penalty,
+                         serialize=serialize)
         if self.parallelize and self._params.channels > 1:
-            self._data = ParallelCompute.get_instance().map_group(groups, self._encode_frame)
+            self._encode_parallel(encode)
         else:
-            self._data = groups.apply(self._encode_frame)
-
-    def _encode_frame(self, data_slice: pd.DataFrame):
-        """
-        Encode one frame - group of subframes
-        :param data_slice: slice of a DataFrame containing a group of subframes
-        :return: modified data_slice
-        """
-        # correctors.ShiftCorrector().df_wrap_apply(data_slice["frame"])
-        lpc.compute_qlp(data_slice, order=self._lpc_order, qlp_coeff_precision=self._lpc_precision)
-        lpc.compute_residual(data_slice)
-        # correctors.GainCorrector().df_wrap_apply(data_slice["residual"])
-        # correctors.ShiftCorrector().df_wrap_apply(data_slice["residual"])
-        # correctors.BiasCorrector().df_wrap_apply(data_slice["residual"])
-        data_slice = correctors.Decorrelator().midside_decorrelate(data_slice, "residual")
-        data_slice["bps"] = data_slice["residual"].apply(self._ricer.guess_parameter)
-        data_slice["stream"] = self._ricer.frames_to_bitstreams(data_slice, parallel=False)
-        data_slice["stream_len"] = data_slice["stream"].apply(len)
-        data_slice["frame_type"] = self._should_be_raw_maxbytes(data_slice)
-        return data_slice
+            encode(self._table)
 
     def save_file(self, output_file):
         """
@@ -160,13 +227,13 @@ class Encoder(BaseCoder):
         :param output_file: target file
         :return: None
         """
-        self._params.total_frames = int(len(self._data[self._data["channel"] == 0]))
+        self._params.total_frames = self._table.frames
         opened = False
         if not hasattr(output_file, "write"):
             output_file = open(output_file, "wb")
             opened = True
 
-        Formatter().save(self._data, self._params, output_file, self._flac_mode)
+        Formatter().save(self._table, self._params, output_file, self._flac_mode)
         if opened:
             output_file.close()
 
@@ -174,13 +241,118 @@ class Encoder(BaseCoder):
     # Private #
     ###########
 
-    def _create_dataframe(self):
+    def _encode_parallel(self, encode: callable):
         """
-        Create a dataframe from the raw signal, this includes slicing the signal into specific views
-        NOTE: the underlying memory stays as a contiguous memory chunk
+        Encode the frame table in batches of frames in the worker processes
+        The samples and residuals are placed in shared memory, the workers receive only the frame metadata
+        and return it with the Rice coded streams, thread workers use the buffers of the table directly
+        :param encode: function encoding a frame table, see _encode_frames
+        :return: None
+        """
+        compute = ParallelCompute.get_instance()
+        table = self._table
+        if compute.shares_memory:
+            table.join(compute.map_list(table.split(compute.cpus * 2), encode))
+            return
+
+        samples = SharedArray(table.samplebuffer.shape, table.samplebuffer.dtype)
+        residuals = SharedArray(table.residuals.shape, table.residuals.dtype)
+        try:
+            samples.array[:] = table.samplebuffer
+            batches = table.split(compute.cpus * 2)
+            for batch in batches:
+                batch.detach()
+            table.join(compute.map_list(batches, _encode_shared, samplebuffer=samples.descriptor(),
+                                        residuals=residuals.descriptor(), encode=encode))
+            table.residuals[:] = residuals.array
+        finally:
+            for shared in (samples, residuals):
+                shared.close()
+                shared.unlink()
+
+    def _read_block(self, wav: soundfile.SoundFile, frames: int, digest=None) -> np.array:
+        """
+        Read the next block of the input file
+        :param wav: opened input file
+        :param frames: number of samples to read from each channel
+        :param digest: optional md5 object updated with the read samples
+        :return: array with dimensions (channels, samples)
+        """
+        dtype_bits = static.soundfile_dtype[self._params.bits_per_sample]
+        data = wav.read(frames=frames, dtype=f"int{dtype_bits}", always_2d=True)
+        data >>= dtype_bits - self._params.bits_per_sample
+        if digest is not None:
+            digest.update(data)
+        return data.swapaxes(1, 0)
+
+    def _stream_windows(self, wav: soundfile.SoundFile, output_stream, window: int, pipelined: bool = False):
+        """
+        Frame, encode and save the input file one window at a time, see Encoder.stream_file
+        :param wav: opened input file
+        :param output_stream: target file
+        :param window: number of samples framed at once
+        :param pipelined: read and write the windows in background threads
+        :return: None
+        """
+        lags = self._params.lags
+        max_lag = int(np.max(lags))
+        total_size = self._params.total_samples - max_lag
+        digest = md5()
+
+        def read(frames):
+            block = self._read_block(wav, frames, digest)
+            correctors.apply_corrections_params(block, self._do_corrections, self._params)
+            return block
+
+        wav.seek(0)
+        samples = read(max_lag)
+        self._params.removed_samples_start = [samples[c][:lag].copy() for c, lag in enumerate(lags)]
+
+        # placeholders, the header is rewritten when the stream is closed
+        self._params.md5 = bytes(digest.digest_size)
+        self._params.total_frames = 0
+        self._params.removed_samples_end = [np.zeros(max_lag - lag, dtype=samples.dtype) for lag in lags]
+        writer = Formatter().create_writer(self._params, output_stream, self._flac_mode)
+
+        # the reader and the writer run in background threads when pipelined, the frames are written in order
+        blocks = (read(min(window, total_size - start)) for start in range(0, total_size, window))
+        consumer = Consumer(writer.write, depth=1) if pipelined else None
+        write = consumer.put if pipelined else writer.write
+        subframes, stream_len, lpc_frames, coefficients, decode_cycles = 0, 0, 0, 0, 0.
+        try:
+            for block in prefetch(blocks, depth=1) if pipelined else blocks:
+                # each window keeps max_lag samples after its end for the shifted channels
+                samples = np.concatenate((samples, block), axis=1)
+                self._samplebuffer = samples
+                self._create_frame_table(first_seq=self._params.total_frames)
+                self.encode()
+                write(self._table)
+
+                self._params.total_frames += self._table.frames
+                subframes += self._table.frames * self._table.channels
+                stream_len += int(self._table.stream_len.sum())
+                window_lpc_frames, window_coefficients = _lpc_counts(self._table)
+                lpc_frames += window_lpc_frames
+                coefficients += window_coefficients
+                decode_cycles += self._table.decode_cycles()
+                samples = samples[:, samples.shape[1] - max_lag:]
+        finally:
+            if consumer is not None:
+                consumer.close()
+
+        self._params.removed_samples_end = [samples[c][lag:].copy() for c, lag in enumerate(lags)]
+        self._params.md5 = digest.digest()
+        writer.close_stream(self._params)
+        self._stream_stats = (self._params.total_frames, subframes, stream_len, lpc_frames, coefficients,
+                              decode_cycles)
+
+    def _create_frame_table(self, first_seq: int = 0):
+        """
+        Create a frame table from the raw signal, this includes slicing the signal into frames
+        NOTE: the frames are views of the samplebuffer
+        :param first_seq: sequence number of the first frame
         :return: None
         """
-
         total_size = self._samplebuffer.shape[1] - np.max(self._params.lags)
         if self._do_dynamic_blocking:
             lag = self._params.lags[0]
@@ -190,43 +362,27 @@ class Encoder(BaseCoder):
                                                         treshold=self.framing_treshold,
                                                         resolution=self.framing_resolution)
         else:
-            limits = None
-
-        ds = {"seq": [], "frame": [], "channel": []}
-        for channel, channel_data in enumerate(self._samplebuffer):
-            lag = self._params.lags[channel]
-            sliced = self._slice_channel_data_into_frames(channel_data[lag:total_size + lag], limits=limits)
-            ds["seq"] += [i for i in range(len(sliced))]
-            ds["frame"] += sliced
-            ds["channel"] += [channel for _ in range(len(sliced))]
-
-        self._data = pd.DataFrame(ds, copy=False)
-
-    def _init_frame_types(self):
-        # all frames are LPC frames by default
-        self._data["frame_type"] = np.full(len(self._data["frame"]), SubframeType.LPC, dtype="B")
-
-    def _should_be_raw_maxbytes(self, df: pd.DataFrame):
-        if not (df["frame_type"].isin((SubframeType.LPC, SubframeType.LPC_COMMON))).all():
-            return df["frame_type"]
-
-        max_allowed_bits = df.loc[df.index[0], "residual"].shape[0] * self._params.bits_per_sample
-        if (df["stream_len"] >= max_allowed_bits).any():
-            df["frame_type"] = SubframeType.RAW
-        return df["frame_type"]
-
-    @staticmethod
-    def _decorrelate_signals(data_slice, col_name="residual"):
-        # self._data = self._data.groupby("seq").apply(Decorrelator().localized_decorrelate, col_name=col_name)
-        # self._data = ParallelCompute.get_instance().map_group(self._data.groupby("seq"),
-        #                                                       Decorrelator().midside_decorrelate, col_name=col_name)
-        data_slice = data_slice.groupby("seq").apply(correctors.Decorrelator().midside_decorrelate, col_name=col_name)
-        data_slice["was_coded"] = 0
+            limits = np.append(np.arange(0, total_size, self._default_frame_size), total_size)
+
+        self._table = FrameTable(self._samplebuffer, self._params.lags, limits, first_seq=first_seq,
+                                 max_order=self._lpc_order)
 
     ###########
     # Utility #
     ###########
 
+    def _summary(self) -> (int, int, int, int, int, float):
+        """
+        Return the number of frames, subframes, residual bits, frames storing LPC coefficients, LPC coefficients
+        and the estimated decode cycles
+        When streamed, only the last window is kept in the frame table and the totals are counted while encoding
+        :return: tuple of frames, subframes, residual bits, LPC frames, LPC coefficients and decode cycles
+        """
+        if self._stream_stats is not None:
+            return self._stream_stats
+        return (self._table.frames, self._table.frames * self._table.channels, int(self._table.stream_len.sum()),
+                *_lpc_counts(self._table), self._table.decode_cycles())
+
     def get_stats(self, output_file: Path) -> EncoderStats:
         """
         Return the stats of the encoding
@@ -236,7 +392,7 @@ class Encoder(BaseCoder):
         stats = EncoderStats()
         stats.file_size = output_file.stat().st_size
         stats.ratio = output_file.stat().st_size / self._source_size
-        stats.frames = len(self._data.groupby('seq').groups)
+        stats.frames = self._summary()[0]
         return stats
 
     def print_stats(self, output_file: Path, stream: TextIO = sys.stdout):
@@ -246,17 +402,182 @@ class Encoder(BaseCoder):
         :param stream: stream where the output should be written
         :return: None
         """
-        print(f"Number of frames: {len(self._data.groupby('seq').groups)}", file=stream)
-        print(f"Number of subframes: {len(self._data)}", file=stream)
+        frames, subframes, size, lpc_frames, coefficients, decode_cycles = self._summary()
+        print(f"Number of frames: {frames}", file=stream)
+        print(f"Number of subframes: {subframes}", file=stream)
         print(f"Source size: {self._source_size} ({self._source_size / (2 ** 20):.2f} MiB)", file=stream)
-        size = self._data["stream_len"].sum()
         print(f"md5: {self._params.md5.hex(' ')}", file=stream)
         print(f"Length of residual bitstream: {size} bits, "
               f"bytes: {np.ceil(size / 8):.0f} aligned ({np.ceil(size / 8) / (2 ** 20):.2f} MiB)", file=stream)
-        lpc_bytes = np.ceil(len(self._data) * self._lpc_precision * self._lpc_order * 1 / 8)
-        print(f"Bytes needed for coefficients: {lpc_bytes:.0f} B", file=stream)
+        lpc_bytes = np.ceil(coefficients * self._lpc_precision / 8)
+        print(f"Bytes needed for coefficients: {lpc_bytes:.0f} B, mean LPC order: {coefficients / max(lpc_frames, 1):.2f}",
+              file=stream)
+        seconds = self._params.total_samples / self._params.sample_rate
+        print(f"Estimated decode cost: {decode_cycles / max(seconds, 1e-9) / 1e6:.1f} Mcycles per second of audio",
+              file=stream)
         print(f"Output file size: {output_file.stat().st_size} ({output_file.stat().st_size / (2 ** 20):.2f} MiB)",
               file=stream)
         print(f"Grand Ratio = {output_file.stat().st_size / self._source_size:.4f}", file=stream)
 
-        print(f"Size of the resulting dataframe: {self.usage_mib():.3f} MiB", file=stream)
+        print(f"Size of the frame table: {self._table.nbytes / (2 ** 20):.3f} MiB", file=stream)
+
+
+# maximal number of samples analyzed at once by _compute_lpc_table
+_batch_samples = 1 << 20
+
+
+def _compute_lpc_table(table: FrameTable, p: int, selected: np.array = None, bits_per_sample: int = 0,
+                       precision: int = 0, decode_penalty: float = 0.) -> (np.array, np.array):
+    """
+    Calculates the LPC coefficients common to all channels for every frame of a frame table, see lpc.steps.compute_lpc
+    The frames with the same blocksize are autocorrelated in batches of at most _batch_samples samples,
+    then the coefficients and orders of all frames are computed at once, see lpc.steps.compute_lpc_orders
+    :param table: frame table
+    :param p: (maximal) LPC order
+    :param selected: (frames,) mask of the analyzed frames, all frames are analyzed if None
+    :param bits_per_sample: bits per sample of the signal, enables the order selection
+    :param precision: precision of the quantized coefficients in bits, used by the order selection
+    :param decode_penalty: relative size penalty accepted for a lower order
+    :return: tuple((frames, p) LPC coefficients, (frames,) order of each frame, 0 if the frame has no coefficients)
+    """
+    if selected is None:
+        selected = np.ones(table.frames, dtype=bool)
+    valid = np.zeros(table.frames, dtype=bool)
+    autoc = np.zeros((table.frames, p + 1))
+
+    for blocksize in np.unique(table.blocksize[selected]):
+        blocksize = int(blocksize)
+        frames = np.flatnonzero(selected & (table.blocksize == blocksize))
+        step = max(1, _batch_samples // (blocksize * table.channels))
+        for batch in np.split(frames, range(step, frames.shape[0], step)):
+            signals = np.empty((batch.shape[0], table.channels, blocksize))
+            for row, i in enumerate(batch):
+                for c in range(table.channels):
+                    signals[row, c] = table.frame(i, c)
+            autoc[batch], valid[batch] = steps.compute_lpc_autocorrelation(signals, p)
+
+    analyzed = np.flatnonzero(valid)
+    solved, orders = steps.compute_lpc_orders(autoc[analyzed], table.blocksize[analyzed], table.channels, p,
+                                              bits_per_sample, precision, decode_penalty)
+    lpc = np.zeros((table.frames, p))
+    lpc[analyzed] = solved
+    frame_orders = np.zeros(table.frames, dtype=np.int64)
+    frame_orders[analyzed] = orders
+    return lpc, frame_orders
+
+
+def _encode_frames(table: FrameTable, ricer: Ricer, lpc_order: int, lpc_precision: int,
+                   bits_per_sample: int, select_order: bool = False, decode_penalty: float = 0.,
+                   serialize: callable = None) -> FrameTable:
+    """
+    Encode all frames of a frame table in place
+    Used by the parallel encoder, which sends only the frame metadata and the settings to the worker processes
+    :param table: frame table
+    :param ricer: Rice coder
+    :param lpc_order: (maximal) LPC order
+    :param lpc_precision: precision of the quantized LPC coefficients in bits
+    :param bits_per_sample: bits per sample of the signal
+    :param select_order: choose the order of each frame, see _compute_lpc_table
+    :param decode_penalty: relative size penalty accepted for lower orders and raw frames, which are faster to decode
+    :param serialize: optional function serializing the encoded table, see Formatter.serialize
+    :return: the encoded table
+    """
+    lpc_types = (SubframeType.LPC, SubframeType.LPC_COMMON)
+
+    # Constant frames, see lpc.compute_qlp
+    constant = np.zeros((table.frames, table.channels), dtype=bool)
+    for i in range(table.frames):
+        for c in range(table.channels):
+            x = table.frame(i, c)
+            constant[i, c] = not (x - x[0]).any()
+    # LPC coefficients of all frames without a constant channel at once
+    lpc, orders = _compute_lpc_table(table, lpc_order, selected=~constant.any(axis=1),
+                                     bits_per_sample=bits_per_sample if select_order else 0,
+                                     precision=lpc_precision, decode_penalty=decode_penalty)
+
+    for i in range(table.frames):
+        frames = [table.frame(i, c) for c in range(table.channels)]
+        frame_types = table.frame_type[i]
+
+        if constant[i].any():
+            frame_types[:] = np.where(constant[i], SubframeType.CONSTANT, SubframeType.RAW)
+        elif not orders[i]:
+            frame_types[:] = SubframeType.RAW
+        else:
+            qlp, precision, shift = steps.quantize_lpc_cython(lpc[i, :orders[i]], lpc_precision)
+            table.set_qlp(i, qlp, precision, shift)
+            frame_types[:] = SubframeType.LPC_COMMON
+
+            # Frames with a subframe without a gain from the prediction are stored raw, the coefficients are stored
+            # only in the first subframe, see lpc.compute_residual
+            for c, frame in enumerate(frames):
+                if steps.predict_compute_residual(frame, qlp, shift, out=table.residual(i, c, warmup=True)) is None:
+                    frame_types[:] = SubframeType.RAW
+                    break
+
+        residuals = [table.residual(i, c) for c in range(table.channels)]
+        # The decoder reverts the mid-side decorrelation in the type of the samples
+        if not correctors.Decorrelator.midside_fits(residuals, frame_types, table.samplebuffer.dtype):
+            frame_types[:] = SubframeType.RAW
+        correctors.Decorrelator.midside_decorrelate_frames(residuals, frame_types)
+        for c, residual in enumerate(residuals):
+            if frame_types[c] in lpc_types:
+                table.k[i, c] = ricer.guess_parameter(residual)
+                stream = ricer.frame_to_bitstream(residual, table.k[i, c])
+            else:
+                stream = bitarray()
+            table.streams[i * table.channels + c] = stream
+            table.stream_len[i, c] = len(stream)
+
+        # A frame is stored raw if any residual takes more bits than the raw samples
+        if all(frame_type in lpc_types for frame_type in frame_types):
+            if (table.stream_len[i] >= residuals[0].shape[0] * bits_per_sample).any():
+                frame_types[:] = SubframeType.RAW
+
+        # Raw frames are faster to decode, they are preferred unless the LPC frame is smaller by more than the penalty
+        if decode_penalty and all(frame_type in lpc_types for frame_type in frame_types):
+            order = table.order[i]
+            lpc_bits = table.stream_len[i].sum() + (table.channels * bits_per_sample + lpc_precision) * order
+            if lpc_bits * (1 + decode_penalty) >= table.channels * table.blocksize[i] * bits_per_sample:
+                frame_types[:] = SubframeType.RAW
+
+        # Frames without LPC subframes store neither residuals nor coefficients, see Encoder._summary
+        if not any(frame_type in lpc_types for frame_type in frame_types):
+            table.streams[i * table.channels:(i + 1) * table.channels] = [bitarray() for _ in range(table.channels)]
+            table.stream_len[i] = 0
+            table.order[i] = 0
+
+    if serialize is not None:
+        serialize(table)
+    return table
+
+
+def _lpc_counts(table: FrameTable) -> (int, int):
+    """
+    Count the frames which store LPC coefficients, those with any LPC or LPC_COMMON subframe, and their coefficients
+    :param table: encoded table
+    :return: tuple of frames and coefficients
+    """
+    lpc = ((table.frame_type == SubframeType.LPC) | (table.frame_type == SubframeType.LPC_COMMON)).any(axis=1)
+    return int(lpc.sum()), int(table.order[lpc].sum())
+
+
+def _encode_shared(table: FrameTable, samplebuffer: tuple, residuals: tuple, encode: callable) -> FrameTable:
+    """
+    Worker encoding a batch of frames, the samples and residuals are in shared memory
+    :param table: detached table of the batch, see FrameTable.split
+    :param samplebuffer: descriptor of the shared samplebuffer
+    :param residuals: descriptor of the shared residual buffer
+    :param encode: function encoding a frame table, see _encode_frames
+    :return: detached encoded table
+    """
+    samples, residuals = SharedArray.attach(samplebuffer), SharedArray.attach(residuals)
+    try:
+        table.attach(samples.array, residuals.array)
+        encode(table)
+    finally:
+        # every view of the shared memory must be dropped before it is closed
+        table.detach()
+        samples.close()
+        residuals.close()
+    return table
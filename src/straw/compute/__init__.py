@@ -1 +1,3 @@
-from .df_parallel import ParallelCompute
+from .df_parallel import ParallelCompute, available_cpus
+from .pipeline import Consumer, prefetch
+from .shared import SharedArray
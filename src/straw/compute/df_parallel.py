@@ -1,21 +1,54 @@
+import atexit
+import os
+import queue
+import threading
 from functools import partial
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, cpu_count, current_process, resource_tracker
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 import pandas as pd
 from pandas.core.groupby import DataFrameGroupBy
 
 
+_worker = threading.local()  # marks the threads running a task of the pool
+
+
+def in_worker() -> bool:
+    """
+    Check whether the caller runs inside a task of the worker pool, nested parallel calls then run serially
+    Process workers can't start their own workers and thread workers waiting on the shared pool could deadlock it
+    :return: True inside a worker
+    """
+    return getattr(_worker, "active", False) or current_process().daemon
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process may run on, respects the CPU affinity where it is supported
+    :return: number of CPUs
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return cpu_count()
+
+
 class ParallelCompute:
     """
-    Class used to access the thread pool
+    Class used to access the worker pool
+    The pool is started by the first parallel call and reused by the following ones until ParallelCompute.shutdown
+    The workers are processes by default, with the "threads" backend they are threads of this process,
+    which is useful where forking is not possible - the heavy kernels release the GIL
     This class is a singleton
     """
     __instance = None
+    backends = ("processes", "threads")
 
     cpus: int
-    _apply_args: tuple
-    _apply_kwargs: dict
+    backend: str
+
+    _pool: Pool = None
+    _pool_pid: int = None  # the pool belongs to this process, forked workers must not use it
 
     @staticmethod
     def get_instance():
@@ -27,24 +60,135 @@ class ParallelCompute:
             ParallelCompute()
         return ParallelCompute.__instance
 
-    def __init__(self, cpus=cpu_count()):
+    def __init__(self, cpus: int = None, backend: str = "processes"):
         """
         Private constructor
-        :param cpus: number of CPUs to use when parallel is True, None means use all
+        :param cpus: number of workers, None means all available CPUs
+        :param backend: "processes" or "threads"
         """
         if ParallelCompute.__instance is not None:
             raise RuntimeError("This class is a singleton!")
         else:
             ParallelCompute.__instance = self
+        self.cpus = cpus or available_cpus()
+        self.set_backend(backend)
+        atexit.register(self.shutdown)
+
+    def __getstate__(self):
+        # objects sent to the workers may carry the instance (e.g. Ricer), but never the pool
+        state = self.__dict__.copy()
+        state.pop("_pool", None)
+        return state
+
+    @property
+    def shares_memory(self) -> bool:
+        """
+        Whether the workers share the memory of this process, so that the data need not be pickled
+        :return: True for the "threads" backend
+        """
+        return self.backend == "threads"
+
+    def set_backend(self, backend: str):
+        """
+        Set the type of the workers, a running pool of a different type is shut down
+        :param backend: "processes" or "threads"
+        :return: None
+        """
+        if backend not in self.backends:
+            raise ValueError(f"Unknown backend: {backend}, expected one of {self.backends}")
+        if backend != getattr(self, "backend", backend):
+            self.shutdown()
+        self.backend = backend
+
+    def set_cpus(self, cpus: int = None):
+        """
+        Set the number of worker processes, a running pool of a different size is shut down
+        :param cpus: number of worker processes, None means all available CPUs
+        :return: None
+        """
+        cpus = cpus or available_cpus()
+        if cpus != self.cpus:
+            self.shutdown()
         self.cpus = cpus
 
+    def get_pool(self) -> Pool:
+        """
+        Get the running pool of ParallelCompute.cpus workers, it is started on the first call
+        Calls requesting fewer processes share the pool and limit the number of their running tasks instead
+        :return: process or thread pool
+        """
+        if self._pool is not None and self._pool_pid != os.getpid():
+            self.shutdown()
+        if self._pool is None:
+            if self.shares_memory:
+                self._pool = ThreadPool(self.cpus)
+            else:
+                # the workers must share the resource tracker of this process, otherwise each of them would report
+                # the shared memory blocks it attached to as leaked when it exits
+                resource_tracker.ensure_running()
+                self._pool = Pool(self.cpus)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def shutdown(self):
+        """
+        Stop the workers, the next parallel call starts a new pool
+        :return: None
+        """
+        if self._pool is None:
+            return
+        if self._pool_pid == os.getpid():
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
+
+    def _pool_map(self, func, data, processes: int = None, chunksize: int = None) -> list:
+        if in_worker():
+            return list(map(func, data))
+        if processes is not None and processes < self.cpus:
+            results = [None] * len(data)
+            for i, result in self._limited(func, data, processes):
+                results[i] = result
+            return results
+        return self.get_pool().map(func, data, chunksize=chunksize)
+
+    def _limited(self, func, data, processes: int):
+        """
+        Run the tasks on the pool with at most the given number of them running at once,
+        the next task is submitted when one finishes
+        :param func: function to apply
+        :param data: items to which func will be applied
+        :param processes: maximal number of running tasks
+        :return: generator of (position, result) tuples in the order of completion
+        """
+        pool = self.get_pool()
+        done = queue.SimpleQueue()
+        items = enumerate(data)
+        running = 0
+
+        def submit():
+            for i, item in items:
+                pool.apply_async(func, (item,), callback=lambda result: done.put((i, result, None)),
+                                 error_callback=lambda error: done.put((i, None, error)))
+                return 1
+            return 0
+
+        for _ in range(max(processes, 1)):
+            running += submit()
+        while running:
+            i, result, error = done.get()
+            running -= 1
+            if error is not None:
+                raise error
+            running += submit()
+            yield i, result
+
     def _parallelize(self, data, func):
-        with Pool(self.cpus) as pool:
-            data = pool.map(func, np.array_split(data, self.cpus))
-        return pd.concat(data)
+        return pd.concat(self._pool_map(func, np.array_split(data, self.cpus)))
 
-    def _run_on_subset(self, func, data_subset):
-        return data_subset.apply(func, args=self._apply_args, **self._apply_kwargs)
+    @staticmethod
+    def _run_on_subset(func, args, kwargs, data_subset):
+        return _run_in_worker(data_subset.apply, func, args=args, **kwargs)
 
     def map(self, data, func: callable, args=(), **kwargs) -> pd.Series:
         """
@@ -55,14 +199,11 @@ class ParallelCompute:
         :param kwargs: kwargs to use in apply
         :return: DataFrame or Series with applied data
         """
-        self._apply_args = args
-        self._apply_kwargs = kwargs
-        return self._parallelize(data, partial(self._run_on_subset, func))
+        return self._parallelize(data, partial(self._run_on_subset, func, args, kwargs))
 
     def _group_parallelize(self, data, func):
         chunksize = max(int(len(data) / self.cpus) * 2, 1)
-        with Pool(self.cpus + 1) as p:
-            ret_list = p.map(func, [group for name, group in data], chunksize=chunksize)
+        ret_list = self._pool_map(func, [group for name, group in data], chunksize=chunksize)
         if not ret_list:
             return None
         elif isinstance(ret_list[0], (pd.Series, pd.DataFrame)):
@@ -70,8 +211,10 @@ class ParallelCompute:
         else:
             return ret_list
 
-    def _group_run_on_subset(self, func, data_subset):
-        return func(data_subset, *self._apply_args, **self._apply_kwargs)
+    @staticmethod
+    def _group_run_on_subset(func, args, kwargs, data_subset):
+        # the arguments are bound to each call, the thread workers share this instance
+        return _run_in_worker(func, data_subset, *args, **kwargs)
 
     def map_group(self, data: DataFrameGroupBy, func: callable, args=(), **kwargs) -> pd.DataFrame:
         """
@@ -82,24 +225,61 @@ class ParallelCompute:
         :param kwargs: kwargs to use in apply
         :return: DataFrame or Series with applied data
         """
-        self._apply_args = args
-        self._apply_kwargs = kwargs
-        return self._group_parallelize(data, partial(self._group_run_on_subset, func))
+        return self._group_parallelize(data, partial(self._group_run_on_subset, func, args, kwargs))
+
+    def _ndarray_parallelize(self, data, func, processes=None):
+        return self._pool_map(func, data, processes)
+
+    def map_list(self, data: list, func: callable, args=(), processes: int = None, **kwargs) -> list:
+        """
+        Apply the function to each item of the given list in parallel
+        :param data: list of picklable items
+        :param func: function to apply
+        :param args: args to use in apply
+        :param processes: maximal number of tasks running at once, None means ParallelCompute.cpus
+        :param kwargs: kwargs to use in apply
+        :return: list of results in the order of data
+        """
+        return self._ndarray_parallelize(data, partial(self._group_run_on_subset, func, args, kwargs), processes)
 
-    def _ndarray_parallelize(self, data, func):
-        with Pool(self.cpus) as p:
-            ret_list = p.map(func, data)
-        return ret_list
+    def map_unordered(self, data: list, func: callable, args=(), processes: int = None, **kwargs):
+        """
+        Apply the function to each item of the given list in parallel, one item at a time
+        Unlike map_list the items are not grouped, so items of very different costs (e.g. files) are balanced
+        :param data: list of picklable items
+        :param func: function to apply
+        :param args: args to use in apply
+        :param processes: maximal number of tasks running at once, None means ParallelCompute.cpus
+        :param kwargs: kwargs to use in apply
+        :return: generator of the results in the order of completion
+        """
+        func = partial(self._group_run_on_subset, func, args, kwargs)
+        if in_worker():
+            return map(func, data)
+        if processes is not None and processes < self.cpus:
+            return (result for _, result in self._limited(func, data, processes))
+        return self.get_pool().imap_unordered(func, data)
 
-    def map_ndarray(self, data: np.array, func: callable, args=(), **kwargs):
+    def map_ndarray(self, data: np.array, func: callable, args=(), processes: int = None, **kwargs):
         """
         Apply the functiom to the given numpy array in parallel
         :param data: numpy array to which func will be applied
         :param func: function to apply
         :param args: args to use in apply
+        :param processes: maximal number of tasks running at once, None means ParallelCompute.cpus
         :param kwargs: kwargs to use in apply
         :return: DataFrame or Series with applied data
         """
-        self._apply_args = args
-        self._apply_kwargs = kwargs
-        return self._ndarray_parallelize(data, partial(self._group_run_on_subset, func))
+        return self._ndarray_parallelize(data, partial(self._group_run_on_subset, func, args, kwargs), processes)
+
+
+def _run_in_worker(func, *args, **kwargs):
+    """
+    Run a task of the pool, marking the thread as a worker, see in_worker
+    """
+    active = getattr(_worker, "active", False)
+    _worker.active = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _worker.active = active
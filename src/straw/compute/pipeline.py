@@ -0,0 +1,124 @@
+import threading
+from queue import Queue, Full
+
+"""
+Pipeline stages running in background threads, connected by bounded queues
+"""
+
+_END = object()
+
+
+def _put(queue: Queue, item, stop: threading.Event) -> bool:
+    """
+    Put an item into a bounded queue unless the pipeline is stopped
+    :param queue: target queue
+    :param item: queued item
+    :param stop: event set when the receiving side gave up
+    :return: True if the item was queued
+    """
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def prefetch(iterable, depth: int = 2):
+    """
+    Iterate over an iterable in a background thread, at most depth items are produced ahead of the consumer
+    Errors raised by the iterable are raised by the returned generator
+    :param iterable: source of the items, e.g. a generator reading the input
+    :param depth: maximal number of items waiting in the queue
+    :return: generator of the items in their order
+    """
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(queue, (item, None), stop):
+                    return
+            _put(queue, (_END, None), stop)
+        except BaseException as e:
+            _put(queue, (_END, e), stop)
+
+    thread = threading.Thread(target=produce, name="straw-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class Consumer:
+    """
+    Process items in order in a background thread, e.g. write the encoded frames while the next ones are encoded
+    At most depth items wait in the queue, Consumer.put blocks when the consumer falls behind
+    """
+
+    def __init__(self, func: callable, depth: int = 2):
+        """
+        Start the consumer thread
+        :param func: function called with every item
+        :param depth: maximal number of items waiting in the queue
+        """
+        self._func = func
+        self._queue = Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._consume, name="straw-consumer", daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        """
+        Queue an item, raise the error of a failed consumer
+        :param item: item passed to the function
+        :return: None
+        """
+        self._raise()
+        self._queue.put(item)
+
+    def close(self):
+        """
+        Wait until all queued items are processed, raise the error of a failed consumer
+        :return: None
+        """
+        self._queue.put(_END)
+        self._thread.join()
+        self._raise()
+
+    def _consume(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                continue  # drain the queue so that the producer is never blocked
+            try:
+                self._func(item)
+            except BaseException as e:
+                self._error = e
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # the original error is raised, the consumer is only stopped
+            self._queue.put(_END)
+            self._thread.join()
@@ -0,0 +1,61 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class SharedArray:
+    """
+    Numpy array stored in a named shared memory block
+    Other processes can attach to the same memory using the descriptor
+    NOTE: every view of the array must be deleted before the block is closed
+    """
+    array: np.ndarray
+
+    def __init__(self, shape: tuple, dtype, name: str = None):
+        """
+        Create a new shared array or attach to an existing one
+        :param shape: shape of the array
+        :param dtype: numpy dtype of the array
+        :param name: name of an existing shared memory block, if None a new block is created
+        """
+        self.shape = tuple(int(x) for x in shape)
+        self.dtype = np.dtype(dtype)
+        if name is None:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._shm = SharedMemory(create=True, size=size)
+        else:
+            self._shm = SharedMemory(name=name)
+        self.name = self._shm.name
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def attach(cls, descriptor: tuple):
+        """
+        Attach to a shared array created by another process
+        :param descriptor: descriptor returned by SharedArray.descriptor
+        :return: attached shared array
+        """
+        name, shape, dtype = descriptor
+        return cls(shape, dtype, name=name)
+
+    def descriptor(self) -> tuple:
+        """
+        Picklable description of the shared array
+        :return: tuple of (name, shape, dtype)
+        """
+        return self.name, self.shape, self.dtype.str
+
+    def close(self):
+        """
+        Close the access to the shared memory from this process
+        :return: None
+        """
+        del self.array
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Request the destruction of the shared memory block, should be called once by the creator
+        :return: None
+        """
+        self._shm.unlink()
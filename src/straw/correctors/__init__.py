@@ -7,16 +7,29 @@ from .gain import GainCorrector
 from .shift import ShiftCorrector
 
 
+def _create_corrector(correction: str, shift_limit: int = None):
+    if correction == "gain":
+        return GainCorrector()
+    elif correction == "bias":
+        return BiasCorrector()
+    elif correction == "shift":
+        return ShiftCorrector(shift_limit)
+    else:
+        raise ValueError(f"Invalid correction name: '{correction}', must be one of ('gain', 'bias', 'shift')")
+
+
 def apply_corrections(data: np.array,
                       corrections: tuple,
                       target_params: StreamParams = StreamParams(),
-                      force_inplace: bool = False):
+                      force_inplace: bool = False,
+                      shift_limit: int = None):
     """
     Apply the given corrections to the data in thegiven order
     :param data: array to apply the corrections to - ndarray with dimensions (channels, samples)
     :param corrections: corrections to apply
     :param target_params: stream params where the correction params should be stored
     :param force_inplace: force the operation inplace (mainly shift correction)
+    :param shift_limit: lag limit of the shift correction, see ShiftCorrector
     :return:
     """
     for correction in corrections:
@@ -25,9 +38,61 @@ def apply_corrections(data: np.array,
         elif correction == "bias":
             BiasCorrector().apply(data, target_params)
         elif correction == "shift":
-            sc = ShiftCorrector()
+            sc = ShiftCorrector(shift_limit)
             sc.apply(data, target_params)
             if force_inplace:
                 sc.apply_to_ndarray(data)
         else:
             raise ValueError(f"Invalid correction name: '{correction}', must be one of ('gain', 'bias', 'shift')")
+
+
+def estimate_corrections(chunks: callable, corrections: tuple, target_params: StreamParams,
+                         shift_limit: int = None):
+    """
+    Estimate the params of the given corrections from a signal read in chunks, see apply_corrections
+    Corrections that do not depend on each other share the passes over the signal
+    :param chunks: callable returning a new iterator over the chunks of the signal - ndarrays with dimensions
+    (channels, samples)
+    :param corrections: corrections to estimate
+    :param target_params: stream params where the correction params should be stored, channels and total_samples
+    must be set
+    :param shift_limit: lag limit of the shift correction, see ShiftCorrector
+    :return: None
+    """
+    correctors = [_create_corrector(correction, shift_limit) for correction in corrections]
+    passes_done = [0 for _ in correctors]
+    while any(done < c.passes for c, done in zip(correctors, passes_done)):
+        # every pending corrector up to the first pending one that modifies the data
+        active = []
+        for i, c in enumerate(correctors):
+            if passes_done[i] < c.passes:
+                active.append(i)
+                if c.modifies_data:
+                    break
+
+        for i in active:
+            correctors[i].begin_pass(passes_done[i], target_params)
+        offset = 0
+        for chunk in chunks():
+            for i, c in enumerate(correctors[:active[-1] + 1]):
+                if i in active:
+                    c.update(chunk, offset)
+                elif c.modifies_data:
+                    chunk = chunk.copy()
+                    c.apply_params(chunk, target_params)
+            offset += chunk.shape[1]
+        for i in active:
+            correctors[i].end_pass(passes_done[i], target_params)
+            passes_done[i] += 1
+
+
+def apply_corrections_params(data: np.array, corrections: tuple, target_params: StreamParams):
+    """
+    Apply the given corrections with already estimated params, see estimate_corrections
+    :param data: array to apply the corrections to - ndarray with dimensions (channels, samples)
+    :param corrections: corrections to apply
+    :param target_params: stream params where the correction params are stored
+    :return: None
+    """
+    for correction in corrections:
+        _create_corrector(correction).apply_params(data, target_params)
@@ -5,6 +5,10 @@ from straw.io.params import StreamParams
 
 
 class BaseCorrector:
+    # Streaming estimation, see correctors.estimate_corrections
+    passes: int = 0  # number of passes over the signal needed to estimate the params
+    modifies_data: bool = False  # whether the correction changes the samples, later corrections must see the result
+
     def apply(self, samplebuffer: np.ndarray, params: StreamParams) -> (np.ndarray, np.ndarray):
         """
         Apply a correction
@@ -23,6 +27,42 @@ class BaseCorrector:
         """
         return
 
+    def apply_params(self, samplebuffer: np.ndarray, params: StreamParams):
+        """
+        Apply a correction with params estimated beforehand, used when the signal is processed in chunks
+        :param samplebuffer: array to apply the corrections to - ndarray with dimensions (channels, samples)
+        :param params: stream params where the correction params are stored
+        :return: None
+        """
+        return
+
+    def begin_pass(self, pass_num: int, params: StreamParams):
+        """
+        Start a pass of the streaming estimation
+        :param pass_num: number of the pass, starting from 0
+        :param params: stream params, channels and total_samples must be set
+        :return: None
+        """
+        return
+
+    def update(self, chunk: np.ndarray, offset: int):
+        """
+        Feed the next chunk of the signal to the streaming estimation
+        :param chunk: ndarray with dimensions (channels, samples)
+        :param offset: position of the first sample of the chunk in the signal
+        :return: None
+        """
+        return
+
+    def end_pass(self, pass_num: int, params: StreamParams):
+        """
+        Finish a pass of the streaming estimation, the last pass stores the correction params
+        :param pass_num: number of the pass, starting from 0
+        :param params: stream params where the correction params should be stored
+        :return: None
+        """
+        return
+
     def df_wrap_apply(self, frameset: pd.Series):
         """
         DataFrame wrapper
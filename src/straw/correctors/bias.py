@@ -5,6 +5,9 @@ from straw.io.params import StreamParams
 
 
 class BiasCorrector(BaseCorrector):
+    passes = 1
+    modifies_data = True
+
     def apply(self, samplebuffer: np.ndarray, params: StreamParams) -> (np.ndarray, np.ndarray):
         bias = np.zeros(samplebuffer.shape[0], dtype=np.int8)
         for i in range(samplebuffer.shape[0]):
@@ -15,3 +18,22 @@ class BiasCorrector(BaseCorrector):
     def apply_revert(self, samplebuffer: np.ndarray, params: StreamParams) -> (np.ndarray, np.ndarray):
         for i in range(params.channels):
             samplebuffer[i] += params.bias[i]
+
+    def apply_params(self, samplebuffer: np.ndarray, params: StreamParams):
+        for i in range(samplebuffer.shape[0]):
+            samplebuffer[i] -= params.bias[i]
+
+    def begin_pass(self, pass_num: int, params: StreamParams):
+        self._sums = np.zeros(params.channels, dtype=np.int64)
+        self._count = 0
+
+    def update(self, chunk: np.ndarray, offset: int):
+        self._sums += chunk.sum(axis=1, dtype=np.int64)
+        self._count += chunk.shape[1]
+
+    def end_pass(self, pass_num: int, params: StreamParams):
+        # the integer sums are exact, so the means are the same as in BiasCorrector.apply
+        bias = np.zeros(params.channels, dtype=np.int8)
+        for i in range(params.channels):
+            bias[i] = self._sums[i] / self._count
+        params.bias = bias
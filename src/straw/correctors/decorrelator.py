@@ -147,11 +147,23 @@ class Decorrelator:
         if col_name not in df.columns:
             raise ValueError(f"Column '{col_name}' not in dataframe")
 
-        if not (df["frame_type"] == SubframeType.LPC_COMMON).all() or len(df) == 1:
-            return df
+        Decorrelator.midside_decorrelate_frames(df[col_name].tolist(), df["frame_type"].values, iterated=iterated)
+        return df
 
-        order = Decorrelator._find_closest_lower_power_of_two(len(df))
-        if order != len(df):
+    @staticmethod
+    def midside_decorrelate_frames(frames: list, frame_types: np.array, iterated: bool = True):
+        """
+        Apply the mid-side decorrelation to the subframes of one frame in place
+        :param frames: arrays of all channels
+        :param frame_types: types of the subframes, only frames with all subframes LPC_COMMON are decorrelated
+        :param iterated: whether the decorrelation should be performed in iterations
+        :return: None
+        """
+        if not (np.asarray(frame_types) == SubframeType.LPC_COMMON).all() or len(frames) == 1:
+            return
+
+        order = Decorrelator._find_closest_lower_power_of_two(len(frames))
+        if order != len(frames):
             iterated = False
 
         if iterated:
@@ -159,14 +171,40 @@ class Decorrelator:
             while order > 1:
                 indices = np.rot90(indices).reshape(-1, 2)
                 for idx1, idx2 in indices:
-                    Modifiers.transform_midside(df.loc[df.index[idx1], col_name], x2=df.loc[df.index[idx2], col_name])
+                    Modifiers.transform_midside(frames[idx1], x2=frames[idx2])
                 order = order >> 1
         else:
-            indices = np.arange((len(df) // 2) * 2).reshape((-1, 2))
+            indices = np.arange((len(frames) // 2) * 2).reshape((-1, 2))
             for idx1, idx2 in indices:
-                Modifiers.transform_midside(df.loc[df.index[idx1], col_name], x2=df.loc[df.index[idx2], col_name])
+                Modifiers.transform_midside(frames[idx1], x2=frames[idx2])
 
-        return df
+    @staticmethod
+    def midside_fits(frames: list, frame_types: np.array, dtype: np.dtype) -> bool:
+        """
+        Check whether the mid-side decorrelation of one frame can be reverted in place in a buffer of the given type,
+        like the decoder does in the samplebuffer
+        :param frames: arrays of all channels, not modified
+        :param frame_types: types of the subframes, see midside_decorrelate_frames
+        :param dtype: type of the buffer
+        :return: True if every intermediate value fits the type or the frame is not decorrelated
+        """
+        if not (np.asarray(frame_types) == SubframeType.LPC_COMMON).all() or len(frames) == 1:
+            return True
+
+        # Every iteration at most doubles the peak
+        info = np.iinfo(dtype)
+        levels = int(np.ceil(np.log2(len(frames))))
+        peak = max(int(np.abs(frame).max(initial=0)) for frame in frames)
+        if peak << levels <= info.max:
+            return True
+
+        transformed = [frame.astype(np.int64) for frame in frames]
+        Decorrelator.midside_decorrelate_frames(transformed, frame_types)
+        if any(frame.min(initial=0) < info.min or frame.max(initial=0) > info.max for frame in transformed):
+            return False
+        restored = [frame.astype(dtype) for frame in transformed]
+        Decorrelator.midside_decorrelate_revert_frames(restored, frame_types)
+        return all(np.array_equal(original, frame) for original, frame in zip(frames, restored))
 
     @staticmethod
     def midside_decorrelate_revert(df: pd.DataFrame, col_name: str = "residual", iterated: bool = True):
@@ -180,28 +218,40 @@ class Decorrelator:
         if col_name not in df.columns:
             raise ValueError(f"Column '{col_name}' not in dataframe")
 
-        if not (df["frame_type"] == SubframeType.LPC_COMMON).all():
-            return df
+        Decorrelator.midside_decorrelate_revert_frames(df[col_name].tolist(), df["frame_type"].values,
+                                                       iterated=iterated)
+        return df
+
+    @staticmethod
+    def midside_decorrelate_revert_frames(frames: list, frame_types: np.array, iterated: bool = True):
+        """
+        Apply the reverse of mid-side decorrelation to the subframes of one frame in place
+        See Decorrelator.midside_decorrelate_frames
+        :param frames: arrays of all channels
+        :param frame_types: types of the subframes, only frames with all subframes LPC_COMMON were decorrelated
+        :param iterated: whether the decorrelation was performed in iterations
+        :return: None
+        """
+        if not (np.asarray(frame_types) == SubframeType.LPC_COMMON).all() or len(frames) == 1:
+            return
+
+        order = Decorrelator._find_closest_lower_power_of_two(len(frames))
+        if order != len(frames):
+            iterated = False
 
         if iterated:
-            order = Decorrelator._find_closest_lower_power_of_two(len(df))
             indices = np.arange(order).reshape((-1, 2))
-
             while order > 1:
                 indices = np.rot90(indices).reshape(-1, 2)
                 order = order >> 1
 
-            order = Decorrelator._find_closest_lower_power_of_two(len(df))
+            order = len(frames)
             while order > 1:
                 for idx1, idx2 in indices:
-                    Modifiers.transform_midside_reverse(df.loc[df.index[idx1], col_name],
-                                                        x2=df.loc[df.index[idx2], col_name])
+                    Modifiers.transform_midside_reverse(frames[idx1], x2=frames[idx2])
                 indices = np.rot90(indices.reshape(2, -1), k=-1)
                 order = order >> 1
         else:
-            indices = np.arange((len(df) // 2) * 2).reshape((-1, 2))
+            indices = np.arange((len(frames) // 2) * 2).reshape((-1, 2))
             for idx1, idx2 in indices:
-                Modifiers.transform_midside_reverse(df.loc[df.index[idx1], col_name],
-                                                    x2=df.loc[df.index[idx2], col_name])
-
-        return df
+                Modifiers.transform_midside_reverse(frames[idx1], x2=frames[idx2])
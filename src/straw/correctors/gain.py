@@ -6,6 +6,9 @@ from straw.io.sizes import StrawSizes
 
 
 class GainCorrector(BaseCorrector):
+    passes = 1
+    modifies_data = True
+
     def apply(self, samplebuffer: np.ndarray, params: StreamParams) -> (np.ndarray, np.ndarray):
         factors = self.find_factors(samplebuffer, StrawSizes.metadata_block_streaminfo.gain)
         for i in range(samplebuffer.shape[0]):
@@ -28,6 +31,33 @@ class GainCorrector(BaseCorrector):
 
             self.deequalize(samplebuffer[i], factors[i])
 
+    def apply_params(self, samplebuffer: np.ndarray, params: StreamParams):
+        factors = self.dequantize_factors(params.gain, params.gain_shift)
+        for i in range(samplebuffer.shape[0]):
+            if factors[i] == 1.0:
+                continue
+
+            self.equalize(samplebuffer[i], factors[i])
+
+    def begin_pass(self, pass_num: int, params: StreamParams):
+        self._sums = np.zeros(params.channels, dtype=np.int64)
+        self._squares = np.zeros(params.channels, dtype=np.int64)
+        self._count = 0
+
+    def update(self, chunk: np.ndarray, offset: int):
+        chunk = chunk.astype(np.int64)
+        self._sums += chunk.sum(axis=1)
+        self._squares += (chunk * chunk).sum(axis=1)
+        self._count += chunk.shape[1]
+
+    def end_pass(self, pass_num: int, params: StreamParams):
+        # standard deviation from the exact integer sums, see GainCorrector.energy
+        n = self._count
+        energies = np.asarray([np.sqrt(max(int(sq) * n - int(s) * int(s), 0) / (n * n))
+                               for s, sq in zip(self._sums, self._squares)])
+        factors = self.factors_from_energies(energies, StrawSizes.metadata_block_streaminfo.gain)
+        params.gain, params.gain_shift = self.quantize_factors(factors, StrawSizes.metadata_block_streaminfo.gain)
+
     @staticmethod
     def quantize_factors(factors: np.ndarray, precision: int):
         """
@@ -95,6 +125,15 @@ class GainCorrector(BaseCorrector):
         :return:
         """
         energies = np.asarray([self.energy(channel_data) for channel_data in samplebuffer])
+        return self.factors_from_energies(energies, precision)
+
+    def factors_from_energies(self, energies: np.ndarray, precision: int):
+        """
+        Find the factors equalizing the given channel energies
+        :param energies: energy of each channel
+        :param precision: desired quantization precision in bits
+        :return:
+        """
         strongest_idx = energies.argmax()
         factors = energies[strongest_idx] / energies
 
@@ -1,27 +1,48 @@
 import numpy as np
 import pandas as pd
-from scipy.signal import get_window
 
-from straw.compute import ParallelCompute
 from straw.correctors.base import BaseCorrector
 from straw.io.params import StreamParams
+from straw.io.sizes import StrawSizes
 
 
 class ShiftCorrector(BaseCorrector):
+    """
+    Finds the delays of the channels against the leading channel, the delayed channels are then framed with a lag
+    The signal is weighted by a Nuttall window over its whole length and the lags are the maxima of the
+    cross-correlations with the leading channel. The correlations are computed exactly in blocks of
+    ShiftCorrector.block_size samples for all channels at once, so the memory does not depend on the length
+    of the signal. The in-memory ShiftCorrector.apply runs the same passes as the streaming estimation.
+    """
     _lags: np.array = None
+    _leading_channel: int = None
+
+    passes = 2  # the lags are measured against the leading channel found in the first pass
+    limit = 10  # the lags are at most limit - 2 samples
+    max_limit = (1 << StrawSizes.metadata_block_streaminfo.shift) + 1  # the largest lag the format can store
+    block_size = 1 << 14  # samples correlated at once
+    _nuttall = (0.3635819, 0.4891775, 0.1365995, 0.0106411)
+
+    def __init__(self, limit: int = None):
+        """
+        :param limit: lag limit, the lags are at most limit - 2 samples, None means ShiftCorrector.limit
+        """
+        if limit is not None:
+            if not 2 <= limit <= self.max_limit:
+                raise ValueError(f"Lag limit must be between 2 and {self.max_limit}")
+            self.limit = limit
+
+    def apply(self, samplebuffer: np.ndarray, params: StreamParams) -> (np.ndarray, np.ndarray):
+        for pass_num in range(self.passes):
+            self._begin_pass(pass_num, samplebuffer.shape[0], samplebuffer.shape[1])
+            self.update(samplebuffer, 0)
+            self.end_pass(pass_num, params)
 
-    def apply(self, samplebuffer: np.ndarray, params: StreamParams, limit=10, parallel=True) -> (
-    np.ndarray, np.ndarray):
-        windowed = (samplebuffer * get_window("nuttall", samplebuffer.shape[1])).astype(np.int64)
-        leading_channel = self._find_leading_channel(windowed, limit=limit, parallel=parallel)
-        params.lags = self._find_lags(windowed, leading_channel, limit=limit)
-        params.leading_channel = leading_channel
         total_size = samplebuffer.shape[1] - np.max(params.lags)
         for i in range(samplebuffer.shape[0]):
             lag = params.lags[i]
             params.removed_samples_start.append(samplebuffer[i][:lag])
             params.removed_samples_end.append(samplebuffer[i][total_size + lag:])
-        self._lags = params.lags
 
     def apply_to_ndarray(self, data):
         """
@@ -35,44 +56,94 @@ class ShiftCorrector(BaseCorrector):
 
     def df_wrap_apply(self, frameset: pd.Series):
         ndarr = np.stack(frameset.tolist())
-        self.apply(ndarr, StreamParams(), parallel=False)
+        self.apply(ndarr, StreamParams())
         self.apply_to_ndarray(ndarr)
         for i, idx in enumerate(frameset.index):
             frameset[idx][:] = ndarr[i]
 
-    def _find_leading_channel(self, samplebuffer: np.ndarray, limit, parallel):
-        lags = np.zeros(samplebuffer.shape[0], dtype=np.int8)
-        reference = samplebuffer[0]
-        if parallel:
-            lags[:] = ParallelCompute.get_instance().map_ndarray(samplebuffer, self._double_sided_corr,
-                                                                 reference=reference,
-                                                                 limit=limit)
-        else:
-            for i in range(1, samplebuffer.shape[0]):
-                lags[i] = self._double_sided_corr(samplebuffer[i], reference=reference, limit=limit)
+    def begin_pass(self, pass_num: int, params: StreamParams):
+        self._begin_pass(pass_num, params.channels, params.total_samples)
 
-        return np.argmin(lags)
+    def update(self, chunk: np.ndarray, offset: int):
+        for start in range(0, chunk.shape[1], self.block_size):
+            block = chunk[:, start:start + self.block_size]
+            self._update_block(block, offset + start)
 
-    def _find_lags(self, samplebuffer: np.ndarray, leading_channel, limit) -> np.ndarray:
-        lags = np.zeros(samplebuffer.shape[0], dtype=np.int8)
-        reference = samplebuffer[leading_channel]
-        # lags[:] = ParallelCompute.get_instance().map_ndarray(samplebuffer, self._corr, reference=reference,
-        #                                                      end=limit-1)
-        # lags[leading_channel] = 0
-        for i in range(samplebuffer.shape[0]):
-            if i == leading_channel:
-                continue
-            lags[i] = self._corr(frame=samplebuffer[i], reference=reference, end=limit - 1)
-        return lags
+    def end_pass(self, pass_num: int, params: StreamParams):
+        if pass_num == 0:
+            # lags against the first channel, positive when the channel is delayed
+            lags = np.zeros(self._pos.shape[0], dtype=np.int8)
+            for c in range(lags.shape[0]):
+                lag_pos = np.argmax(self._pos[c])
+                lag_neg = np.argmax(self._neg[c])
+                lags[c] = lag_pos if lag_pos >= lag_neg else -lag_neg
+            self._leading_channel = np.argmin(lags)
+        else:
+            lags = np.argmax(self._corrs, axis=1).astype(np.int8)
+            lags[self._leading_channel] = 0
+            params.lags = lags
+            params.leading_channel = self._leading_channel
+            self._lags = lags
+            self._leading_channel = None
 
-    def _double_sided_corr(self, frame: np.array, reference: np.array, limit):
-        lag_pos = self._corr(frame, reference, limit // 2 - 1)
-        lag_neg = self._corr(reference, frame, limit // 2)
-        return lag_pos if lag_pos >= lag_neg else -lag_neg
+    def _begin_pass(self, pass_num: int, channels: int, total_samples: int):
+        self._total_samples = total_samples
+        self._carry = np.zeros((channels, self.limit))
+        if pass_num == 0:
+            self._pos = np.zeros((channels, self.limit // 2 - 1), dtype=np.int64)
+            self._neg = np.zeros((channels, self.limit // 2), dtype=np.int64)
+        else:
+            self._corrs = np.zeros((channels, self.limit - 1), dtype=np.int64)
+
+    def _update_block(self, chunk: np.ndarray, offset: int):
+        n = chunk.shape[1]
+        # the windowed samples are truncated to integers, their products are summed exactly in float64
+        windowed = np.trunc(chunk * self._window_chunk(offset, offset + n, self._total_samples))
+        # samples of the previous chunk are kept to pair them with the new ones
+        data = np.concatenate((self._carry, windowed), axis=1)
+        carry = self.limit
+        if self._leading_channel is None:
+            reference = data[0]
+            self._pos += self._lagged_dots(reference, data[:, carry:], carry, self._pos.shape[1])
+            self._neg += self._lagged_dots(data, reference[carry:], carry, self._neg.shape[1])
+        else:
+            reference = data[self._leading_channel]
+            self._corrs += self._lagged_dots(reference, data[:, carry:], carry, self._corrs.shape[1])
+        self._carry = data[:, -carry:]
 
     @staticmethod
-    def _corr(frame: np.array, reference: np.array, end: int, start: int = 0) -> np.array:
-        return start + np.argmax([reference[:len(reference) - i].dot(frame[i:]) for i in range(start, end)])
+    def _lagged_dots(extended: np.ndarray, new: np.ndarray, carry: int, lags: int) -> np.ndarray:
+        """
+        Dot products of the new samples with the lagged extended samples for all channels at once
+        out[c, i] = extended[c, carry - i:carry - i + n].dot(new[c]) for i < lags, one of the inputs is a single
+        channel shared by all channels of the other one
+        The samples of a block are small enough for the float64 sums to be exact
+        :param extended: (channels, carry + n) or (carry + n,) samples including the carry of the previous block
+        :param new: (channels, n) or (n,) new samples
+        :param carry: number of carried samples
+        :param lags: number of lags, at most carry + 1
+        :return: (channels, lags) int64 dot products
+        """
+        n = new.shape[-1]
+        out = np.empty(((extended if extended.ndim == 2 else new).shape[0], lags))
+        for i in range(lags):
+            lagged = extended[..., carry - i:carry - i + n]
+            out[:, i] = lagged @ new if new.ndim == 1 else new @ lagged
+        return out.astype(np.int64)
+
+    def _window_chunk(self, start: int, stop: int, total: int) -> np.array:
+        """
+        Part of the window used in ShiftCorrector.apply, identical to get_window("nuttall", total)[start:stop]
+        :param start: first sample of the chunk
+        :param stop: sample after the last one
+        :param total: length of the whole window
+        :return: window values
+        """
+        fac = np.arange(start, stop, dtype=np.float64) * (2 * np.pi / total) + (-np.pi)
+        window = np.zeros(stop - start)
+        for k, a in enumerate(self._nuttall):
+            window += a * np.cos(k * fac)
+        return window
 
     @staticmethod
     def choose_idx(frames: pd.Series):
@@ -1,4 +1,5 @@
 import mmap
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
 from typing import BinaryIO
 
@@ -7,7 +8,9 @@ import pandas as pd
 from crcmod import mkCrcFun
 
 from straw import static
-from straw.io.bitarray import SlicedBitarray
+from straw.compute import ParallelCompute, SharedArray
+from straw.io.ext_bits import BitReader
+from straw.io.frames import FrameTable
 from straw.io.params import StreamParams
 from straw.rice import Ricer
 
@@ -54,77 +57,226 @@ class BaseIO:
 
 
 class BaseWriter(BaseIO):
-    def __init__(self, initial_params: StreamParams, output_stream: BinaryIO):
+    def __init__(self, initial_params: StreamParams, output_stream: BinaryIO = None):
+        """
+        :param initial_params: stream params
+        :param output_stream: target file, the stream header is written immediately
+                              None for a writer which only serializes frames, see BaseWriter.serialize
+        """
         self._params = initial_params
         self._f = output_stream
-        self._stream()
+        if output_stream is not None:
+            self._stream()
 
     def init_stream(self, params):
         self._params = params
         self._stream()
 
-    def write(self, data):
-        secs = data.groupby("seq").apply(self._frame)
-        for sec in secs:
-            sec.tofile(self._f)
+    def serialize(self, data: FrameTable):
+        """
+        Serialize the frames of a table into FrameTable.payloads, BaseWriter.write then only copies them
+        Used by the encoding workers, so that the frames are not serialized on one core after the encoding
+        :param data: encoded frames
+        :return: None
+        """
+        for i in range(data.frames):
+            data.payloads[i] = bytes(self._frame(data.rows(i)))
+
+    def write(self, data: FrameTable):
+        for i in range(data.frames):
+            payload = data.payloads[i]
+            if payload is None:
+                payload = self._frame(data.rows(i))
+            self._f.write(payload)
+            self._frame_written(int(data.seq[i]), int(data.blocksize[i]), memoryview(payload).nbytes)
 
     def close_stream(self, params):
         self._f.seek(0)
         self._params = params
         self._stream()
 
-    def _frame(self, df: pd.DataFrame):
+    def _frame(self, rows: list):
         """
         This should be overridden
         :return: None
         """
         pass
 
-    @staticmethod
-    def encode_int_utf8(val: int) -> bytes:
-        return chr(val).encode("utf-8")
+    def _frame_written(self, seq: int, blocksize: int, frame_bytes: int):
+        """
+        Called after a frame is written, can be overridden
+        :param seq: frame number
+        :param blocksize: number of samples in each subframe
+        :param frame_bytes: size of the frame in bytes
+        :return: None
+        """
+        pass
 
 
 class BaseReader(BaseIO):
-    _raw: list
-    _ricer = Ricer()
+    _table: FrameTable = None
+    _frame_num: int = 0  # position of the next parsed frame in the table
+    _ricer: Ricer
 
-    _sec: SlicedBitarray()
-    _memview: bytes
+    _sec: BitReader
+    _memview: memoryview
     _samplebuffer_ptr: int = 0
     _samplebuffer: np.array
+    _shared: SharedArray = None
+
+    _input_file: Path
+    _jobs: int = 1
+    _frame_hook: callable = None
+    _range: tuple = None
+    _metadata_only: bool = False
+    _window_start: int = 0
+    _window: tuple = None
+
+    _open_stack: ExitStack = None
 
     def __init__(self, show_progress: bool = True):
         self._params = StreamParams()
-        self._raw = []
+        self._ricer = Ricer()
         self.show_progress = show_progress
 
-    def load(self, input_file: Path) -> (pd.DataFrame, StreamParams):
+    def load(self, input_file: Path, jobs: int = 1, frame_hook: callable = None, start: int = None,
+             stop: int = None, metadata_only: bool = False):
         """
-        Saves the dataframe into a FLAC formatted binary file
+        Loads a Straw formatted binary file into a samplebuffer and a table of the frames, see BaseReader.get_table
+        NOTE: the file is only mapped into memory, the residuals are decoded directly from the mapped pages
         :param input_file: source file
-        :return: dataframe and params
+        :param jobs: number of processes decoding the frames, 1 means serial decoding
+        :param frame_hook: optional function called with the table and the position of every loaded frame,
+        with jobs > 1 it is called in the worker processes so it must be picklable
+        :param start: first sample to load, negative values count from the end, see BaseReader.get_window
+        :param stop: sample after the last one to load, None means until the end of the stream
+        :param metadata_only: stop after the metadata blocks, no samplebuffer is allocated and the table is None
+        :return: None
         """
-        with input_file.open("rb") as f:
-            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-            self._sec = SlicedBitarray(buffer=m)
-            self._memview = memoryview(self._sec).tobytes()
-            self._stream()
+        self._input_file = input_file
+        self._jobs = jobs
+        self._frame_hook = frame_hook
+        self._range = None if start is None and stop is None else (start, stop)
+        self._metadata_only = metadata_only
+        with self._mapped(input_file):
+            try:
+                self._stream()
+            finally:
+                self._release_shared_buffer()
         self._format_specific_checks()
-        self._raw.sort(key=lambda x: x["idx"])
-        self._data = pd.DataFrame(self._raw, columns=static.columns, copy=False)
 
-    def _allocate_buffer(self):
+    def open(self, input_file: Path) -> StreamParams:
+        """
+        Map the file into memory and parse only the metadata, the frames can be then decoded on demand
+        The file stays mapped until BaseReader.close is called
+        :param input_file: source file
+        :return: params
+        """
+        self.close()
+        self._input_file = input_file
+        self._metadata_only = True
+        self._open_stack = ExitStack()
+        self._open_stack.enter_context(self._mapped(input_file))
+        try:
+            self._stream()
+            self._format_specific_checks()
+        except BaseException:
+            self.close()
+            raise
+        return self._params
+
+    def close(self):
         """
-        Allocate the samplebuffer
+        Unmap the file opened by BaseReader.open
+        :return: None
+        """
+        if self._open_stack is not None:
+            self._open_stack.close()
+            self._open_stack = None
+
+    @contextmanager
+    def _mapped(self, input_file: Path):
+        """
+        Map the given file into memory for the duration of the context
+        :param input_file: source file
+        :return: None
+        """
+        with input_file.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            self._sec = BitReader(m)
+            self._memview = memoryview(m)
+            try:
+                yield
+            finally:
+                # every view into the map must be released before it is closed
+                self._memview.release()
+                del self._sec
+
+    def _allocate_buffer(self, total_samples: int = None):
+        """
+        Allocate the samplebuffer, in shared memory when the frames are decoded by multiple processes
+        :param total_samples: length of the samplebuffer, None means the length of the stream
         :return: None
         """
         channels = self._params.channels
-        total_samples = self._params.total_samples
+        if total_samples is None:
+            total_samples = self._params.total_samples
+        self._window = self._window or (0, total_samples)
         dtype_bits = static.soundfile_dtype[self._params.bits_per_sample]
-        self._samplebuffer = np.zeros((total_samples, channels), dtype=f"int{dtype_bits}")
+        if self._jobs > 1 and not ParallelCompute.get_instance().shares_memory:
+            self._shared = SharedArray((total_samples, channels), dtype=f"int{dtype_bits}")
+            self._samplebuffer = self._shared.array
+        else:
+            self._samplebuffer = np.zeros((total_samples, channels), dtype=f"int{dtype_bits}")
         self._samplebuffer = self._samplebuffer.swapaxes(1, 0)
 
+    def _release_shared_buffer(self):
+        """
+        Move the samplebuffer out of the shared memory, so that it outlives the shared memory block
+        :return: None
+        """
+        if self._shared is None:
+            return
+        self._samplebuffer = self._shared.array.copy().swapaxes(1, 0)
+        self._shared.close()
+        self._shared.unlink()
+        self._shared = None
+
+    def _place_samples(self, channel: int, sample: int, values: np.array):
+        """
+        Copy the given samples into the samplebuffer, ignoring the samples outside of the loaded window
+        :param channel: target channel
+        :param sample: position of the first value in the stream
+        :param values: samples to copy
+        :return: None
+        """
+        start = sample - self._window_start
+        lo = max(start, 0)
+        hi = min(start + len(values), self._samplebuffer.shape[1])
+        if lo < hi:
+            self._samplebuffer[channel][lo:hi] = values[lo - start:hi - start]
+
+    def get_window(self) -> (int, int):
+        """
+        Query the range of the requested samples in the samplebuffer
+        When only a part of the stream is loaded, the samplebuffer contains whole frames around the requested range
+        :return: start and stop index of the requested samples
+        """
+        return self._window
+
+    def get_table(self) -> FrameTable:
+        """
+        Query the table of the loaded frames, the samples of the frames are views of the samplebuffer
+        :return: table or None if no frames were loaded
+        """
+        return self._table
+
+    def get_data(self) -> pd.DataFrame:
+        """
+        Debug view of the loaded frames, see FrameTable.to_dataframe
+        :return: DataFrame with one row for each subframe or None if no frames were loaded
+        """
+        return None if self._table is None else self._table.to_dataframe()
+
     def get_buffer(self):
         """
         Query the samplebuffer view
@@ -0,0 +1,446 @@
+# distutils: language = c
+# cython: language_level=3
+import cython
+
+ctypedef fused integer_t:
+    signed char
+    short
+    int
+    long
+    long long
+
+##############
+# Bit reader #
+##############
+
+cdef class BitReader:
+    """
+    Reads big-endian bit fields directly from a byte buffer
+    Holds a pointer to the current position within the bitstream
+    Querying a value from the bitstream moves the pointer forward unless specified otherwise
+    """
+    cdef const unsigned char[:] _buf
+    cdef Py_ssize_t _pos
+    cdef Py_ssize_t _size
+
+    def __init__(self, const unsigned char[:] buffer, Py_ssize_t pos = 0):
+        """
+        Bit reader constructor
+        :param buffer: any object supporting the buffer protocol (bytes, memoryview, mmap, numpy array)
+        :param pos: starting position in bits
+        """
+        self._buf = buffer
+        self._size = buffer.shape[0] * 8
+        self._pos = pos
+
+    cdef int _check(self, Py_ssize_t length) except -1:
+        if length < 0 or self._pos + length > self._size:
+            raise ValueError("Unexpected EOF")
+        return 0
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef unsigned long long _read(self, int length):
+        """
+        Read an unsigned value of at most 64 bits, the caller is responsible for bounds checking
+        :param length: length of the value in bits
+        :return: unsigned value
+        """
+        cdef unsigned long long val = 0
+        cdef Py_ssize_t byte_i = self._pos >> 3
+        cdef int avail = 8 - (self._pos & 7)
+        cdef int remaining = length
+        cdef unsigned long long cur
+
+        self._pos += length
+        while remaining > 0:
+            cur = self._buf[byte_i] & ((1 << avail) - 1)
+            if remaining >= avail:
+                val = (val << avail) | cur
+                remaining -= avail
+                avail = 8
+                byte_i += 1
+            else:
+                val = (val << remaining) | (cur >> (avail - remaining))
+                remaining = 0
+        return val
+
+    cdef long long _read_signed(self, int length):
+        """
+        Read a signed two's-complement value of at most 64 bits, the caller is responsible for bounds checking
+        :param length: length of the value in bits
+        :return: signed value
+        """
+        cdef unsigned long long val = self._read(length)
+        if 0 < length < 64 and (val >> (length - 1)) & 1:
+            val |= (<unsigned long long> -1) << length
+        return <long long> val
+
+    def get_int(self, int length = 1, bint signed = False):
+        """
+        Get an integer from the bitstream
+        :param length: length of the integer in bits (at most 64)
+        :param signed: whether the integer is in a signed format
+        :return: integer
+        """
+        if length > 64:
+            raise ValueError("Integers longer than 64 bits are not supported")
+        self._check(length)
+        if signed:
+            return self._read_signed(length)
+        return self._read(length)
+
+    def get_ints(self, integer_t[:] target, int length, bint signed = False):
+        """
+        Fill the whole target array with consecutive integers from the bitstream
+        :param target: array to be filled
+        :param length: length of each integer in bits (at most 64)
+        :param signed: whether the integers are in a signed format
+        :return: None
+        """
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = target.shape[0]
+        if length > 64:
+            raise ValueError("Integers longer than 64 bits are not supported")
+        self._check(length * n)
+        if signed:
+            for i in range(n):
+                target[i] = <integer_t> self._read_signed(length)
+        else:
+            for i in range(n):
+                target[i] = <integer_t> self._read(length)
+
+    def get_bytes(self, Py_ssize_t length = 8) -> bytes:
+        """
+        Get bytes from the bitstream
+        :param length: number of bits to read, the last byte is zero-padded if not divisible by 8
+        :return: bytes
+        """
+        cdef bytearray out
+        cdef Py_ssize_t i
+        self._check(length)
+        if self._pos & 7 == 0 and length & 7 == 0:
+            self._pos += length
+            return bytes(self._buf[(self._pos - length) >> 3:self._pos >> 3])
+
+        out = bytearray((length + 7) >> 3)
+        for i in range(length >> 3):
+            out[i] = self._read(8)
+        if length & 7:
+            out[length >> 3] = self._read(length & 7) << (8 - (length & 7))
+        return bytes(out)
+
+    def get_int_utf8(self):
+        """
+        Get a "UTF-8" encoded integer from the stream
+        The extended FLAC variant is supported, which can store up to 36 bits in 7 bytes
+        :return: integer
+        """
+        self._check(8)
+        cdef unsigned long long val = self._read(8)
+        cdef int extra = 0
+        cdef unsigned long long mask = 0x80
+
+        while val & mask:
+            extra += 1
+            mask >>= 1
+        if extra == 1 or extra > 7:
+            raise ValueError("Invalid UTF-8 coded integer")
+        if extra:
+            extra -= 1
+            val &= mask - 1
+
+        self._check(8 * extra)
+        for _ in range(extra):
+            val = (val << 6) | (self._read(8) & 0x3f)
+        return val
+
+    def get_from(self, Py_ssize_t start) -> bytes:
+        """
+        Get the bytes between a given position and the current one
+        Both positions must be byte-aligned
+        :param start: starting position in bits
+        :return: bytes
+        """
+        if start & 7 or self._pos & 7 or start > self._pos:
+            raise ValueError("Positions must be byte-aligned")
+        return bytes(self._buf[start >> 3:self._pos >> 3])
+
+    def get_pos(self) -> int:
+        """
+        Get the current position within the bitstream
+        :return: bitstream position
+        """
+        return self._pos
+
+    def set_pos(self, Py_ssize_t pos):
+        """
+        Move to a given position within the bitstream
+        :param pos: new position in bits
+        :return: None
+        """
+        self._pos = pos
+
+    def advance(self, Py_ssize_t length = 8):
+        """
+        Advance the bitstream by a given amount of bits
+        :param length: number of bits to advance
+        :return: None
+        """
+        self._pos += length
+
+    def skip_padding(self):
+        """
+        Skip padding until the bitstream is byte-aligned
+        :return: None
+        """
+        self._pos = (self._pos + 7) & ~(<Py_ssize_t> 7)
+
+    def is_eof(self) -> bool:
+        """
+        Check whether the bitstream is at its end and has no bits to read
+        :return: True is EOF, False otherwise
+        """
+        return self._pos >= self._size
+
+##############
+# Bit writer #
+##############
+
+from cpython.buffer cimport PyBuffer_FillInfo
+from libc.stdlib cimport malloc, realloc, free
+from libc.string cimport memcpy
+
+cdef class BitWriter:
+    """
+    Writes big-endian bit fields into a growable byte buffer
+    Pending bits are collected in a 64-bit accumulator and flushed to the buffer byte by byte
+    The written bytes can be accessed through the buffer protocol once the stream is byte-aligned
+    """
+    cdef unsigned char *_data
+    cdef Py_ssize_t _len
+    cdef Py_ssize_t _cap
+    cdef unsigned long long _acc
+    cdef int _nacc
+    cdef int _exports
+
+    def __cinit__(self, Py_ssize_t capacity = 256):
+        """
+        Bit writer constructor
+        :param capacity: initial capacity of the buffer in bytes
+        """
+        self._cap = max(capacity, 16)
+        self._data = <unsigned char *> malloc(self._cap)
+        if self._data is NULL:
+            raise MemoryError()
+        self._len = 0
+        self._acc = 0
+        self._nacc = 0
+        self._exports = 0
+
+    def __dealloc__(self):
+        free(self._data)
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if self._nacc:
+            raise BufferError("The bitstream is not byte-aligned")
+        PyBuffer_FillInfo(buffer, self, self._data, self._len, 1, flags)
+        self._exports += 1
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        self._exports -= 1
+
+    def __len__(self):
+        return self._len * 8 + self._nacc
+
+    cdef int _reserve(self, Py_ssize_t nbytes) except -1:
+        """
+        Make sure that at least nbytes can be appended to the buffer
+        :param nbytes: number of bytes
+        :return: 0
+        """
+        cdef Py_ssize_t cap
+        cdef unsigned char *data
+        if self._exports:
+            raise BufferError("Cannot write while the buffer is exported")
+        if self._len + nbytes <= self._cap:
+            return 0
+
+        cap = self._cap
+        while self._len + nbytes > cap:
+            cap *= 2
+        data = <unsigned char *> realloc(self._data, cap)
+        if data is NULL:
+            raise MemoryError()
+        self._data = data
+        self._cap = cap
+        return 0
+
+    cdef inline void _put(self, unsigned long long value, int length):
+        """
+        Append at most 32 bits, the caller is responsible for reserving 5 bytes and masking the value
+        :param value: value right-aligned in the accumulator
+        :param length: length of the value in bits
+        :return: None
+        """
+        self._acc = (self._acc << length) | value
+        self._nacc += length
+        while self._nacc >= 8:
+            self._nacc -= 8
+            self._data[self._len] = (self._acc >> self._nacc) & 0xff
+            self._len += 1
+
+    cdef inline void _put_long(self, unsigned long long value, int length):
+        """
+        Append at most 64 bits, the caller is responsible for reserving 9 bytes
+        :param value: value (bits above length are ignored)
+        :param length: length of the value in bits
+        :return: None
+        """
+        if length > 32:
+            self._put((value >> 32) & ((1ULL << (length - 32)) - 1), length - 32)
+            length = 32
+        self._put(value & ((1ULL << length) - 1), length)
+
+    cdef int _check_range(self, long long value, int length, bint signed) except -1:
+        if length < 0 or length > 64:
+            raise ValueError("Integers longer than 64 bits are not supported")
+        if length == 64:
+            return 0
+        if signed:
+            if length == 0 or value < -(1LL << (length - 1)) or value >= (1LL << (length - 1)):
+                raise OverflowError(f"Signed value {value} does not fit in {length} bits")
+        elif value < 0 or value >= (1LL << length):
+            raise OverflowError(f"Unsigned value {value} does not fit in {length} bits")
+        return 0
+
+    def write_int(self, value, int length = 1, bint signed = False):
+        """
+        Append an integer to the bitstream
+        :param value: integer value
+        :param length: length of the integer in bits (at most 64)
+        :param signed: whether the integer should be stored in a signed (two's-complement) format
+        :return: None
+        """
+        cdef unsigned long long raw
+        if signed or value < 0:
+            self._check_range(value, length, signed)
+            raw = <unsigned long long> (<long long> value)
+        else:
+            raw = value
+            if length < 64 and raw >> length:
+                raise OverflowError(f"Unsigned value {value} does not fit in {length} bits")
+        self._reserve(9)
+        self._put_long(raw, length)
+
+    def write_ints(self, integer_t[:] values, int length, bint signed = False):
+        """
+        Append all integers from an array to the bitstream
+        :param values: array of integers
+        :param length: length of each integer in bits (at most 64)
+        :param signed: whether the integers should be stored in a signed (two's-complement) format
+        :return: None
+        """
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = values.shape[0]
+        for i in range(n):
+            self._check_range(values[i], length, signed)
+        self._reserve(n * 8 + 9)
+        for i in range(n):
+            self._put_long(<unsigned long long> (<long long> values[i]), length)
+
+    def write_utf8(self, unsigned long long value):
+        """
+        Append a "UTF-8" coded integer to the bitstream
+        The extended FLAC variant is used, which can store up to 36 bits in 7 bytes
+        :param value: unsigned integer
+        :return: None
+        """
+        cdef int extra
+        if value < 0x80:
+            self._reserve(1)
+            self._put(value, 8)
+            return
+        if value >= (1ULL << 36):
+            raise OverflowError(f"Value {value} cannot be UTF-8 coded")
+
+        extra = 1
+        while value >= (1ULL << (5 * extra + 6)) and extra < 6:
+            extra += 1
+
+        self._reserve(extra + 1)
+        # leading byte: (extra + 1) ones followed by a zero and the remaining payload bits
+        self._put(((0xff00 >> (extra + 1)) & 0xff) | (value >> (6 * extra)), 8)
+        while extra:
+            extra -= 1
+            self._put(0x80 | ((value >> (6 * extra)) & 0x3f), 8)
+
+    def write_bytes(self, const unsigned char[:] data):
+        """
+        Append bytes to the bitstream
+        :param data: any object supporting the buffer protocol
+        :return: None
+        """
+        self.write_bits(data, data.shape[0] * 8)
+
+    def write_bits(self, const unsigned char[:] data, Py_ssize_t length):
+        """
+        Append the first length bits of a byte buffer to the bitstream
+        :param data: any object supporting the buffer protocol (e.g. a bitarray)
+        :param length: number of bits to append
+        :return: None
+        """
+        cdef Py_ssize_t i
+        cdef Py_ssize_t full = length >> 3
+        cdef int rem = length & 7
+        if length < 0 or full + (rem > 0) > data.shape[0]:
+            raise ValueError("Not enough data")
+        self._reserve(full + 9)
+
+        if self._nacc == 0 and full > 0:
+            memcpy(self._data + self._len, &data[0], full)
+            self._len += full
+        else:
+            for i in range(full):
+                self._put(data[i], 8)
+        if rem:
+            self._put(data[full] >> (8 - rem), rem)
+
+    def fill(self):
+        """
+        Zero-pad the bitstream to byte alignment
+        :return: None
+        """
+        if self._nacc:
+            self._reserve(1)
+            self._put(0, 8 - self._nacc)
+
+    def set_int(self, Py_ssize_t pos, value, int length):
+        """
+        Overwrite an already written byte-aligned unsigned field
+        :param pos: position of the field in bits
+        :param value: new value
+        :param length: length of the field in bits
+        :return: None
+        """
+        cdef unsigned long long raw = value
+        cdef Py_ssize_t byte_i
+        if pos & 7 or length & 7 or length > 64 or pos + length > self._len * 8:
+            raise ValueError("Only whole written bytes can be overwritten")
+        if length < 64 and raw >> length:
+            raise OverflowError(f"Unsigned value {value} does not fit in {length} bits")
+        if self._exports:
+            raise BufferError("Cannot write while the buffer is exported")
+        for byte_i in range((pos + length) // 8 - 1, pos // 8 - 1, -1):
+            self._data[byte_i] = raw & 0xff
+            raw >>= 8
+
+    def tobytes(self) -> bytes:
+        """
+        Get a copy of the bitstream, the pending bits are zero-padded to byte alignment
+        :return: bytes
+        """
+        out = self._data[:self._len]
+        if self._nacc:
+            out += bytes([(self._acc << (8 - self._nacc)) & 0xff])
+        return out
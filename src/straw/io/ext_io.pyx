@@ -6,28 +6,40 @@ import cython
 # Reading #
 ###########
 
+# The GIL is released in the loops, frames can be converted concurrently by multiple threads
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
 @cython.cdivision(True)
 def read_frame(cython.integral[:] target, const unsigned char[:] source, Py_ssize_t bits_per_sample, char little_endian = 0):
     cdef Py_ssize_t source_size, i, byteshift
     cdef Py_ssize_t bytes_per_sample = bits_per_sample / 8
     source_size = source.shape[0]
+    if target.shape[0] < (source_size + bytes_per_sample - 1) / bytes_per_sample:
+        raise ValueError("The target is too small for the source")
 
-    for i in range(source_size):
-        byteshift = i % bytes_per_sample
-        if little_endian:
-            byteshift = bytes_per_sample - byteshift - 1
-        target[i / bytes_per_sample] |= source[i] << (8 * byteshift)
+    with nogil:
+        for i in range(source_size):
+            byteshift = i % bytes_per_sample
+            if little_endian:
+                byteshift = bytes_per_sample - byteshift - 1
+            target[i / bytes_per_sample] |= source[i] << (8 * byteshift)
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
 @cython.cdivision(True)
 def write_frame(unsigned char[:] target, cython.integral[:] source, Py_ssize_t bits_per_sample, char little_endian = 0):
     cdef Py_ssize_t source_size, i, byte_i, byteshift
     cdef Py_ssize_t bytes_per_sample = bits_per_sample / 8
     source_size = source.shape[0]
+    if target.shape[0] < source_size * bytes_per_sample:
+        raise ValueError("The target is too small for the source")
 
-    for i in range(source_size):
-        for byte_i in range(bytes_per_sample):
-            byteshift = byte_i
-            if not little_endian:
-                byteshift = bytes_per_sample - byteshift - 1
+    with nogil:
+        for i in range(source_size):
+            for byte_i in range(bytes_per_sample):
+                byteshift = byte_i
+                if not little_endian:
+                    byteshift = bytes_per_sample - byteshift - 1
 
-            target[bytes_per_sample*i + byte_i] = (source[i] >> (8 * byteshift)) & 0xff
+                target[bytes_per_sample*i + byte_i] = (source[i] >> (8 * byteshift)) & 0xff
@@ -3,6 +3,8 @@ from typing import BinaryIO
 
 import pandas as pd
 
+from straw.io.base import BaseWriter
+from straw.io.frames import FrameTable
 from straw.io.params import StreamParams
 from straw.io.straw import StrawFormatWriter, StrawFormatReader
 
@@ -29,30 +31,54 @@ class Formatter:
         if params.bits_per_sample == 0:
             raise ValueError(f"Invalid bits per sample: {params.bits_per_sample}")
 
-    def save(self, df: pd.DataFrame, params: StreamParams, output_stream: BinaryIO, flac_mode: bool = False):
+    def save(self, table: FrameTable, params: StreamParams, output_stream: BinaryIO, flac_mode: bool = False):
         """
-        Saves the dataframe into a formatted binary file
-        :param df: source dataframe
+        Saves the encoded frames into a formatted binary file
+        :param table: encoded frames
         :param params: stream params
         :param output_stream: target file
         :param flac_mode: if true the output file will be a FLAC decoder compatible file
         :return: None
         """
-        self.validate_dataframe(df, params)
         if flac_mode:
             raise NotImplementedError("FLAC mode is no longer supported")
         else:
             fw = StrawFormatWriter(params, output_stream)
-            fw.write(df)
+            fw.write(table)
             fw.close_stream(params)
 
-    def load(self, input_file: Path, flac_mode: bool = False, show_progress: bool = True) -> (
-    pd.DataFrame, StreamParams):
+    def serialize(self, table: FrameTable, params: StreamParams, flac_mode: bool = False):
+        """
+        Serialize the encoded frames in place, Formatter.save then writes the stored frames
+        :param table: encoded frames
+        :param params: stream params, only the params describing the samples are used
+        :param flac_mode: if true the frames are serialized in the FLAC format
+        :return: None
+        """
+        if flac_mode:
+            raise NotImplementedError("FLAC mode is no longer supported")
+        StrawFormatWriter(params).serialize(table)
+
+    def create_writer(self, params: StreamParams, output_stream: BinaryIO, flac_mode: bool = False) -> BaseWriter:
+        """
+        Open a writer saving the frames incrementally, the stream header is written immediately
+        The frames are saved with BaseWriter.write and the header is rewritten by BaseWriter.close_stream
+        :param params: stream params, the header must have the same size when the stream is closed
+        :param output_stream: seekable target file
+        :param flac_mode: if true the output file will be a FLAC decoder compatible file
+        :return: writer
+        """
+        if flac_mode:
+            raise NotImplementedError("FLAC mode is no longer supported")
+        return StrawFormatWriter(params, output_stream)
+
+    def load(self, input_file: Path, flac_mode: bool = False, show_progress: bool = True, jobs: int = 1,
+             frame_hook: callable = None, start: int = None, stop: int = None,
+             metadata_only: bool = False) -> StrawFormatReader:
         if flac_mode:
             raise NotImplementedError("FLAC mode is no longer supported")
         else:
             reader = StrawFormatReader(show_progress)
 
-        reader.load(input_file)
-        self.validate_dataframe(reader.get_data(), reader.get_params())
+        reader.load(input_file, jobs=jobs, frame_hook=frame_hook, start=start, stop=stop, metadata_only=metadata_only)
         return reader
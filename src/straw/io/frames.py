@@ -0,0 +1,296 @@
+import numpy as np
+import pandas as pd
+
+from straw.static import SubframeType, DecodeCost
+
+"""
+Columnar storage of the encoded frames
+"""
+
+
+class FrameTable:
+    """
+    Subframes of a signal stored in numpy arrays, frame i of channel c is the subframe (i, c)
+    The samples of all subframes are views of one samplebuffer, the frames of channel c start at lags[c]
+    The residuals are stored in a buffer with the same layout as the samplebuffer, see FrameTable.residual
+    When decoding, the residuals are decoded directly into the samplebuffer and restored in place
+    """
+    samplebuffer: np.ndarray  # (channels, samples) signal including the samples needed by the lags
+    residuals: np.ndarray  # (channels, samples) residual of a subframe is stored after its warmup samples
+    lags: np.ndarray  # (channels,) offset of the first frame of each channel in the samplebuffer
+    max_order: int
+
+    seq: np.ndarray  # (frames,) frame numbers
+    start: np.ndarray  # (frames,) first sample of each frame, not including the lag
+    blocksize: np.ndarray  # (frames,) number of samples in each frame
+
+    # LPC of a frame is common to its channels, except for subframes with their own coefficients
+    order: np.ndarray  # (frames,) number of coefficients, 0 if the frame has no LPC
+    qlp_precision: np.ndarray  # (frames,)
+    shift: np.ndarray  # (frames,)
+    qlp: np.ndarray  # flat array of the coefficients, the coefficients of frame i start at qlp_offset[i]
+    qlp_offset: np.ndarray  # (frames,)
+    subframe_qlp: dict  # (frame, channel) -> (qlp, precision, shift) of subframes with their own coefficients
+
+    frame_type: np.ndarray  # (frames, channels) SubframeType
+    k: np.ndarray  # (frames, channels) starting Rice parameter
+    streams: list  # frames * channels Rice coded residuals (bitarrays), row-major
+    stream_len: np.ndarray  # (frames, channels) length of the streams in bits
+    payloads: list  # (frames,) serialized frames (bytes), None until the frame is serialized, see BaseWriter.serialize
+
+    def __init__(self, samplebuffer: np.ndarray, lags: np.ndarray, limits: np.array, first_seq: int = 0,
+                 max_order: int = 32, residuals: np.ndarray = None):
+        """
+        Create a table of frames with the given limits, all subframes are initialized as LPC subframes
+        :param samplebuffer: (channels, samples) signal
+        :param lags: offset of the first frame of each channel
+        :param limits: frame borders including the last border
+        :param first_seq: frame number of the first frame
+        :param max_order: maximal number of LPC coefficients of a frame
+        :param residuals: buffer of the residuals with the shape of the samplebuffer, a new one is allocated if None
+        """
+        self.samplebuffer = samplebuffer
+        self.max_order = max_order
+        if residuals is None:
+            residuals = np.zeros(samplebuffer.shape, dtype=self.residual_dtype(samplebuffer.dtype))
+        self.residuals = residuals
+        self.lags = np.asarray(lags, dtype=np.int64)
+        self.start = np.asarray(limits[:-1], dtype=np.int64)
+        self.blocksize = np.diff(limits).astype(np.int64)
+        self.seq = np.arange(self.frames, dtype=np.int64) + first_seq
+
+        self.order = np.zeros(self.frames, dtype=np.int64)
+        self.qlp_precision = np.zeros(self.frames, dtype=np.int64)
+        self.shift = np.zeros(self.frames, dtype=np.int64)
+        self.qlp_offset = np.arange(self.frames, dtype=np.int64) * max_order
+        self.qlp = np.zeros(self.frames * max_order, dtype=np.int32)
+        self.subframe_qlp = {}
+
+        channels = samplebuffer.shape[0]
+        self.frame_type = np.full((self.frames, channels), SubframeType.LPC, dtype="B")
+        self.k = np.zeros((self.frames, channels), dtype=np.int8)
+        self.streams = [None] * (self.frames * channels)
+        self.stream_len = np.zeros((self.frames, channels), dtype=np.int64)
+        self.payloads = [None] * self.frames
+
+    @staticmethod
+    def residual_dtype(dtype: np.dtype) -> np.dtype:
+        """
+        Type of the residuals of a signal, one size wider than the samples because the residuals and their mid-side
+        transform do not fit the sample type of full scale signals
+        :param dtype: type of the samples
+        :return: int32 for samples up to 16 bits, int64 otherwise
+        """
+        return np.dtype(np.int32) if np.dtype(dtype).itemsize <= 2 else np.dtype(np.int64)
+
+    @property
+    def frames(self) -> int:
+        return self.start.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self.frame_type.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the table, without the shared samplebuffer
+        :return: number of bytes
+        """
+        arrays = (self.seq, self.start, self.blocksize, self.order, self.qlp_precision, self.shift,
+                  self.qlp, self.qlp_offset, self.frame_type, self.k, self.stream_len)
+        residuals = self.residuals.nbytes if self.residuals is not self.samplebuffer else 0
+        payloads = sum(len(payload) for payload in self.payloads if payload is not None)
+        own_qlp = sum(qlp.nbytes for qlp, _, _ in self.subframe_qlp.values())
+        return (residuals + sum(array.nbytes for array in arrays) + int(self.stream_len.sum()) // 8 + payloads +
+                own_qlp)
+
+    def decode_cycles(self) -> float:
+        """
+        Estimated cost of decoding the frames, see static.DecodeCost
+        :return: number of CPU cycles
+        """
+        samples = np.broadcast_to(self.blocksize[:, None], self.frame_type.shape)
+        lpc = (self.frame_type == SubframeType.LPC) | (self.frame_type == SubframeType.LPC_COMMON)
+        orders = np.repeat(self.order[:, None], self.channels, axis=1)
+        for (i, c), (qlp, _, _) in self.subframe_qlp.items():
+            orders[i, c] = len(qlp)
+        per_sample = np.select([lpc, self.frame_type == SubframeType.RAW],
+                               [DecodeCost.residual + DecodeCost.lpc_coefficient * orders,
+                                DecodeCost.raw], DecodeCost.constant)
+        return float((samples * per_sample).sum())
+
+    #############
+    # Subframes #
+    #############
+
+    def frame(self, i: int, channel: int) -> np.array:
+        """
+        Samples of a subframe
+        :param i: position of the frame in the table
+        :param channel: channel of the subframe
+        :return: view of the samplebuffer
+        """
+        start = self.lags[channel] + self.start[i]
+        return self.samplebuffer[channel][start:start + self.blocksize[i]]
+
+    def residual(self, i: int, channel: int, warmup: bool = False) -> np.array:
+        """
+        Residual of a subframe, the samples after the warmup samples
+        :param i: position of the frame in the table
+        :param channel: channel of the subframe
+        :param warmup: include the positions of the warmup samples
+        :return: view of the residual buffer
+        """
+        start = self.lags[channel] + self.start[i]
+        own = self.subframe_qlp.get((i, channel))
+        skip = 0 if warmup else len(own[0]) if own is not None else self.order[i]
+        return self.residuals[channel][start + skip:start + self.blocksize[i]]
+
+    def get_qlp(self, i: int) -> np.array:
+        """
+        LPC coefficients of a frame
+        :param i: position of the frame in the table
+        :return: view of the coefficients
+        """
+        return self.qlp[self.qlp_offset[i]:self.qlp_offset[i] + self.order[i]]
+
+    def get_lpc(self, i: int, channel: int) -> (np.array, int, int):
+        """
+        LPC coefficients of a subframe, the coefficients of the frame unless the subframe has its own
+        :param i: position of the frame in the table
+        :param channel: channel of the subframe
+        :return: tuple(qlp, precision, shift)
+        """
+        own = self.subframe_qlp.get((i, channel))
+        if own is not None:
+            return own
+        return self.get_qlp(i), self.qlp_precision[i], self.shift[i]
+
+    def set_qlp(self, i: int, qlp: np.array, precision: int, shift: int, channel: int = None):
+        """
+        Store the LPC coefficients of a frame
+        The coefficients of a subframe are stored as the coefficients of the frame if the frame has none yet,
+        otherwise they are kept separately if they differ, see FrameTable.get_lpc
+        :param i: position of the frame in the table
+        :param qlp: quantized coefficients
+        :param precision: precision of the coefficients in bits
+        :param shift: quantization shift
+        :param channel: channel of the subframe, None to set the coefficients of the frame
+        :return: None
+        """
+        if channel is not None and self.order[i]:
+            if (precision, shift) != (self.qlp_precision[i], self.shift[i]) or \
+                    not np.array_equal(qlp, self.get_qlp(i)):
+                self.subframe_qlp[(i, channel)] = (np.asarray(qlp, dtype=np.int32), int(precision), int(shift))
+            return
+        self.order[i] = len(qlp)
+        self.qlp[self.qlp_offset[i]:self.qlp_offset[i] + len(qlp)] = qlp
+        self.qlp_precision[i] = precision
+        self.shift[i] = shift
+
+    def rows(self, i: int) -> list:
+        """
+        Subframes of a frame as rows, see StrawFormatWriter._frame
+        :param i: position of the frame in the table
+        :return: list of dicts, one for each channel
+        """
+        has_lpc = self.order[i] > 0
+        rows = []
+        for c in range(self.channels):
+            qlp, precision, shift = self.get_lpc(i, c)
+            rows.append({"seq": self.seq[i],
+                         "channel": c,
+                         "frame": self.frame(i, c),
+                         "frame_type": self.frame_type[i, c],
+                         "qlp": qlp if has_lpc else None,
+                         "qlp_precision": precision,
+                         "shift": shift,
+                         "residual": self.residual(i, c) if has_lpc else None,
+                         "bps": self.k[i, c],
+                         "stream": self.streams[i * self.channels + c],
+                         "stream_len": self.stream_len[i, c]})
+        return rows
+
+    ###########
+    # Batches #
+    ###########
+
+    def split(self, parts: int) -> list:
+        """
+        Split the table into tables of consecutive frames sharing the sample and residual buffers of this table
+        Detach the tables before sending them to other processes, see FrameTable.detach
+        :param parts: maximal number of tables
+        :return: list of tables
+        """
+        tables = []
+        for frames in np.array_split(np.arange(self.frames), min(parts, self.frames)):
+            limits = np.append(self.start[frames], self.start[frames[-1]] + self.blocksize[frames[-1]])
+            table = FrameTable(self.samplebuffer, self.lags, limits, first_seq=self.seq[frames[0]],
+                               max_order=self.max_order, residuals=self.residuals)
+            table.frame_type[:] = self.frame_type[frames]
+            tables.append(table)
+        return tables
+
+    def join(self, tables: list):
+        """
+        Fill the table with the frame metadata, streams and payloads of tables created by FrameTable.split
+        The residuals are not copied, the split tables write them into the shared residual buffer
+        :param tables: tables in the order of FrameTable.split, possibly detached
+        :return: None
+        """
+        i = 0
+        for table in tables:
+            frames = slice(i, i + table.frames)
+            for name in ("order", "qlp_precision", "shift", "frame_type", "k", "stream_len"):
+                getattr(self, name)[frames] = getattr(table, name)
+            self.qlp[self.qlp_offset[i]:self.qlp_offset[i] + table.qlp.shape[0]] = table.qlp
+            for (j, c), lpc in table.subframe_qlp.items():
+                self.subframe_qlp[(i + j, c)] = lpc
+            self.streams[i * self.channels:(i + table.frames) * self.channels] = table.streams
+            self.payloads[frames] = table.payloads
+            i += table.frames
+
+    def truncate(self, frames: int):
+        """
+        Drop the frames after the given number of frames, e.g. when a stream ends early
+        :param frames: number of frames to keep
+        :return: None
+        """
+        for name in ("seq", "start", "blocksize", "order", "qlp_precision", "shift", "qlp_offset", "frame_type", "k",
+                     "stream_len"):
+            setattr(self, name, getattr(self, name)[:frames])
+        self.qlp = self.qlp[:frames * self.max_order]
+        self.subframe_qlp = {key: lpc for key, lpc in self.subframe_qlp.items() if key[0] < frames}
+        self.streams = self.streams[:frames * self.channels]
+        self.payloads = self.payloads[:frames]
+
+    def detach(self):
+        """
+        Drop the sample and residual buffers, so that only the frame metadata is pickled
+        :return: None
+        """
+        self.samplebuffer = None
+        self.residuals = None
+
+    def attach(self, samplebuffer: np.ndarray, residuals: np.ndarray):
+        """
+        Set the sample and residual buffers of a detached table, e.g. the shared buffers in a worker process
+        :param samplebuffer: (channels, samples) signal with the layout of the original samplebuffer
+        :param residuals: buffer of the residuals with the shape of the samplebuffer
+        :return: None
+        """
+        self.samplebuffer = samplebuffer
+        self.residuals = residuals
+
+    ###########
+    # Utility #
+    ###########
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Debug view of the table with one row for each subframe, the rows of channel 0 come first
+        :return: DataFrame with the columns of static.col_types and the streams
+        """
+        rows = [self.rows(i) for i in range(self.frames)]
+        return pd.DataFrame([rows[i][c] for c in range(self.channels) for i in range(self.frames)])
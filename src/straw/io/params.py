@@ -12,6 +12,8 @@ class StreamParams:
         self.lags = np.zeros(self.channels, dtype=np.int8)  # 4-bit
         self.bias = np.zeros(self.channels, dtype=np.int8)  # 8-bit signed
         self.gain = np.zeros(self.channels, dtype=np.int64)  # quantized floating point number with variable bit width
+        self.removed_samples_start = []
+        self.removed_samples_end = []
 
     sample_rate: int = None
     channels: int = None
@@ -22,8 +24,8 @@ class StreamParams:
     responsiveness: int = None
     leading_channel: int = None
     lags: np.ndarray  # length equal to number of channels, each value represents lag on a channel
-    removed_samples_start = []  # removed samples for each channel from the start
-    removed_samples_end = []  # removed samples for each channel from the end
+    removed_samples_start: list  # removed samples for each channel from the start
+    removed_samples_end: list  # removed samples for each channel from the end
     bias: np.ndarray  # length equal to number of channels, each value represents bias on a channel
     gain: np.ndarray  # length equal to number of channels, each value represents quantized gain factor on a channel
     gain_shift: int = None
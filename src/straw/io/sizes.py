@@ -29,6 +29,11 @@ class StrawSizes:
         gain = 12
         gain_shift = 4
 
+    class metadata_block_seektable:  # noqa
+        frame = 32
+        sample = 64
+        offset = 64
+
     class frame_header:  # noqa
         sync_code = 14
         contains_lpc = 1
@@ -1,12 +1,17 @@
+from pathlib import Path
+from typing import BinaryIO
+
 import numpy as np
-import pandas as pd
-from bitarray import bitarray
-from bitarray.util import int2ba
 from tqdm import tqdm
 
+from straw import static
+from straw.compute import ParallelCompute, SharedArray
 from straw.io.base import BaseWriter, BaseReader
+from straw.io.ext_bits import BitWriter
+from straw.io.frames import FrameTable
+from straw.io.params import StreamParams
 from straw.io.sizes import StrawSizes
-from straw.static import SubframeType
+from straw.static import SubframeType, MetadataBlockType, Default
 from . import ext_io
 
 """
@@ -16,6 +21,10 @@ The format is witten using recursive descent
 
 
 class StrawFormatWriter(BaseWriter):
+    def __init__(self, initial_params: StreamParams, output_stream: BinaryIO = None):
+        self._frame_index = {}
+        super(StrawFormatWriter, self).__init__(initial_params, output_stream)
+
     def _format_specific_checks(self):
         if self._params.channels < 1:
             raise ValueError("No channels present!")
@@ -25,182 +34,234 @@ class StrawFormatWriter(BaseWriter):
         self._metadata_block()
 
     def _metadata_block(self):
-        sec = self._metadata_block_header()
-        sec += self._metadata_block_streaminfo()
-        sec.tofile(self._f)
-
-    def _metadata_block_header(self) -> bitarray:
+        seekpoints = self._seekpoints()
+        sec = BitWriter()
+        self._metadata_block_header(sec, MetadataBlockType.STREAMINFO, last=len(seekpoints) == 0)
+        self._metadata_block_streaminfo(sec)
+        if len(seekpoints) > 0:
+            sizes = StrawSizes.metadata_block_seektable
+            point_bytes = (sizes.frame + sizes.sample + sizes.offset) // 8
+            self._metadata_block_header(sec, MetadataBlockType.SEEKTABLE, last=True,
+                                        data_size=len(seekpoints) * point_bytes)
+            self._metadata_block_seektable(sec, seekpoints)
+        self._f.write(sec)
+
+    def _metadata_block_header(self, sec: BitWriter, block_type: int, last: bool, data_size: int = 0):
         sizes = StrawSizes.metadata_block_header
-        sec = bitarray()
-        sec.append(1)  # this block is the last metadata block before the audio blocks
-        sec += int2ba(0, length=sizes.type)  # BLOCK_TYPE: STREAMINFO
-        # ignore if streaminfo...
-        # sec += int2ba(data_size, length=24)
-        return sec
+        sec.write_int(int(last))  # 1 if this block is the last metadata block before the audio blocks
+        sec.write_int(block_type, length=sizes.type)
+        if block_type != MetadataBlockType.STREAMINFO:
+            sec.write_int(data_size, length=sizes.size)
 
-    def _metadata_block_streaminfo(self) -> bitarray:
+    def _metadata_block_streaminfo(self, sec: BitWriter):
         sizes = StrawSizes.metadata_block_streaminfo
-        sec = bitarray()
-        sec += int2ba(self._params.sample_rate, length=sizes.samplerate)
-        sec.frombytes(self.encode_int_utf8(self._params.channels - 1))
-        sec += int2ba(self._params.bits_per_sample - 1, length=sizes.bps)
-        sec += int2ba(self._params.total_frames, length=sizes.frames)
-        sec += int2ba(self._params.total_samples, length=sizes.samples)
-        sec.frombytes(self._params.md5)
-        sec += int2ba(self._params.responsiveness, length=sizes.responsiveness)
+        sec.write_int(self._params.sample_rate, length=sizes.samplerate)
+        sec.write_utf8(self._params.channels - 1)
+        sec.write_int(self._params.bits_per_sample - 1, length=sizes.bps)
+        sec.write_int(self._params.total_frames, length=sizes.frames)
+        sec.write_int(self._params.total_samples, length=sizes.samples)
+        sec.write_bytes(self._params.md5)
+        sec.write_int(self._params.responsiveness, length=sizes.responsiveness)
 
         # Shift
         if self._params.lags.any():
-            sec.append(1)
-            sec.frombytes(self.encode_int_utf8(self._params.leading_channel))
-            for val in self._params.lags:
-                sec += int2ba(int(val), length=sizes.shift)
+            sec.write_int(1)
+            sec.write_utf8(self._params.leading_channel)
+            sec.write_ints(self._params.lags, length=sizes.shift)
             for c in range(self._params.channels):
-                for val in self._params.removed_samples_start[c]:
-                    sec += int2ba(int(val), length=self._params.bits_per_sample, signed=True)
-                for val in self._params.removed_samples_end[c]:
-                    sec += int2ba(int(val), length=self._params.bits_per_sample, signed=True)
+                sec.write_ints(self._params.removed_samples_start[c], length=self._params.bits_per_sample, signed=True)
+                sec.write_ints(self._params.removed_samples_end[c], length=self._params.bits_per_sample, signed=True)
         else:
-            sec.append(0)
+            sec.write_int(0)
 
         # Bias
         if self._params.bias.any():
-            sec.append(1)
-            for val in self._params.bias:
-                sec += int2ba(int(val), length=sizes.bias, signed=True)
+            sec.write_int(1)
+            sec.write_ints(self._params.bias, length=sizes.bias, signed=True)
         else:
-            sec.append(0)
+            sec.write_int(0)
 
         # Gain
         if self._params.gain.any():
-            sec.append(1)
-            for val in self._params.gain:
-                sec += int2ba(int(val), length=sizes.gain)
-            sec += int2ba(self._params.gain_shift, length=sizes.gain_shift)
+            sec.write_int(1)
+            sec.write_ints(self._params.gain, length=sizes.gain)
+            sec.write_int(self._params.gain_shift, length=sizes.gain_shift)
         else:
-            sec.append(0)
+            sec.write_int(0)
 
         sec.fill()
-        return sec
 
-    def _frame(self, df: pd.DataFrame):
+    def _metadata_block_seektable(self, sec: BitWriter, seekpoints: np.array):
+        sizes = StrawSizes.metadata_block_seektable
+        for frame, sample, offset in seekpoints:
+            sec.write_int(int(frame), length=sizes.frame)
+            sec.write_int(int(sample), length=sizes.sample)
+            sec.write_int(int(offset), length=sizes.offset)
+
+    def _seekpoints(self) -> np.array:
+        """
+        Create the seek points, one for each Default.seek_interval samples
+        Each point references the frame containing the sample, the number of seek points depends only on the params
+        so the placeholders written at the start of the stream can be overwritten when the stream is closed
+        :return: array of (frame number, first sample of the frame, byte offset from the first frame) rows
+        """
+        frame_samples = self._params.total_samples - int(np.max(self._params.lags, initial=0))
+        count = -(-frame_samples // Default.seek_interval)
+        seekpoints = np.zeros((max(count, 0), 3), dtype=np.int64)
+        if not self._frame_index or count <= 0:
+            return seekpoints
+
+        seqs = np.asarray(sorted(self._frame_index.keys()), dtype=np.int64)
+        blocksizes, frame_bytes = np.asarray([self._frame_index[seq] for seq in seqs], dtype=np.int64).T
+        starts = np.cumsum(blocksizes) - blocksizes
+        offsets = np.cumsum(frame_bytes) - frame_bytes
+        idx = np.searchsorted(starts, np.arange(count) * Default.seek_interval, side="right") - 1
+        seekpoints[:, 0] = seqs[idx]
+        seekpoints[:, 1] = starts[idx]
+        seekpoints[:, 2] = offsets[idx]
+        return seekpoints
+
+    def _frame(self, rows: list) -> BitWriter:
+        """
+        Write one frame
+        :param rows: subframes of the frame, see FrameTable.rows
+        :return: frame bitstream
+        """
         footer_sizes = StrawSizes.frame_footer
-        sec = bitarray()
-        tmp = df.apply(self._subframe, axis=1)
-        for subframe_bitstream in tmp:
-            sec += subframe_bitstream
+        blocksize = max(len(row["frame"]) for row in rows)
+        sec = BitWriter(capacity=blocksize * len(rows) * self._params.bits_per_sample // 8)
+        seq = int(rows[0]["seq"])
+        crc_pos = self._frame_header(sec, blocksize, seq)
+        for row in rows:
+            self._subframe(sec, row)
         sec.fill()  # zero-padding to byte alignment
 
-        # Header
-        sec = self._frame_header(df, len(sec.tobytes()) + footer_sizes.crc // 8) + sec
+        # Header - the frame size and header checksum are known only after the subframes are written
+        frame_bytes_pos = crc_pos - StrawSizes.frame_header.frame_bytes
+        sec.set_int(frame_bytes_pos, len(sec) // 8 + footer_sizes.crc // 8, length=StrawSizes.frame_header.frame_bytes)
+        sec.set_int(crc_pos, self.Crc.crc8(memoryview(sec)[:crc_pos // 8]), length=StrawSizes.frame_header.crc)
 
         # Footer
-        sec += int2ba(self.Crc.crc16(sec.tobytes()), length=footer_sizes.crc)
+        sec.write_int(self.Crc.crc16(memoryview(sec)), length=footer_sizes.crc)
         return sec
 
-    def _frame_header(self, df: pd.DataFrame, frame_data_size: int) -> bitarray:
+    def _frame_written(self, seq: int, blocksize: int, frame_bytes: int):
+        self._frame_index[seq] = (blocksize, frame_bytes)
+
+    def _frame_header(self, sec: BitWriter, blocksize: int, seq: int) -> int:
+        """
+        Write the frame header with placeholders for the frame size and the header checksum
+        :param sec: target bitstream
+        :param blocksize: number of samples in each subframe
+        :param seq: frame number
+        :return: position of the header checksum in bits
+        """
         sizes = StrawSizes.frame_header
-        sec = bitarray()
-        sec += int2ba(0b10101010101010, length=sizes.sync_code)  # sync code
-        sec.append(0)
+        sec.write_int(0b10101010101010, length=sizes.sync_code)  # sync code
+        sec.write_int(0)
 
         # block size start
-        blocksize = int(df["frame"].apply(len).max())
         if blocksize == 0:
             raise ValueError("Blocksize cannot be 0")
         tmp = np.log2(blocksize)
         if tmp % 1 == 0.0:
-            sec.append(0)  # get 8 bit exponent for (2^n) samples
-            sec += int2ba(int(tmp), length=sizes.block_size_log2)
+            sec.write_int(0)  # get 8 bit exponent for (2^n) samples
+            sec.write_int(int(tmp), length=sizes.block_size_log2)
         else:
-            sec.append(1)  # get 16 bit (blocksize-1)
-            sec += int2ba(blocksize - 1, length=sizes.block_size_exact)
+            sec.write_int(1)  # get 16 bit (blocksize-1)
+            sec.write_int(blocksize - 1, length=sizes.block_size_exact)
         # block size end
 
-        sec.frombytes(self.encode_int_utf8(df.index.min()))
-        sec += int2ba(frame_data_size + len(sec.tobytes()) + sizes.frame_bytes // 8 + sizes.crc // 8,
-                      length=sizes.frame_bytes)
-        sec += int2ba(self.Crc.crc8(sec.tobytes()), length=sizes.crc)
-        return sec
+        sec.write_utf8(seq)
+        sec.write_int(0, length=sizes.frame_bytes)
+        crc_pos = len(sec)
+        sec.write_int(0, length=sizes.crc)
+        return crc_pos
 
-    def _subframe(self, df: pd.Series) -> bitarray:
-        sec = self._subframe_header(df)
-        sec += self._subframe_data(df)
-        return sec
+    def _subframe(self, sec: BitWriter, df: dict):
+        self._subframe_header(sec, df)
+        self._subframe_data(sec, df)
 
-    def _subframe_header(self, df: pd.Series) -> bitarray:
+    def _subframe_header(self, sec: BitWriter, df: dict):
         sizes = StrawSizes.subframe_header
-        sec = bitarray()
-        sec += int2ba(df["frame_type"], length=sizes.type)
-        return sec
+        sec.write_int(df["frame_type"], length=sizes.type)
 
-    def _subframe_data(self, df: pd.Series) -> bitarray:
+    def _subframe_data(self, sec: BitWriter, df: dict):
         subframe_type = df["frame_type"]
         if subframe_type == SubframeType.CONSTANT:  # SUBFRAME_CONSTANT
-            return self._subframe_constant(df)
+            self._subframe_constant(sec, df)
         elif subframe_type == SubframeType.RAW:  # SUBFRAME_RAW
-            return self._subframe_raw(df)
+            self._subframe_raw(sec, df)
         elif subframe_type == SubframeType.LPC:  # SUBFRAME_LPC
-            return self._subframe_lpc(df)
+            self._subframe_lpc(sec, df)
         elif subframe_type == SubframeType.LPC_COMMON:  # SUBFRAME_LPC_COMMON
             if df["channel"] == 0:
-                return self._subframe_lpc(df)
+                self._subframe_lpc(sec, df)
             else:
-                return self._subframe_lpc_common(df)
+                self._subframe_lpc_common(sec, df)
         else:
             raise ValueError(f"Invalid frame type: {subframe_type}")
 
-    def _subframe_constant(self, df: pd.Series) -> bitarray:
-        sec = bitarray()
-        sec += int2ba(int(df["frame"][0]), length=self._params.bits_per_sample, signed=True)
-        return sec
+    def _subframe_constant(self, sec: BitWriter, df: dict):
+        sec.write_int(int(df["frame"][0]), length=self._params.bits_per_sample, signed=True)
 
-    def _subframe_raw(self, df: pd.Series) -> bitarray:
+    def _subframe_raw(self, sec: BitWriter, df: dict):
         buffer = np.zeros(df["frame"].shape[0] * (self._params.bits_per_sample // 8), dtype=np.uint8)
         ext_io.write_frame(buffer, df["frame"] + self._params.bias[df["channel"]], self._params.bits_per_sample)
-        sec = bitarray(buffer=buffer)
-        return sec
+        sec.write_bytes(buffer)
 
-    def _subframe_lpc(self, df: pd.Series) -> bitarray:
+    def _subframe_lpc(self, sec: BitWriter, df: dict):
         sizes = StrawSizes.subframe_lpc
-        sec = bitarray()
 
         qlp = df["qlp"]
         order = len(qlp)
         qlp_precision = int(df["qlp_precision"])
         shift = int(df["shift"])
 
-        sec += int2ba(order - 1, length=sizes.lpc_order)
-        sec += int2ba(qlp_precision - 1, length=sizes.lpc_prec)
-        sec += int2ba(shift, length=sizes.lpc_shift)
-        for coeff in qlp:
-            sec += int2ba(int(coeff), length=qlp_precision, signed=True)
+        sec.write_int(order - 1, length=sizes.lpc_order)
+        sec.write_int(qlp_precision - 1, length=sizes.lpc_prec)
+        sec.write_int(shift, length=sizes.lpc_shift)
+        sec.write_ints(qlp, length=qlp_precision, signed=True)
 
-        sec += self._subframe_lpc_common(df)
-        return sec
+        self._subframe_lpc_common(sec, df)
 
-    def _subframe_lpc_common(self, df: pd.Series):
-        sec = bitarray()
+    def _subframe_lpc_common(self, sec: BitWriter, df: dict):
         warmup_samples = df["frame"][:len(df["qlp"])] + self._params.bias[df["channel"]]
-        for warmup_sample in warmup_samples:
-            sec += int2ba(int(warmup_sample), length=self._params.bits_per_sample, signed=True)
-        sec += self._residual(df)
-        return sec
+        sec.write_ints(warmup_samples, length=self._params.bits_per_sample, signed=True)
+        self._residual(sec, df)
 
-    def _residual(self, df: pd.Series) -> bitarray:
+    def _residual(self, sec: BitWriter, df: dict):
         sizes = StrawSizes.residual
-        sec = bitarray()
-        sec += int2ba(int(df["bps"]), length=sizes.param)
-        sec += df["stream"]
-        return sec
+        sec.write_int(int(df["bps"]), length=sizes.param)
+        sec.write_bits(df["stream"], len(df["stream"]))
 
 
 class StrawFormatReader(BaseReader):
+    _seektable: np.array = None
+    _frames_start: int = 0
+    _lpc_channel: int = None  # last subframe of the current frame which stored LPC coefficients
+
     def _stream(self):
         marker = self._sec.get_bytes(32)
         if marker.decode("utf-8") != "sTrW":
             raise ValueError("Not a valid Straw file!")
         expected_frames = self._metadata_block()
+        self._frames_start = self._sec.get_pos()
+        if self._metadata_only:
+            return
+
+        if self._range is not None:
+            self._stream_range(expected_frames)
+            return
+
+        self._allocate_buffer()
+        self._place_removed_samples()
+        if self._jobs > 1:
+            self._decode_frames(self._scan_frames(expected_frames))
+            return
+
+        self._table = self._create_table(expected_frames)
+
         if self.show_progress:
             pbar = tqdm(range(expected_frames))
             pbar.set_description(f"Loading frames")
@@ -211,21 +272,206 @@ class StrawFormatReader(BaseReader):
                 pbar.close()
                 break
 
-            self._frame(expected_frames)
+            self._frame()
+        self._table.truncate(self._frame_num)
+
+    def _stream_range(self, expected_frames: int):
+        """
+        Decode only the frames covering the requested range of samples
+        The samplebuffer is allocated only for the covered part of the stream, see BaseReader.get_window
+        :param expected_frames: number of frames stated in the streaminfo
+        :return: None
+        """
+        start, stop, _ = slice(*self._range).indices(self._params.total_samples)
+        stop = max(start, stop)
+        max_lag = int(np.max(self._params.lags))
+
+        # the shifted channels need samples from frames starting up to max_lag before the range
+        frames = self._scan_frames(expected_frames, start - max_lag, stop) if stop > start else []
+        if frames:
+            _, first_ptr, _, _ = frames[0]
+            _, last_ptr, _, last_blocksize = frames[-1]
+            window_start = min(start, first_ptr)
+            window_stop = max(stop, last_ptr + last_blocksize + max_lag)
+        else:
+            window_start, window_stop = start, stop
+
+        self._window_start = window_start
+        self._window = (start - window_start, stop - window_start)
+        self._allocate_buffer(window_stop - window_start)
+        self._place_removed_samples()
+        frames = [(pos, ptr - window_start, seq, blocksize) for pos, ptr, seq, blocksize in frames]
+        self._decode_frames(frames)
+
+    def _decode_frames(self, frames: list):
+        """
+        Decode the given frames, in worker processes directly into the shared samplebuffer if jobs > 1
+        :param frames: list of (bit position, samplebuffer position, frame number, blocksize) tuples
+        :return: None
+        """
+        if self._jobs <= 1:
+            self._table = self._create_table(len(frames))
+            for start, samplebuffer_ptr, _, _ in frames:
+                self._sec.set_pos(start)
+                self._samplebuffer_ptr = samplebuffer_ptr
+                self._frame()
+            return
+
+        results = []
+        if frames:
+            # a few batches per process to balance the load
+            batches = [batch.tolist() for batch in np.array_split(frames, min(len(frames), self._jobs * 4))]
+            # thread workers decode directly into the samplebuffer
+            buffer = self._samplebuffer if self._shared is None else self._shared.descriptor()
+            results = ParallelCompute.get_instance().map_ndarray(batches, _load_frames, processes=self._jobs,
+                                                                 input_file=self._input_file,
+                                                                 params=self._params,
+                                                                 buffer=buffer,
+                                                                 frame_hook=self._frame_hook)
+        self._release_shared_buffer()
+
+        # The workers return detached tables of their batches, the frames are in the order of the batches
+        self._table = self._create_table(len(frames))
+        if frames:
+            _, self._table.start[:], self._table.seq[:], self._table.blocksize[:] = np.asarray(frames).T
+        self._table.join(results)
+
+    def _create_table(self, frames: int) -> FrameTable:
+        """
+        Allocate the table of the decoded frames, the frame limits are filled in while parsing, see _frame
+        The residuals are decoded directly into the samplebuffer
+        :param frames: number of frames
+        :return: empty table
+        """
+        self._frame_num = 0
+        return FrameTable(self._samplebuffer, self._params.lags, np.zeros(frames + 1, dtype=np.int64),
+                          max_order=1 << StrawSizes.subframe_lpc.lpc_order, residuals=self._samplebuffer)
+
+    def _scan_frames(self, expected_frames: int, start: int = 0, stop: int = None) -> list:
+        """
+        Find the positions of the frames using the seektable and the frame_bytes field of the frame headers
+        :param expected_frames: number of frames stated in the streaminfo
+        :param start: only frames ending after this sample are returned (in the frame sample space without lags)
+        :param stop: only frames starting before this sample are returned, None means until the end of the stream
+        :return: list of (bit position, samplebuffer position, frame number, blocksize) tuples
+        """
+        frames = []
+        frame_num = 0
+        samplebuffer_ptr = 0
+        self._sec.set_pos(self._frames_start)
+        if start > 0 and self._seektable is not None and len(self._seektable) > 0:
+            point = np.searchsorted(self._seektable[:, 1], start, side="right") - 1
+            if point >= 0:
+                frame_num, samplebuffer_ptr, offset = (int(x) for x in self._seektable[point])
+                self._sec.set_pos(self._frames_start + offset * 8)
+
+        for _ in range(expected_frames - frame_num):
+            if self._sec.is_eof() or (stop is not None and samplebuffer_ptr >= stop):
+                break
+            frame_start = self._sec.get_pos()
+            seq, frame_size, blocksize = self._frame_header()
+            if samplebuffer_ptr + blocksize > start:
+                frames.append((frame_start, samplebuffer_ptr, seq, blocksize))
+            samplebuffer_ptr += blocksize
+            self._sec.set_pos(frame_start + frame_size * 8)
+        return frames
+
+    def get_frame_index(self) -> np.array:
+        """
+        Build the frame index of a stream opened by BaseReader.open, only the frame headers are parsed
+        :return: array of (bit position, first sample, frame number, blocksize) rows
+        """
+        frames = self._scan_frames(self._params.total_frames)
+        return np.asarray(frames, dtype=np.int64).reshape(-1, 4)
+
+    def load_frame(self, frame: tuple) -> (np.array, FrameTable):
+        """
+        Decode a single frame of a stream opened by BaseReader.open into a new buffer
+        The buffer covers the samples from the first sample of the frame to the end of the frame plus the maximal lag,
+        each channel holds the frame samples moved by its lag as in the whole samplebuffer
+        :param frame: row of the frame index
+        :return: buffer with dimensions (channels, samples) and the table of the decoded frame
+        """
+        start, _, _, blocksize = (int(x) for x in frame)
+        dtype_bits = static.soundfile_dtype[self._params.bits_per_sample]
+        length = blocksize + int(np.max(self._params.lags))
+        self._samplebuffer = np.zeros((length, self._params.channels), dtype=f"int{dtype_bits}").swapaxes(1, 0)
+        self._samplebuffer_ptr = 0
+        self._table = self._create_table(1)
+        self._sec.set_pos(start)
+        self._frame()
+        table, self._table = self._table, None
+        return self._samplebuffer, table
+
+    def load_block(self, frames: np.array, jobs: int = 1, frame_hook: callable = None) -> (np.array, FrameTable):
+        """
+        Decode consecutive frames of a stream opened by BaseReader.open into a new buffer
+        The buffer covers the samples from the first sample of the first frame to the end of the last frame plus
+        the maximal lag, including the samples removed by the shift correction, see load_frame
+        :param frames: consecutive rows of the frame index
+        :param jobs: number of processes decoding the frames, 1 means serial decoding
+        :param frame_hook: optional function called with the table and the position of every decoded frame,
+        see BaseReader.load
+        :return: buffer with dimensions (channels, samples) and the table of the decoded frames
+        """
+        first = int(frames[0, 1])
+        length = int(frames[-1, 1] + frames[-1, 3]) - first + int(np.max(self._params.lags))
+        self._jobs = jobs
+        self._frame_hook = frame_hook
+        self._window_start = first
+        try:
+            self._allocate_buffer(length)
+            self._place_removed_samples()
+            self._decode_frames([(pos, ptr - first, seq, blocksize) for pos, ptr, seq, blocksize in frames.tolist()])
+        finally:
+            self._release_shared_buffer()
+            self._frame_hook = None
+        table, self._table = self._table, None
+        return self._samplebuffer, table
+
+    def load_frames(self, input_file: Path, frames: list) -> FrameTable:
+        """
+        Decode the given frames into the already allocated samplebuffer
+        Used by the worker processes, the params must be already set
+        :param input_file: source file
+        :param frames: list of (bit position, samplebuffer position, frame number, blocksize) tuples
+        :return: detached table of the decoded frames, see FrameTable.detach
+        """
+        self._ricer.responsiveness = self._params.responsiveness
+        self._table = self._create_table(len(frames))
+        with self._mapped(input_file):
+            for start, samplebuffer_ptr, _, _ in frames:
+                self._sec.set_pos(start)
+                self._samplebuffer_ptr = samplebuffer_ptr
+                self._frame()
+
+        table, self._table = self._table, None
+        table.detach()
+        return table
 
     def _metadata_block(self) -> int:
-        data_len = self._metadata_block_header()
-        return self._metadata_block_streaminfo()
+        expected_frames = 0
+        last = False
+        while not last:
+            last, block_type, data_len = self._metadata_block_header()
+            if block_type == MetadataBlockType.STREAMINFO:
+                expected_frames = self._metadata_block_streaminfo()
+            elif block_type == MetadataBlockType.SEEKTABLE:
+                self._metadata_block_seektable(data_len)
+            else:
+                # unknown metadata blocks are skipped
+                self._sec.advance(data_len * 8)
+        return expected_frames
 
-    def _metadata_block_header(self) -> int:
+    def _metadata_block_header(self) -> (bool, int, int):
         sizes = StrawSizes.metadata_block_header
         last_metadata_block = self._sec.get_int()  # this block is the last metadata block before the audio blocks
-        block_type = self._sec.get_int(length=sizes.type)  # BLOCK_TYPE: STREAMINFO
-        if block_type == 0:
-            return 0
+        block_type = self._sec.get_int(length=sizes.type)
+        if block_type == MetadataBlockType.STREAMINFO:
+            return last_metadata_block, block_type, 0
         else:
             data_len = self._sec.get_int(length=sizes.size)
-            return data_len
+            return last_metadata_block, block_type, data_len
 
     def _metadata_block_streaminfo(self) -> int:
         sizes = StrawSizes.metadata_block_streaminfo
@@ -234,66 +480,89 @@ class StrawFormatReader(BaseReader):
         self._params.alloc_arrays()
         self._params.bits_per_sample = self._sec.get_int(length=sizes.bps) + 1
         expected_frames = self._sec.get_int(length=sizes.frames)
+        self._params.total_frames = expected_frames
         self._params.total_samples = self._sec.get_int(length=sizes.samples)
         self._params.md5 = self._sec.get_bytes(length=sizes.md5)
         self._params.responsiveness = self._sec.get_int(length=sizes.responsiveness)
         self._ricer.responsiveness = self._params.responsiveness
 
-        # Allocate sample buffer
-        self._allocate_buffer()
-
         # Shift
         has_shift = self._sec.get_int()
         if has_shift:
             self._params.leading_channel = self._sec.get_int_utf8()
-            for i in range(self._params.lags.shape[0]):
-                self._params.lags[i] = self._sec.get_int(length=sizes.shift)
-            total_size = self._samplebuffer.shape[1] - np.max(self._params.lags)
+            self._sec.get_ints(self._params.lags, length=sizes.shift)
+            max_lag = np.max(self._params.lags)
+            dtype = f"int{static.soundfile_dtype[self._params.bits_per_sample]}"
             for c in range(self._params.channels):
                 lag = self._params.lags[c]
-                for s in range(lag):
-                    self._samplebuffer[c][s] = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
-                for e in range(total_size + lag, self._samplebuffer.shape[1]):
-                    self._samplebuffer[c][e] = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
+                self._params.removed_samples_start.append(np.empty(lag, dtype=dtype))
+                self._params.removed_samples_end.append(np.empty(max_lag - lag, dtype=dtype))
+                self._sec.get_ints(self._params.removed_samples_start[c], length=self._params.bits_per_sample,
+                                   signed=True)
+                self._sec.get_ints(self._params.removed_samples_end[c], length=self._params.bits_per_sample,
+                                   signed=True)
 
         # Bias
         has_bias = self._sec.get_int()
         if has_bias:
-            for i in range(self._params.bias.shape[0]):
-                self._params.bias[i] = self._sec.get_int(length=sizes.bias, signed=True)
+            self._sec.get_ints(self._params.bias, length=sizes.bias, signed=True)
 
         # Gain
         has_gain = self._sec.get_int()
         if has_gain:
-            for i in range(self._params.gain.shape[0]):
-                self._params.gain[i] = self._sec.get_int(length=sizes.gain)
+            self._sec.get_ints(self._params.gain, length=sizes.gain)
             self._params.gain_shift = self._sec.get_int(length=sizes.gain_shift)
 
         self._sec.skip_padding()
         return expected_frames
 
-    def _frame(self, expected_frames: int):
+    def _metadata_block_seektable(self, data_len: int):
+        sizes = StrawSizes.metadata_block_seektable
+        point_bytes = (sizes.frame + sizes.sample + sizes.offset) // 8
+        self._seektable = np.zeros((data_len // point_bytes, 3), dtype=np.int64)
+        for point in self._seektable:
+            point[0] = self._sec.get_int(length=sizes.frame)
+            point[1] = self._sec.get_int(length=sizes.sample)
+            point[2] = self._sec.get_int(length=sizes.offset)
+        self._sec.advance((data_len % point_bytes) * 8)
+
+    def _place_removed_samples(self):
+        """
+        Copy the samples removed by the shift correction into the samplebuffer
+        :return: None
+        """
+        if not self._params.removed_samples_start:
+            return
+        total_size = self._params.total_samples - np.max(self._params.lags)
+        for c in range(self._params.channels):
+            lag = self._params.lags[c]
+            self._place_samples(c, 0, self._params.removed_samples_start[c])
+            self._place_samples(c, total_size + lag, self._params.removed_samples_end[c])
+
+    def _frame(self):
         start = self._sec.get_pos()
         seq, frame_size, blocksize = self._frame_header()
-        last_lpc_frame = 0
-        for i in range(self._params.channels):
-            row = self._subframe(last_lpc_frame, blocksize, i)
-            row["seq"] = seq
-            row["idx"] = i * expected_frames + seq
-            # we expect that the first channel will have lpc coefficients in every case
-            if "qlp" in row and isinstance(row["qlp"], np.ndarray):
-                last_lpc_frame = row
-            self._raw.append(row)
+        i = self._frame_num
+        self._table.seq[i] = seq
+        self._table.start[i] = self._samplebuffer_ptr
+        self._table.blocksize[i] = blocksize
+        self._lpc_channel = None
+        for c in range(self._params.channels):
+            self._subframe(i, c)
+        self._frame_num += 1
         self._samplebuffer_ptr += blocksize
         self._sec.skip_padding()
 
         # Footer
         footer_sizes = StrawSizes.frame_footer
-        expected_crc = self.Crc.crc16(self._sec.get_from(start).tobytes())
+        expected_crc = self.Crc.crc16(self._sec.get_from(start))
         checksum = self._sec.get_int(length=footer_sizes.crc)
         if expected_crc != checksum:
             raise RuntimeError(f"Inavalid frame checksum at frame {seq}")
 
+        if self._frame_hook is not None:
+            self._frame_hook(self._table, i)
+
     def _frame_header(self) -> (dict, int, int):
         sizes = StrawSizes.frame_header
         start = self._sec.get_pos()
@@ -308,125 +577,112 @@ class StrawFormatReader(BaseReader):
         seq = self._sec.get_int_utf8()
         frame_size = self._sec.get_int(length=sizes.frame_bytes)
 
-        expected_crc = self.Crc.crc8(self._sec.get_from(start).tobytes())
+        expected_crc = self.Crc.crc8(self._sec.get_from(start))
         checksum = self._sec.get_int(length=sizes.crc)
         if expected_crc != checksum:
             raise RuntimeError(f"Inavalid frame header checksum at frame {seq}")
         return seq, frame_size, blocksize
 
-    def _subframe(self, last_lpc: dict, blocksize: int, subframe_num: int) -> dict:
+    def _subframe(self, i: int, subframe_num: int):
         subframe_type = self._subframe_header()
-        return self._subframe_data(subframe_type, last_lpc, blocksize, subframe_num)
+        self._table.frame_type[i, subframe_num] = subframe_type
+        self._subframe_data(subframe_type, i, subframe_num)
 
     def _subframe_header(self) -> int:
         sizes = StrawSizes.subframe_header
         return self._sec.get_int(length=sizes.type)
 
-    def _subframe_data(self, subframe_type: int, last_lpc: dict, blocksize: int, subframe_num: int) -> dict:
+    def _subframe_data(self, subframe_type: int, i: int, subframe_num: int):
         if subframe_type == SubframeType.CONSTANT:  # SUBFRAME_CONSTANT
-            return self._subframe_constant(blocksize, subframe_num)
+            self._subframe_constant(i, subframe_num)
         elif subframe_type == SubframeType.RAW:  # SUBFRAME_RAW
-            return self._subframe_raw(blocksize, subframe_num)
+            self._subframe_raw(i, subframe_num)
         elif subframe_type == SubframeType.LPC:  # SUBFRAME_LPC
-            return self._subframe_lpc(blocksize, subframe_num)
+            self._subframe_lpc(i, subframe_num)
         elif subframe_type == SubframeType.LPC_COMMON:  # SUBFRAME_LPC
             if subframe_num == 0:
-                return self._subframe_lpc(blocksize, subframe_num)
+                self._subframe_lpc(i, subframe_num)
             else:
-                return self._subframe_lpc_common(last_lpc, blocksize, subframe_num)
+                # the coefficients of the last subframe which stored them
+                if self._lpc_channel is None:
+                    raise ValueError(f"LPC_COMMON subframe {subframe_num} precedes the LPC coefficients "
+                                     f"(frame {self._table.seq[i]})")
+                self._table.set_qlp(i, *self._table.get_lpc(i, self._lpc_channel), channel=subframe_num)
+                self._subframe_lpc_common(i, subframe_num)
         else:
             raise ValueError(f"Invalid frame type: {subframe_type}")
 
-    def _subframe_constant(self, blocksize: int, subframe_num: int):
-        row = {
-            "frame_type": SubframeType.CONSTANT,
-            "channel": subframe_num,
-            "frame": self._samplebuffer[subframe_num][
-                     self._samplebuffer_ptr + self._params.lags[subframe_num]:self._samplebuffer_ptr +
-                                                                              self._params.lags[
-                                                                                  subframe_num] + blocksize]
-        }
-        row["frame"][:] = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
-        return row
-
-    def _subframe_raw(self, blocksize: int, subframe_num: int) -> dict:
-        row = {
-            "frame_type": SubframeType.RAW,
-            "channel": subframe_num,
-            "frame": self._samplebuffer[subframe_num][
-                     self._samplebuffer_ptr + self._params.lags[subframe_num]:self._samplebuffer_ptr +
-                                                                              self._params.lags[
-                                                                                  subframe_num] + blocksize]
-        }
-        bitbytes = self._sec.get_bytes(length=self._params.bits_per_sample * blocksize)
-        ext_io.read_frame(row["frame"], bitbytes, self._params.bits_per_sample, 1)
-        row["frame"] -= self._params.bias[subframe_num]
-        return row
-
-    def _subframe_lpc(self, blocksize: int, subframe_num: int) -> dict:
-        sizes = StrawSizes.subframe_lpc
-        row = {
-            "frame_type": SubframeType.LPC,
-            "channel": subframe_num,
-            "frame": self._samplebuffer[subframe_num][
-                     self._samplebuffer_ptr + self._params.lags[subframe_num]:self._samplebuffer_ptr +
-                                                                              self._params.lags[
-                                                                                  subframe_num] + blocksize],
-            "qlp_precision": 0,
-            "shift": 0,
-            "qlp": None,
-        }
+    def _subframe_constant(self, i: int, subframe_num: int):
+        self._table.frame(i, subframe_num)[:] = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
 
+    def _subframe_raw(self, i: int, subframe_num: int):
+        frame = self._table.frame(i, subframe_num)
+        bitbytes = self._sec.get_bytes(length=self._params.bits_per_sample * frame.shape[0])
+        ext_io.read_frame(frame, bitbytes, self._params.bits_per_sample, 1)
+        frame -= self._params.bias[subframe_num]
+
+    def _subframe_lpc(self, i: int, subframe_num: int):
+        sizes = StrawSizes.subframe_lpc
         order = self._sec.get_int(length=sizes.lpc_order) + 1
-        row["qlp_precision"] = self._sec.get_int(length=sizes.lpc_prec) + 1
-        row["shift"] = self._sec.get_int(length=sizes.lpc_shift)
-        row["qlp"] = np.asarray(
-            [self._sec.get_int(length=row["qlp_precision"], signed=True) for _ in range(order)], dtype=np.int32)
-
-        for i in range(order):
-            warmup_sample = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
-            row["frame"][i] = warmup_sample - self._params.bias[subframe_num]
-
-        # get the residual
-        row["residual"] = self._samplebuffer[subframe_num][
-                          self._samplebuffer_ptr + self._params.lags[subframe_num] + order:self._samplebuffer_ptr +
-                                                                                           self._params.lags[
-                                                                                               subframe_num] + blocksize]
-        row["residual"], row["bps"] = self._residual(array=row["residual"])
-        return row
-
-    def _subframe_lpc_common(self, last_lpc: dict, blocksize: int, subframe_num: int) -> dict:
-        row = {
-            "frame_type": SubframeType.LPC_COMMON,
-            "channel": subframe_num,
-            "frame": self._samplebuffer[subframe_num][
-                     self._samplebuffer_ptr + self._params.lags[subframe_num]:self._samplebuffer_ptr +
-                                                                              self._params.lags[
-                                                                                  subframe_num] + blocksize],
-            "qlp_precision": last_lpc["qlp_precision"],
-            "shift": last_lpc["shift"],
-            "qlp": last_lpc["qlp"],
-        }
-
-        last_lpc["frame_type"] = SubframeType.LPC_COMMON
-        order = len(last_lpc["qlp"])
-        for i in range(order):
-            warmup_sample = self._sec.get_int(length=self._params.bits_per_sample, signed=True)
-            row["frame"][i] = warmup_sample - self._params.bias[subframe_num]
-
-        # get the residual
-        row["residual"] = self._samplebuffer[subframe_num][
-                          self._samplebuffer_ptr + self._params.lags[subframe_num] + order:self._samplebuffer_ptr +
-                                                                                           self._params.lags[
-                                                                                               subframe_num] + blocksize]
-        row["residual"], row["bps"] = self._residual(array=row["residual"])
-        return row
-
-    def _residual(self, array: np.array) -> np.array:
+        qlp_precision = self._sec.get_int(length=sizes.lpc_prec) + 1
+        shift = self._sec.get_int(length=sizes.lpc_shift)
+        qlp = np.empty(order, dtype=np.int32)
+        self._sec.get_ints(qlp, length=qlp_precision, signed=True)
+
+        self._table.set_qlp(i, qlp, qlp_precision, shift, channel=subframe_num)
+        self._lpc_channel = subframe_num
+        self._subframe_lpc_common(i, subframe_num)
+
+    def _subframe_lpc_common(self, i: int, subframe_num: int):
+        order = len(self._table.get_lpc(i, subframe_num)[0])
+        self._warmup(self._table.frame(i, subframe_num)[:order], subframe_num)
+        self._table.k[i, subframe_num] = self._residual(self._table.residual(i, subframe_num))
+
+    def _warmup(self, array: np.array, subframe_num: int):
+        self._sec.get_ints(array, length=self._params.bits_per_sample, signed=True)
+        array -= self._params.bias[subframe_num]
+
+    def _residual(self, array: np.array) -> int:
         sizes = StrawSizes.residual
         bps = self._sec.get_int(length=sizes.param)
         bits_read = self._ricer.bitstream_to_frame(
             self._memview,
             len(array), bps, own_frame=array, bitarray_pos=self._sec.get_pos())
         self._sec.advance(bits_read)
-        return array, bps
+        return bps
+
+
+def _load_frames(frames: list, input_file: Path, params, buffer, frame_hook: callable = None) -> FrameTable:
+    """
+    Worker decoding a batch of frames into the shared samplebuffer
+    :param frames: list of (bit position, samplebuffer position, frame number, blocksize) tuples
+    :param input_file: source file
+    :param params: stream params parsed from the metadata
+    :param buffer: descriptor of the shared samplebuffer, or the samplebuffer itself for thread workers
+    :param frame_hook: optional function called with the table and the position of every decoded frame
+    :return: detached table of the decoded frames
+    """
+    if isinstance(buffer, np.ndarray):
+        return _read_frames(frames, input_file, params, buffer, frame_hook)
+
+    shared = SharedArray.attach(buffer)
+    try:
+        table = _read_frames(frames, input_file, params, shared.array.swapaxes(1, 0), frame_hook)
+    finally:
+        shared.close()
+    return table
+
+
+def _read_frames(frames: list, input_file: Path, params, samplebuffer: np.ndarray,
+                 frame_hook: callable = None) -> FrameTable:
+    """
+    Decode a batch of frames into the given samplebuffer, see _load_frames
+    :return: detached table of the decoded frames
+    """
+    reader = StrawFormatReader(show_progress=False)
+    reader._params = params
+    reader._frame_hook = frame_hook
+    reader._samplebuffer = samplebuffer
+    table = reader.load_frames(input_file, frames)
+    del reader
+    return table
@@ -7,30 +7,178 @@ import numpy as np
 # LPC coefficients #
 ####################
 
-# @cython.cdivision(True)
-# def compute_lp_coefficients(long[:] autoc, int order, double[:] lpc):
-#     cdef int j
-#     cdef double r, err
-#     cdef double tmp
-#
-#     err = autoc[0]
-#
-#     r = -autoc[order + 1]
-#     for j in range(order):
-#         r -= lpc[j] * autoc[order - j]
-#     r /= err
-#
-#     lpc[order] = r
-#     for j in range(order >> 1):
-#         tmp = lpc[j]
-#         lpc[j] += r * lpc[order - 1 - j]
-#         lpc[order - 1 - j] += r * tmp
-#
-#     if order & 1:
-#         lpc[j] += lpc[j] * r
-#
-#     err *= (1.0 - r * r)
-#     return err
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def autocorrelate(const double[:, ::1] signals, double[:, ::1] out):
+    """
+    Computes the autocorrelation of every row, the GIL is released during the computation
+    :param signals: (rows, samples) windowed signals
+    :param out: (rows, lags) target array, lag i of row s is stored in out[s, i]
+    :return: None
+    """
+    cdef Py_ssize_t rows = signals.shape[0]
+    cdef Py_ssize_t data_len = signals.shape[1]
+    cdef Py_ssize_t lags = out.shape[1]
+    cdef Py_ssize_t s, i, j, last
+    cdef double x
+
+    if out.shape[0] != rows:
+        raise ValueError("The output must have a row for each signal")
+
+    with nogil:
+        for s in range(rows):
+            out[s, :] = 0
+            for j in range(data_len):
+                # all lags of a sample at once, the inner loop runs over consecutive samples
+                x = signals[s, j]
+                last = min(lags, data_len - j)
+                for i in range(last):
+                    out[s, i] += x * signals[s, j + i]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def levinson(const double[:, ::1] autoc, double[:, ::1] lpc, const int[::1] orders=None):
+    """
+    Solves the Yule-Walker equations of every row by the Levinson-Durbin recursion,
+    the GIL is released during the computation
+    Follows scipy.linalg.solve_toeplitz step by step, so the coefficients are identical
+    :param autoc: (rows, order + 1) autocorrelation coefficients
+    :param lpc: (rows, order) target array of the LPC coefficients
+    :param orders: optional (rows,) order of each row, the coefficients after the order are set to zero
+    :return: (rows,) mask of the rows with a singular system, their coefficients are set to zero
+    """
+    cdef Py_ssize_t rows = autoc.shape[0]
+    cdef Py_ssize_t max_order = lpc.shape[1]
+    cdef Py_ssize_t n = max_order
+    cdef Py_ssize_t s, m, j, k
+    cdef double x_num, g_num, h_num, g_den, c1, c2, gj, gk, hj, hk
+    cdef double x_den = 1
+    cdef bint has_orders = orders is not None
+
+    if autoc.shape[0] != lpc.shape[0] or autoc.shape[1] != max_order + 1:
+        raise ValueError("The autocorrelation must have order + 1 coefficients for each row")
+    if has_orders and (orders.shape[0] != rows or (rows and not 0 <= np.min(orders) <= np.max(orders) <= max_order)):
+        raise ValueError("The orders must be between 0 and the number of coefficients")
+    singular_rows = np.zeros(rows, dtype=np.uint8)
+    if max_order == 0:
+        return singular_rows.view(bool)
+    cdef unsigned char[::1] singular = singular_rows
+
+    cdef double[::1] g = np.empty(max_order)
+    cdef double[::1] h = np.empty(max_order)
+
+    with nogil:
+        for s in range(rows):
+            if has_orders:
+                n = orders[s]
+                lpc[s, n:] = 0
+                if n == 0:
+                    continue
+            # symmetric Toeplitz matrix: element i - j of the matrix is autoc[s, abs(i - j)]
+            if autoc[s, 0] == 0:
+                singular[s] = 1
+                lpc[s, :] = 0
+                continue
+            lpc[s, 0] = autoc[s, 1] / autoc[s, 0]
+            if n == 1:
+                continue
+            g[0] = autoc[s, 1] / autoc[s, 0]
+            h[0] = autoc[s, 1] / autoc[s, 0]
+            for m in range(1, n):
+                x_num = -autoc[s, m + 1]
+                x_den = -autoc[s, 0]
+                for j in range(m):
+                    x_num = x_num + autoc[s, m - j] * lpc[s, j]
+                    x_den = x_den + autoc[s, m - j] * g[m - j - 1]
+                if x_den == 0:
+                    break
+                lpc[s, m] = x_num / x_den
+                for j in range(m):
+                    lpc[s, j] = lpc[s, j] - lpc[s, m] * g[m - j - 1]
+                if m == n - 1:
+                    break
+
+                g_num = -autoc[s, m + 1]
+                h_num = -autoc[s, m + 1]
+                g_den = -autoc[s, 0]
+                for j in range(m):
+                    g_num = g_num + autoc[s, m - j] * g[j]
+                    h_num = h_num + autoc[s, m - j] * h[j]
+                    g_den = g_den + autoc[s, m - j] * h[m - j - 1]
+                if g_den == 0:
+                    x_den = 0
+                    break
+                g[m] = g_num / g_den
+                h[m] = h_num / x_den
+                k = m - 1
+                c1 = g[m]
+                c2 = h[m]
+                for j in range((m + 1) >> 1):
+                    gj = g[j]
+                    gk = g[k]
+                    hj = h[j]
+                    hk = h[k]
+                    g[j] = gj - c1 * hk
+                    g[k] = gk - c1 * hj
+                    h[j] = hj - c2 * gk
+                    h[k] = hk - c2 * gj
+                    k -= 1
+            if x_den == 0:
+                singular[s] = 1
+                lpc[s, :] = 0
+
+    return singular_rows.view(bool)
+
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def levinson_errors(const double[:, ::1] autoc, double[:, ::1] errors):
+    """
+    Prediction errors of every LPC order in one pass of the Levinson-Durbin recursion,
+    the GIL is released during the computation
+    Implemented from: https://github.com/xiph/flac/blob/master/src/libFLAC/lpc.c
+    :param autoc: (rows, max_order + 1) autocorrelation coefficients
+    :param errors: (rows, max_order) target array, errors[s, i] is the prediction error of row s with order i + 1
+    :return: None
+    """
+    cdef Py_ssize_t rows = autoc.shape[0]
+    cdef Py_ssize_t max_order = errors.shape[1]
+    cdef Py_ssize_t s, i, j
+    cdef double err, r, tmp
+
+    if autoc.shape[0] != errors.shape[0] or autoc.shape[1] != max_order + 1:
+        raise ValueError("The autocorrelation must have max_order + 1 coefficients for each row")
+
+    cdef double[::1] lpc = np.empty(max(max_order, 1))
+
+    with nogil:
+        for s in range(rows):
+            err = autoc[s, 0]
+            for i in range(max_order):
+                if err <= 0:
+                    # a perfectly predicted signal, higher orders cannot do better
+                    errors[s, i:] = 0
+                    break
+
+                r = autoc[s, i + 1]
+                for j in range(i):
+                    r -= lpc[j] * autoc[s, i - j]
+                r /= err
+
+                lpc[i] = r
+                for j in range(i >> 1):
+                    tmp = lpc[j]
+                    lpc[j] -= r * lpc[i - 1 - j]
+                    lpc[i - 1 - j] -= r * tmp
+                if i & 1:
+                    lpc[i >> 1] -= r * lpc[i >> 1]
+
+                err *= 1.0 - r * r
+                errors[s, i] = err if err > 0 else 0
 
 
 ################
@@ -84,24 +232,277 @@ def quantize_lpc(double[:] lpc_c, int precision) -> int:
 # Prediction #
 ##############
 
+# The specialized kernels below are used for every order up to MAX_ORDER, the coefficients are padded with zeros to a
+# multiple of 4, so that the unrolled loops of the kernels have a constant length and the compiler unrolls them fully
+# The products are accumulated in 32 bits when the sum of the predictions cannot overflow, otherwise the products
+# are computed like in the generic kernels and accumulated in 64 bits, the results are always identical
+
+cdef enum:
+    MAX_ORDER = 32
+    WINDOW_ORDER = 16  # up to this order the restoration keeps the last samples in registers
+
+ctypedef fused accumulator:
+    int
+    long
+
+
+cdef inline Py_ssize_t _pad_coefficients(const int[:] qlp, int* coefficients, long* total) noexcept nogil:
+    """
+    Copy the coefficients into a zero-padded array, compute the sum of their absolute values
+    :return: order padded to a multiple of 4
+    """
+    cdef Py_ssize_t order = qlp.shape[0]
+    cdef Py_ssize_t padded = (order + 3) & ~3
+    cdef Py_ssize_t j
+    total[0] = 0
+    for j in range(padded):
+        coefficients[j] = qlp[j] if j < order else 0
+        total[0] += coefficients[j] if coefficients[j] >= 0 else -<long>coefficients[j]
+    return padded
+
+
+cdef inline void _residual_unrolled(const cython.integral* x, Py_ssize_t x_stride, cython.integral* r,
+                                    Py_ssize_t r_stride, Py_ssize_t start, Py_ssize_t n, const int* c, int shift,
+                                    const Py_ssize_t order, accumulator acc) noexcept nogil:
+    cdef accumulator s
+    cdef const cython.integral* p
+    cdef Py_ssize_t i, j
+    for i in range(start, n):
+        p = x + (i - 1) * x_stride
+        s = 0
+        for j in range(0, order, 4):
+            s += (<accumulator>(c[j] * p[-j * x_stride]) + <accumulator>(c[j + 1] * p[-(j + 1) * x_stride])
+                  + <accumulator>(c[j + 2] * p[-(j + 2) * x_stride]) + <accumulator>(c[j + 3] * p[-(j + 3) * x_stride]))
+        r[i * r_stride] = <cython.integral>(x[i * x_stride] - (s >> shift))
+
+
+cdef inline void _residual(const cython.integral* x, Py_ssize_t x_stride, cython.integral* r, Py_ssize_t r_stride,
+                           Py_ssize_t order, Py_ssize_t n, const int* c, Py_ssize_t padded, int shift,
+                           accumulator acc) noexcept nogil:
+    """
+    Residual of the samples from order to n, dispatched to the kernel of the padded order
+    """
+    cdef accumulator s
+    cdef Py_ssize_t i, j
+    # the samples before the padded order have less history than the kernel reads
+    for i in range(order, min(padded, n)):
+        s = 0
+        for j in range(order):
+            s += <accumulator>(c[j] * x[(i - j - 1) * x_stride])
+        r[i * r_stride] = <cython.integral>(x[i * x_stride] - (s >> shift))
+
+    if padded == 4:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 4, acc)
+    elif padded == 8:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 8, acc)
+    elif padded == 12:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 12, acc)
+    elif padded == 16:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 16, acc)
+    elif padded == 20:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 20, acc)
+    elif padded == 24:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 24, acc)
+    elif padded == 28:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 28, acc)
+    elif padded == 32:
+        _residual_unrolled(x, x_stride, r, r_stride, padded, n, c, shift, 32, acc)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def compute_residual(cython.integral[:] frame, cython.integral[:] residual, int[:] qlp, int lp_quantization):
+    """
+    Computes the prediction residual of a frame, the GIL is released during the computation
+    Dispatches to a kernel specialized for the order, the result is identical to compute_residual_generic
+    :param frame: signal frame
+    :param residual: target array with the shape of frame, the first order samples are not written
+    :param qlp: quantized LPC coefficients
+    :param lp_quantization: quantization shift
+    :return: None
+    """
+    cdef Py_ssize_t data_len = frame.shape[0]
+    cdef Py_ssize_t order = qlp.shape[0]
+    cdef Py_ssize_t padded, i
+    cdef int coefficients[MAX_ORDER]
+    cdef long total, peak = 0
+    cdef int narrow = 0
+    cdef long wide = 0
+
+    if residual.shape[0] < data_len:
+        raise ValueError("The residual must have the shape of the frame")
+    if order > MAX_ORDER:
+        compute_residual_generic(frame, residual, qlp, lp_quantization)
+        return None
+    if data_len <= order:
+        return None
+
+    cdef const cython.integral* x = &frame[0]
+    cdef cython.integral* r = &residual[0]
+    cdef Py_ssize_t x_stride = frame.strides[0] // sizeof(cython.integral)
+    cdef Py_ssize_t r_stride = residual.strides[0] // sizeof(cython.integral)
+
+    with nogil:
+        padded = _pad_coefficients(qlp, coefficients, &total)
+        for i in range(data_len):
+            peak = max(peak, x[i * x_stride] if x[i * x_stride] >= 0 else -<long>x[i * x_stride])
+        if total == 0 or peak < (<long>1 << 31) // total:
+            _residual(x, x_stride, r, r_stride, order, data_len, coefficients, padded, lp_quantization, narrow)
+        else:
+            _residual(x, x_stride, r, r_stride, order, data_len, coefficients, padded, lp_quantization, wide)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def compute_residual_generic(cython.integral[:] frame, cython.integral[:] residual, int[:] qlp, int lp_quantization):
+    """
+    Computes the prediction residual of a frame, the GIL is released during the computation
+    Reference implementation for any order, see compute_residual
+    :param frame: signal frame
+    :param residual: target array with the shape of frame, the first order samples are not written
+    :param qlp: quantized LPC coefficients
+    :param lp_quantization: quantization shift
+    :return: None
+    """
     cdef Py_ssize_t data_len = frame.shape[0]
     cdef Py_ssize_t order = qlp.shape[0]
     cdef Py_ssize_t  i, j
     cdef long _sum
 
-    for i in range(order, data_len):
-        _sum = 0
-        for j in range(order):
-            _sum += qlp[j] * frame[i - j - 1]
-        residual[i] = frame[i] - (_sum >> lp_quantization)
+    if residual.shape[0] < data_len:
+        raise ValueError("The residual must have the shape of the frame")
+
+    with nogil:
+        for i in range(order, data_len):
+            _sum = 0
+            for j in range(order):
+                _sum += qlp[j] * frame[i - j - 1]
+            residual[i] = frame[i] - (_sum >> lp_quantization)
 
 ###############
 # Restoration #
 ###############
 
 
+cdef inline void _restore_window(cython.integral* x, Py_ssize_t stride, Py_ssize_t start, Py_ssize_t n, const int* c,
+                                 int shift, const Py_ssize_t order, accumulator acc) noexcept nogil:
+    # the last order samples, w[0] is the newest one, the fully unrolled loops keep them in registers
+    cdef cython.integral w[WINDOW_ORDER]
+    cdef cython.integral v
+    cdef accumulator s
+    cdef Py_ssize_t i, j
+    for j in range(order):
+        w[j] = x[(start - 1 - j) * stride]
+    for i in range(start, n):
+        s = 0
+        for j in range(order):
+            s += <accumulator>(c[j] * w[j])
+        v = <cython.integral>(x[i * stride] + (s >> shift))
+        x[i * stride] = v
+        for j in range(order - 1, 0, -1):
+            w[j] = w[j - 1]
+        w[0] = v
+
+
+cdef inline void _restore_unrolled(cython.integral* x, Py_ssize_t stride, Py_ssize_t start, Py_ssize_t n,
+                                   const int* c, int shift, const Py_ssize_t order, accumulator acc) noexcept nogil:
+    cdef accumulator s
+    cdef cython.integral* p
+    cdef Py_ssize_t i, j
+    for i in range(start, n):
+        p = x + (i - 1) * stride
+        s = 0
+        for j in range(0, order, 4):
+            s += (<accumulator>(c[j] * p[-j * stride]) + <accumulator>(c[j + 1] * p[-(j + 1) * stride])
+                  + <accumulator>(c[j + 2] * p[-(j + 2) * stride]) + <accumulator>(c[j + 3] * p[-(j + 3) * stride]))
+        x[i * stride] = <cython.integral>(x[i * stride] + (s >> shift))
+
+
+cdef inline void _restore(cython.integral* x, Py_ssize_t stride, Py_ssize_t order, Py_ssize_t n, const int* c,
+                          Py_ssize_t padded, int shift, accumulator acc) noexcept nogil:
+    """
+    Restoration of the samples from order to n, dispatched to the kernel of the padded order
+    """
+    cdef accumulator s
+    cdef Py_ssize_t i, j
+    # the samples before the padded order have less history than the kernel reads
+    for i in range(order, min(padded, n)):
+        s = 0
+        for j in range(order):
+            s += <accumulator>(c[j] * x[(i - j - 1) * stride])
+        x[i * stride] = <cython.integral>(x[i * stride] + (s >> shift))
+
+    if padded == 4:
+        _restore_window(x, stride, padded, n, c, shift, 4, acc)
+    elif padded == 8:
+        _restore_window(x, stride, padded, n, c, shift, 8, acc)
+    elif padded == 12:
+        _restore_window(x, stride, padded, n, c, shift, 12, acc)
+    elif padded == 16:
+        _restore_window(x, stride, padded, n, c, shift, 16, acc)
+    elif padded == 20:
+        _restore_unrolled(x, stride, padded, n, c, shift, 20, acc)
+    elif padded == 24:
+        _restore_unrolled(x, stride, padded, n, c, shift, 24, acc)
+    elif padded == 28:
+        _restore_unrolled(x, stride, padded, n, c, shift, 28, acc)
+    elif padded == 32:
+        _restore_unrolled(x, stride, padded, n, c, shift, 32, acc)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def restore_signal(cython.integral[:] frame, int[:] qlp, int lp_quantization):
+    """
+    Restores the signal in place from the warmup samples followed by the residual,
+    the GIL is released during the computation
+    Dispatches to a kernel specialized for the order, the result is identical to restore_signal_generic
+    The restored samples are bounded by the type of the frame, so 16-bit frames are restored with 32-bit sums
+    :param frame: warmup samples followed by the residual
+    :param qlp: quantized LPC coefficients
+    :param lp_quantization: quantization shift
+    :return: None
+    """
+    cdef Py_ssize_t data_len = frame.shape[0]
+    cdef Py_ssize_t order = qlp.shape[0]
+    cdef Py_ssize_t padded
+    cdef int coefficients[MAX_ORDER]
+    cdef long total
+    cdef int narrow = 0
+    cdef long wide = 0
+
+    if order <= 0:
+        return None
+    if order > MAX_ORDER:
+        restore_signal_generic(frame, qlp, lp_quantization)
+        return None
+    if data_len <= order:
+        return None
+
+    cdef cython.integral* x = &frame[0]
+    cdef Py_ssize_t stride = frame.strides[0] // sizeof(cython.integral)
+    cdef int sample_bits = 8 * sizeof(cython.integral)
+
+    with nogil:
+        padded = _pad_coefficients(qlp, coefficients, &total)
+        if sample_bits < 32 and total < (<long>1 << (32 - sample_bits)):
+            _restore(x, stride, order, data_len, coefficients, padded, lp_quantization, narrow)
+        else:
+            _restore(x, stride, order, data_len, coefficients, padded, lp_quantization, wide)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def restore_signal_generic(cython.integral[:] frame, int[:] qlp, int lp_quantization):
+    """
+    Restores the signal in place from the warmup samples followed by the residual,
+    the GIL is released during the computation
+    Reference implementation for any order, see restore_signal
+    :param frame: warmup samples followed by the residual
+    :param qlp: quantized LPC coefficients
+    :param lp_quantization: quantization shift
+    :return: None
+    """
     cdef Py_ssize_t data_len = frame.shape[0]
     cdef Py_ssize_t order = qlp.shape[0]
     cdef Py_ssize_t  i, j
@@ -110,8 +511,9 @@ def restore_signal(cython.integral[:] frame, int[:] qlp, int lp_quantization):
     if order <= 0:
         return None
 
-    for i in range(order, data_len):
-        _sum = 0
-        for j in range(order):
-            _sum += qlp[j] * frame[i - j - 1]
-        frame[i] = frame[i] + (_sum >> lp_quantization)
+    with nogil:
+        for i in range(order, data_len):
+            _sum = 0
+            for j in range(order):
+                _sum += qlp[j] * frame[i - j - 1]
+            frame[i] = frame[i] + (_sum >> lp_quantization)
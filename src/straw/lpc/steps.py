@@ -1,4 +1,5 @@
 import math
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
@@ -34,13 +35,14 @@ def compute_lpc(signal: np.array, p: int) -> np.array:
     :return: array of length p containing LPC coefficients
     """
 
-    if isinstance(signal, pd.Series):
+    if isinstance(signal, (pd.Series, list)):
         # we are dealing with a multichannel LPC
         # Extend to 64 bits to prevent overflows
-        if not signal.apply(np.any).all():
+        signal = list(signal)
+        if not all(s.any() for s in signal):
             return None
 
-        window = get_window("tukey", signal[signal.index[0]].shape[0])
+        window = get_window("tukey", signal[0].shape[0])
         r = np.asarray([_autocorr((s.astype(float) / (1 << 15)) * window, p + 1) for s in signal])
         r = np.mean(r, axis=0)
         # lpc_c = np.zeros(p)
@@ -57,6 +59,93 @@ def compute_lpc(signal: np.array, p: int) -> np.array:
     return solve_toeplitz(r[:-1], r[1:], check_finite=False)
 
 
+@lru_cache(maxsize=16)
+def tukey_window(size: int) -> np.array:
+    """
+    Tukey window of the LPC analysis, cached for each frame size
+    :param size: number of samples
+    :return: read-only window
+    """
+    window = get_window("tukey", size)
+    window.flags.writeable = False
+    return window
+
+
+def compute_lpc_autocorrelation(signals: np.array, p: int) -> (np.array, np.array):
+    """
+    Mean autocorrelation of the channels of frames with the same blocksize, see compute_lpc
+    The signals are windowed and scaled in place
+    :param signals: (frames, channels, blocksize) samples
+    :param p: LPC order
+    :return: tuple((frames, p + 1) mean autocorrelation, (frames,) mask of the frames without a silent channel)
+    """
+    frames, channels, blocksize = signals.shape
+    # frames with a silent channel have no coefficients, like in compute_lpc
+    valid = signals.any(axis=2).all(axis=1)
+
+    signals /= 1 << 15
+    signals *= tukey_window(blocksize)
+    r = np.empty((frames * channels, p + 1))
+    ext_lpc.autocorrelate(signals.reshape(-1, blocksize), r)
+    return r.reshape(frames, channels, p + 1).mean(axis=1), valid
+
+
+def compute_lpc_orders(autoc: np.array, blocksize: np.array, channels: int, p: int, bits_per_sample: int = 0,
+                       precision: int = 0, decode_penalty: float = 0.) -> (np.array, np.array):
+    """
+    Calculates the LPC coefficients of many frames from their mean autocorrelation, see compute_lpc_autocorrelation
+    The Levinson-Durbin recursion runs for all frames in one call
+    If bits_per_sample is given, the order of each frame is chosen by estimate_lpc_bits, otherwise it is p
+    The lowest order whose estimated size is at most (1 + decode_penalty) times the smallest one is chosen,
+    lower orders are faster to decode, see static.DecodeCost
+    :param autoc: (frames, p + 1) mean autocorrelation
+    :param blocksize: (frames,) number of samples of each frame
+    :param channels: number of channels
+    :param p: (maximal) LPC order
+    :param bits_per_sample: bits per sample of the signal, enables the order selection
+    :param precision: precision of the quantized coefficients in bits, used by the order selection
+    :param decode_penalty: relative size penalty accepted for a lower order
+    :return: tuple((frames, p) LPC coefficients, (frames,) order of each frame, 0 if the recursion is singular)
+    """
+    orders = np.full(autoc.shape[0], p, dtype=np.int32)
+    if bits_per_sample:
+        errors = np.empty((autoc.shape[0], p))
+        ext_lpc.levinson_errors(autoc, errors)
+        bits = estimate_lpc_bits(errors, blocksize, channels, bits_per_sample, precision)
+        accepted = bits <= bits.min(axis=1, keepdims=True) * (1 + decode_penalty)
+        orders[:] = np.argmax(accepted, axis=1) + 1
+
+    lpc = np.empty((autoc.shape[0], p))
+    singular = ext_lpc.levinson(autoc, lpc, orders)
+    orders[singular] = 0
+    return lpc, orders
+
+
+def estimate_lpc_bits(errors: np.array, blocksize: np.array, channels: int, bits_per_sample: int,
+                      precision: int) -> np.array:
+    """
+    Estimates the size of the LPC subframes of a frame for every order from the prediction errors,
+    without computing the residuals, see ext_lpc.levinson_errors
+    Implemented from FLAC__lpc_compute_expected_bits_per_residual_sample and FLAC__lpc_compute_best_order:
+    https://github.com/xiph/flac/blob/master/src/libFLAC/lpc.c
+    :param errors: (frames, max_order) prediction errors of the mean autocorrelation, see compute_lpc_orders
+    :param blocksize: (frames,) number of samples in each frame
+    :param channels: number of channels sharing the coefficients
+    :param bits_per_sample: bits per sample of the warmup samples
+    :param precision: precision of the quantized coefficients in bits
+    :return: (frames, max_order) estimated number of bits, column i is the order i + 1
+    """
+    orders = np.arange(1, errors.shape[1] + 1)
+    blocksize = np.asarray(blocksize)[:, None]
+    # the autocorrelation is computed from samples scaled by 2 ** -15, see compute_lpc
+    with np.errstate(divide="ignore"):
+        residual_bits = np.maximum(0.5 * np.log2(errors * (0.5 * (1 << 30)) / blocksize), 0)
+    bits = channels * (residual_bits * (blocksize - orders) + orders * bits_per_sample) + orders * precision
+    # a frame needs at least one sample after the warmup samples
+    bits[orders >= blocksize] = np.inf
+    return bits
+
+
 ################
 # Quantization #
 ################
@@ -141,16 +230,23 @@ def predict_signal(frame: np.array, qlp: np.array, shift):
     return np.convolve(frame, qlp, mode="full")[len(qlp) - 1:-len(qlp)] >> shift
 
 
-def predict_compute_residual(frame: np.array, qlp: np.array, shift: int):
+def predict_compute_residual(frame: np.array, qlp: np.array, shift: int, out: np.array = None):
     """
     Executes LPC prediction and returns the residual by subtracting the original frame from the predicted signal
     :param frame: signal frame
     :param qlp: quantized LPC coefficients
     :param shift: coefficient quantization shift
+    :param out: optional array with the shape of frame where the residual is computed, a copy of frame is used if None
     :return: frame residual with shape [order:]
     """
     shift = int(shift)
-    residual = frame.copy()
+    if out is None:
+        residual = frame.copy()
+    else:
+        residual = out
+        residual[:] = frame
+        if frame.dtype != residual.dtype:
+            frame = frame.astype(residual.dtype)
     ext_lpc.compute_residual(frame, residual, qlp, shift)
     tmp = residual[len(qlp):]
     # predicted = predict_signal(frame, qlp, shift)
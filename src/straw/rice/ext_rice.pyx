@@ -6,36 +6,25 @@ import cython
 # Signedness correction #
 #########################
 
-cdef long _interleave(long x):
+cdef inline long _interleave(long x) noexcept nogil:
     """
     Implementation of the overlap and interleave scheme from https://en.wikipedia.org/wiki/Golomb_coding
     :param x: signed integer to be remaped
     :return: positive interleaved integer
     """
-    if x == 0:
-        return 0
-
-    if x > 0:
-        return 2 * x
-    else:
-        return -2 * x - 1
+    # branchless form of: 2 * x if x >= 0 else -2 * x - 1
+    return <long> (<unsigned long> x << 1) ^ (x >> (8 * sizeof(long) - 1))
 
-@cython.cdivision(True)
-cdef long _deinterleave(long x):
+cdef inline long _deinterleave(long x) noexcept nogil:
     """
     Reverse of _interleave(short x)
     :param x: positive interleaved integer
     :return: original signed integer
     """
-    if x == 0:
-        return 0
+    # branchless form of: x / 2 if x % 2 == 0 else (x + 1) / -2
+    return (x >> 1) ^ -(x & 1)
 
-    if x % 2 == 0:
-        return x / 2
-    else:
-        return (x + 1) / -2
-
-cdef void update_scale(long s, short m, short *scale):
+cdef inline void update_scale(long s, short m, short *scale) noexcept nogil:
     if s > m:
         scale[0] += 1
     elif s < m:
@@ -59,9 +48,10 @@ cdef void _push_bit(unsigned char[:] bits, Py_ssize_t *bit_i, char val):
     bits[byte_i] |= 1 << real_bit_i
 
 @cython.cdivision(True)
-def encode_frame(unsigned char[:] bits, cython.integral[:] frame, short k, short resp, short adaptive):
+def encode_frame_bitwise(unsigned char[:] bits, cython.integral[:] frame, short k, short resp, short adaptive):
     """
     Encodes a whole residual frame and appends it to the end of the given bitstream
+    Reference implementation writing one bit at a time, see encode_frame
     :param bits: bitaray to which the bits will be appended
     :param frame: the frame to be encoded
     :param k: starting rice parameter
@@ -118,6 +108,145 @@ def encode_frame(unsigned char[:] bits, cython.integral[:] frame, short k, short
 
     return bit_i
 
+cdef struct _BitSink:
+    unsigned char *bits
+    Py_ssize_t byte_i
+    unsigned long long acc
+    int nacc
+
+cdef inline void _sink_put(_BitSink *sink, unsigned long long val, int length) noexcept nogil:
+    """
+    Append at most 32 bits to the accumulator and flush a whole 32-bit word once available
+    :param sink: target bit sink
+    :param val: value with no bits set above length
+    :param length: number of bits
+    :return: None
+    """
+    cdef unsigned long long word
+    sink.acc = (sink.acc << length) | val
+    sink.nacc += length
+    if sink.nacc >= 32:
+        sink.nacc -= 32
+        word = sink.acc >> sink.nacc
+        sink.bits[sink.byte_i] = (word >> 24) & 0xff
+        sink.bits[sink.byte_i + 1] = (word >> 16) & 0xff
+        sink.bits[sink.byte_i + 2] = (word >> 8) & 0xff
+        sink.bits[sink.byte_i + 3] = word & 0xff
+        sink.byte_i += 4
+
+cdef inline void _sink_zeros(_BitSink *sink, long count) noexcept nogil:
+    """
+    Append a run of zeros
+    :param sink: target bit sink
+    :param count: number of zeros
+    :return: None
+    """
+    while count > 32:
+        _sink_put(sink, 0, 32)
+        count -= 32
+    _sink_put(sink, 0, count)
+
+cdef inline void _sink_flush(_BitSink *sink) noexcept nogil:
+    """
+    Flush the remaining bits zero-padded to byte alignment
+    :param sink: target bit sink
+    :return: None
+    """
+    while sink.nacc > 0:
+        sink.nacc -= 8
+        if sink.nacc >= 0:
+            sink.bits[sink.byte_i] = (sink.acc >> sink.nacc) & 0xff
+        else:
+            sink.bits[sink.byte_i] = (sink.acc << -sink.nacc) & 0xff
+        sink.byte_i += 1
+    sink.nacc = 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def encode_frame(unsigned char[:] bits, cython.integral[:] frame, short k, short resp, short adaptive):
+    """
+    Encodes a whole residual frame and appends it to the end of the given bitstream
+    The bits are packed in a 64-bit accumulator, unary runs and remainders are written in bulk
+    Produces exactly the same bitstream as encode_frame_bitwise
+    The GIL is released while encoding, frames can be encoded concurrently by multiple threads
+    :param bits: buffer to which the bits will be written
+    :param frame: the frame to be encoded
+    :param k: starting rice parameter
+    :param resp: rice parameter responsiveness
+    :param adaptive: if True do adaptive rice coding by varying the parameter
+    :return: number of bits written or -1 if the buffer is too small
+    """
+    cdef long m, q, s
+    cdef Py_ssize_t x_max, i
+    cdef Py_ssize_t bit_i = 0
+    cdef Py_ssize_t bit_i_max = bits.shape[0] * 8
+    cdef _BitSink sink
+    cdef short scale = 0
+    cdef short j
+    cdef bint overflow = False
+
+    x_max = frame.shape[0]
+    if x_max == 0:
+        return 0
+    m = 1 << k
+    sink.bits = &bits[0]
+    sink.byte_i = 0
+    sink.acc = 0
+    sink.nacc = 0
+
+    with nogil:
+        for i in range(x_max):
+            s = _interleave(frame[i])
+
+            # Quotient code
+            if k < 31:
+                q = s >> k
+            else:
+                # m overflows here, keep the exact arithmetic of encode_frame_bitwise
+                q = s / m
+
+            if bit_i + q + k + 1 >= bit_i_max:
+                overflow = True
+                break
+            bit_i += q + k + 1
+
+            if q > 0:
+                _sink_zeros(&sink, q)
+
+            # Terminating one followed by the remainder
+            if k < 31:
+                _sink_put(&sink, (<unsigned long long> 1 << k) | (s & (m - 1)), k + 1)
+            else:
+                _sink_put(&sink, 1, 1)
+                for j in range(k):
+                    _sink_put(&sink, s >> (k - j - 1) & 1, 1)
+
+            # TODO: feed-forward rice implementation
+            if not adaptive:
+                continue
+
+            # Update rice param
+            if scale > resp:
+                scale = 0
+                k += 1
+                m = 1 << k
+                continue
+            if scale < -resp and k > 0:
+                scale = 0
+                k -= 1
+                m = 1 << k
+                continue
+            elif scale < -resp:
+                scale = -resp
+
+            update_scale(s, m, &scale)
+
+    if overflow:
+        return -1
+    _sink_flush(&sink)
+    return bit_i
+
 ############
 # Decoding #
 ############
@@ -130,9 +259,10 @@ cdef char _get_bit(const unsigned char[:] bits, Py_ssize_t *bit_i):
     return (bits[byte_i] >> real_bit_i) & 1
 
 @cython.cdivision(True)
-def decode_frame(cython.integral[:] frame, const unsigned char[:] bits, short k, short resp, short adaptive, long starting_i = 0):
+def decode_frame_bitwise(cython.integral[:] frame, const unsigned char[:] bits, short k, short resp, short adaptive, long starting_i = 0):
     """
     Decodes a whole residual frame from the given bitstream
+    Reference implementation reading one bit at a time, see decode_frame
     :param frame: numpy array where the decoded frame should be stored
     :param bits: bitaray from which the frame should be restored
     :param k: starting rice parameter
@@ -183,6 +313,195 @@ def decode_frame(cython.integral[:] frame, const unsigned char[:] bits, short k,
 
     return bit_i - starting_i
 
+cdef extern from *:
+    """
+    #include <string.h>
+    #if defined(_MSC_VER)
+    #include <intrin.h>
+    static inline int straw_clz64(unsigned long long x) {
+        unsigned long i;
+        _BitScanReverse64(&i, x);
+        return 63 - (int) i;
+    }
+    #define straw_bswap64(x) _byteswap_uint64(x)
+    #else
+    #define straw_clz64(x) __builtin_clzll(x)
+    #define straw_bswap64(x) __builtin_bswap64(x)
+    #endif
+    static inline unsigned long long straw_load_be64(const unsigned char *p) {
+        unsigned long long x;
+        memcpy(&x, p, 8);
+    #if defined(__BYTE_ORDER__) && __BYTE_ORDER__ == __ORDER_BIG_ENDIAN__
+        return x;
+    #else
+        return straw_bswap64(x);
+    #endif
+    }
+    """
+    int straw_clz64(unsigned long long x) nogil
+    unsigned long long straw_load_be64(const unsigned char *p) nogil
+
+cdef struct _BitSource:
+    const unsigned char *bits
+    Py_ssize_t nbytes
+    Py_ssize_t byte_i
+    unsigned long long buf
+    int nbuf
+    bint eof
+
+cdef inline void _source_refill(_BitSource *src) noexcept nogil:
+    """
+    Refill the bit buffer to at least 56 bits, the valid bits are kept aligned to the most significant bit
+    :param src: bit source
+    :return: None
+    """
+    cdef int n
+    if src.byte_i + 8 <= src.nbytes:
+        # the bits of a partially consumed byte are ORed again in the next refill at the same position
+        src.buf |= straw_load_be64(src.bits + src.byte_i) >> src.nbuf
+        n = (63 - src.nbuf) >> 3
+        src.byte_i += n
+        src.nbuf += n << 3
+        return
+    while src.nbuf <= 56 and src.byte_i < src.nbytes:
+        src.buf |= (<unsigned long long> src.bits[src.byte_i]) << (56 - src.nbuf)
+        src.byte_i += 1
+        src.nbuf += 8
+
+cdef inline void _source_skip(_BitSource *src, int length) noexcept nogil:
+    """
+    Drop at most nbuf bits from the bit buffer
+    :param src: bit source
+    :param length: number of bits
+    :return: None
+    """
+    if length >= 64:
+        src.buf = 0
+    else:
+        src.buf <<= length
+    src.nbuf -= length
+
+cdef inline long _source_unary(_BitSource *src) noexcept nogil:
+    """
+    Read a unary coded quotient, the zero run is counted with count-leading-zeros
+    Sets the eof flag if the stream ends before the terminating one
+    :param src: bit source
+    :return: number of zeros before the terminating one
+    """
+    cdef long q = 0
+    cdef int z = straw_clz64(src.buf) if src.buf != 0 else 64
+    while z >= src.nbuf:
+        # only zeros in the valid part of the buffer
+        q += src.nbuf
+        src.buf = 0
+        src.nbuf = 0
+        _source_refill(src)
+        if src.nbuf == 0:
+            src.eof = True
+            return q
+        z = straw_clz64(src.buf) if src.buf != 0 else 64
+    _source_skip(src, z + 1)
+    return q + z
+
+cdef inline unsigned long long _source_get(_BitSource *src, int length) noexcept nogil:
+    """
+    Read at most 56 bits from the bit buffer
+    Sets the eof flag if the stream ends before length bits
+    :param src: bit source
+    :param length: number of bits
+    :return: unsigned value of the bits
+    """
+    cdef unsigned long long val
+    if length == 0:
+        return 0
+    if src.nbuf < length:
+        _source_refill(src)
+        if src.nbuf < length:
+            src.eof = True
+            return 0
+    val = src.buf >> (64 - length)
+    _source_skip(src, length)
+    return val
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def decode_frame(cython.integral[:] frame, const unsigned char[:] bits, short k, short resp, short adaptive, long starting_i = 0):
+    """
+    Decodes a whole residual frame from the given bitstream
+    Keeps a 64-bit bit buffer refilled from the byte stream and finds the unary runs with count-leading-zeros,
+    bit-exact with decode_frame_bitwise
+    The GIL is released while decoding, frames can be decoded concurrently by multiple threads
+    :param frame: numpy array where the decoded frame should be stored
+    :param bits: bitaray from which the frame should be restored
+    :param k: starting rice parameter
+    :param resp: rice parameter responsiveness
+    :param adaptive: if True do adaptive rice coding by varying the parameter
+    :param starting_i: bit position of the frame in the bitstream
+    :return: number of bits read
+    """
+    cdef short j
+    cdef char bit
+    cdef long m, q, s
+    cdef Py_ssize_t x_max, i
+    cdef Py_ssize_t bits_read = 0
+    cdef _BitSource src
+    x_max = frame.shape[0]
+    m = 1 << k
+
+    src.bits = &bits[0] if bits.shape[0] > 0 else NULL
+    src.nbytes = bits.shape[0]
+    src.byte_i = starting_i >> 3
+    src.buf = 0
+    src.nbuf = 0
+    src.eof = src.byte_i > src.nbytes
+    if not src.eof:
+        _source_refill(&src)
+        _source_get(&src, starting_i & 7)
+
+    cdef short scale = 0
+
+    with nogil:
+        for i in range(x_max):
+            q = _source_unary(&src)
+            bits_read += q + 1 + k
+
+            if k < 31:
+                s = (q << k) | <long> _source_get(&src, k)
+            else:
+                # mirror the reference arithmetic for the degenerate parameters
+                s = m * q
+                for j in range(k):
+                    bit = <char> _source_get(&src, 1)
+                    s |= bit << (k - j - 1)
+
+            if src.eof:
+                break
+
+            frame[i] = _deinterleave(s)
+
+            if not adaptive:
+                continue
+
+            if scale > resp:
+                scale = 0
+                k += 1
+                m = 1 << k
+                continue
+            if scale < -resp and k > 0:
+                scale = 0
+                k -= 1
+                m = 1 << k
+                continue
+            elif scale < -resp:
+                scale = -resp
+
+            update_scale(s, m, &scale)
+
+    if src.eof:
+        raise ValueError("Unexpected end of the residual bitstream")
+    return bits_read
+
 ###########
 # Utility #
 ###########
@@ -50,7 +50,9 @@ class Ricer:
         data = np.zeros(frame.nbytes, dtype=np.uint8)
         bits = ext_rice.encode_frame(data, frame, bps, self.responsiveness, adaptive=self.adaptive)
         if bits == -1:
-            return bitarray(buffer=frame)  # This will later fail in Encoder._ensure_compression
+            # This will later fail in Encoder._ensure_compression
+            # the bitarray owns a copy, the frame can be a view of a shared memory block that is closed later
+            return bitarray(buffer=frame.tobytes())
         else:
             return bitarray(buffer=data)[:bits]
 
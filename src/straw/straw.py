@@ -4,21 +4,57 @@ from pathlib import Path
 
 import numpy as np
 
-from straw import Encoder, Decoder
+from straw import Encoder, Decoder, batch
+from straw.compute import ParallelCompute
+from straw.io import Formatter
+from straw.io.params import StreamParams
+from straw.static import Default
 
 
-def read(file) -> (np.array, int):
+def read(file, start: int = None, stop: int = None, jobs: int = 1) -> (np.array, int):
     """
     Read a Straw file (compatibility function to soundfile.read)
+    When start or stop is given, only the frames covering the requested samples are decoded
     :param file: Input file
+    :param start: first sample to read, negative values count from the end
+    :param stop: sample after the last one to read, None means until the end of the file
+    :param jobs: number of processes decoding the frames
     :return: soundfile compatible array and samplerate
     """
-    d = Decoder()
-    d.load_file(Path(file))
+    d = Decoder(jobs=jobs)
+    d.load_file(Path(file), start=start, stop=stop)
     d.decode()
     return d.get_soundfile_compatible_array(), d.get_params().sample_rate
 
 
+def blocks(file, blocksize: int = Default.block_size, overlap: int = 0, start: int = None, stop: int = None,
+           cache_frames: int = 16):
+    """
+    Read a Straw file in blocks (compatibility function to soundfile.blocks)
+    The frames are decoded on demand, only the frames of the current block are kept in memory
+    When the whole file is read, the md5 checksum is verified after the last block
+    :param file: Input file
+    :param blocksize: number of samples in a block, the last block can be shorter
+    :param overlap: number of samples shared by two consecutive blocks
+    :param start: first sample to read, negative values count from the end
+    :param stop: sample after the last one to read, None means until the end of the file
+    :param cache_frames: number of decoded frames kept in memory
+    :return: generator of soundfile compatible arrays
+    """
+    with Decoder(lazy=True, cache_frames=cache_frames) as d:
+        d.load_file(Path(file))
+        yield from d.blocks(blocksize, overlap=overlap, start=start, stop=stop)
+
+
+def info(file) -> StreamParams:
+    """
+    Read only the metadata of a Straw file, no frames are parsed
+    :param file: Input file
+    :return: stream params
+    """
+    return Formatter().load(Path(file), show_progress=False, metadata_only=True).get_params()
+
+
 def write(file, data: np.array, samplerate: int):
     """
     Write a Straw file (compatibility function to soundfile.write)
@@ -39,15 +75,11 @@ def _encode(args):
     :param args: command line args (see straw/__main__.py)
     :return: None
     """
-    e = Encoder(flac_mode=False,
-                dynamic_blocksize=args.dynamic_blocksize,
-                min_block_size=args.min_frame_size,
-                max_block_size=args.max_frame_size,
-                framing_treshold=args.framing_treshold,
-                framing_resolution=args.framing_resolution,
-                responsiveness=args.rice_responsiveness,
-                parallelize=args.parallel,
-                show_progress=False)
+    e = Encoder(**_encoder_options(args))
+
+    if args.window_frames or args.pipeline:
+        _stream_encode(e, args)
+        return
 
     if not args.silent:
         print(f"Loading file ... ", end="", file=sys.stderr)
@@ -80,13 +112,61 @@ def _encode(args):
         print(f"Total processing time: {stop - start:.3f} s", file=sys.stderr)
 
 
+def _encoder_options(args) -> dict:
+    """
+    Encoder keyword arguments from the command line args
+    :param args: command line args (see straw/__main__.py)
+    :return: dict of Encoder arguments
+    """
+    # --fast-decode caps the LPC order unless it is set explicitly
+    lpc_order = args.lpc_order or (Default.fast_decode_lpc_order if args.decode_penalty else Default.lpc_order)
+    return dict(flac_mode=False,
+                shift_limit=args.shift_limit,
+                dynamic_blocksize=args.dynamic_blocksize,
+                min_block_size=args.min_frame_size,
+                max_block_size=args.max_frame_size,
+                framing_treshold=args.framing_treshold,
+                framing_resolution=args.framing_resolution,
+                responsiveness=args.rice_responsiveness,
+                lpc_order=lpc_order,
+                select_lpc_order=args.select_lpc_order,
+                decode_penalty=args.decode_penalty,
+                parallelize=args.parallel and args.jobs > 1,
+                show_progress=False)
+
+
+def _stream_encode(e: Encoder, args):
+    """
+    Internal streaming encoder call from the executable script, the input is encoded in windows of frames
+    :param e: configured encoder
+    :param args: command line args (see straw/__main__.py)
+    :return: None
+    """
+    window_frames = args.window_frames or Default.window_frames
+    if not args.silent:
+        mode = "pipelined " if args.pipeline else ""
+        print(f"Encoding in {mode}windows of {window_frames} frames ... ", end="", file=sys.stderr)
+    start = timeit.default_timer()
+    e.stream_file(Path(args.input_files[0]), args.output_file, window_frames=window_frames,
+                  pipelined=args.pipeline)
+    stop = timeit.default_timer()
+    if not args.silent:
+        print(f"DONE in {stop - start:.3f} s", file=sys.stderr)
+
+    if args.verbose and not args.silent:
+        e.print_stats(args.output_file, stream=sys.stderr)
+
+
 def _decode(args):
     """
     Internal decoder call from the executable script
     :param args: command line args (see straw/__main__.py)
     :return: None
     """
-    d = Decoder(flac_mode=False, show_progress=False)
+    d = Decoder(flac_mode=False, show_progress=False, jobs=args.jobs if args.parallel else 1)
+    if d.jobs == 1 or args.pipeline:
+        _stream_decode(d, args)
+        return
 
     if not args.silent:
         print(f"Loading file ... ", end="", file=sys.stderr)
@@ -119,6 +199,77 @@ def _decode(args):
         print(f"Total processing time: {stop - start:.3f} s", file=sys.stderr)
 
 
+def _stream_decode(d: Decoder, args):
+    """
+    Internal streaming decoder call from the executable script, the frames are decoded and written block by block
+    :param d: configured decoder
+    :param args: command line args (see straw/__main__.py)
+    :return: None
+    """
+    blocksize = Default.pipeline_window if args.pipeline else Default.block_size
+    if not args.silent:
+        mode = "pipelined " if args.pipeline else ""
+        print(f"Decoding in {mode}blocks of {blocksize} samples ... ", end="", file=sys.stderr)
+    start = timeit.default_timer()
+    d.stream_file(Path(args.input_files[0]), args.output_file, blocksize=blocksize, pipelined=args.pipeline)
+    stop = timeit.default_timer()
+    if not args.silent:
+        print(f"DONE in {stop - start:.3f} s", file=sys.stderr)
+
+
+def _is_batch(args) -> bool:
+    """
+    The batch mode is used for an output directory, multiple inputs, directories and glob patterns
+    :param args: command line args (see straw/__main__.py)
+    :return: True if the inputs should be coded as a batch
+    """
+    return args.output_dir is not None or len(args.input_files) > 1 or not Path(args.input_files[0]).is_file()
+
+
+def _batch(args):
+    """
+    Internal batch call from the executable script, the files are coded in parallel by the shared worker pool
+    :param args: command line args (see straw/__main__.py)
+    :return: None
+    """
+    input_suffix, output_suffix = (".straw", ".wav") if args.decode else (".wav", ".straw")
+    files = batch.expand_inputs(args.input_files, input_suffix)
+    output_dir = Path(args.output_dir) if args.output_dir is not None else None
+    planned = batch.plan(files, output_suffix, output_dir)
+
+    start = timeit.default_timer()
+    results = []
+    for result in batch.code_files(planned, decode=args.decode, encoder_options=_encoder_options(args),
+                                   window_frames=args.window_frames, overwrite=args.overwrite,
+                                   jobs=args.jobs if args.parallel else 1):
+        results.append(result)
+        if not args.silent and (args.verbose or not result.skipped):
+            print(result, file=sys.stderr)
+    if not args.silent:
+        batch.print_summary(results, timeit.default_timer() - start, stream=sys.stderr)
+
+    failed = sum(result.error is not None for result in results)
+    if failed:
+        raise RuntimeError(f"{failed} of {len(results)} files failed")
+
+
+def _info(args):
+    """
+    Internal info call from the executable script, prints the metadata of each input file
+    :param args: command line args (see straw/__main__.py)
+    :return: None
+    """
+    for input_file in args.input_files:
+        params = info(input_file)
+        print(f"{input_file}:")
+        print(f"  Sample rate:     {params.sample_rate} Hz")
+        print(f"  Channels:        {params.channels}")
+        print(f"  Bits per sample: {params.bits_per_sample}")
+        print(f"  Total samples:   {params.total_samples} ({params.total_samples / params.sample_rate:.3f} s)")
+        print(f"  Total frames:    {params.total_frames}")
+        print(f"  md5:             {params.md5.hex()}")
+
+
 def run(args):
     """
     Run the encoder/decoder
@@ -127,7 +278,14 @@ def run(args):
     """
     if args.verbose and not args.silent:
         print(args, file=sys.stderr)
-    if not args.decode:
+    # the worker pool is started by the first parallel call and shared by the encoder and the decoder
+    ParallelCompute.get_instance().set_cpus(args.jobs)
+    ParallelCompute.get_instance().set_backend(args.backend)
+    if args.info:
+        _info(args)
+    elif _is_batch(args):
+        _batch(args)
+    elif not args.decode:
         _encode(args)
     else:
         _decode(args)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import soundfile
+
+from straw import batch
+
+
+class Batch(unittest.TestCase):
+    sr = 16000
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        rng = np.random.default_rng(5)
+        t = np.arange(self.sr // 2)
+        self.signals = {}
+        for i, name in enumerate(("a.wav", "b.wav", "sub/c.wav")):
+            path = self.root / "in" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            base = 3000 * np.sin(2 * np.pi * 220 * (i + 1) * t / self.sr)
+            signal = np.stack([base + rng.normal(0, 50, t.shape[0]) for _ in range(2)], axis=1).astype(np.int16)
+            soundfile.write(path, signal, self.sr, subtype="PCM_16")
+            self.signals[name] = signal
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _code(self, inputs: list, decode: bool = False, jobs: int = 1, **kwargs) -> list:
+        suffixes = (".straw", ".wav") if decode else (".wav", ".straw")
+        output_dir = self.root / ("wav" if decode else "straw")
+        planned = batch.plan(batch.expand_inputs(inputs, suffixes[0]), suffixes[1], output_dir)
+        return list(batch.code_files(planned, decode=decode, jobs=jobs, **kwargs))
+
+    def test_roundtrip(self):
+        for jobs in (1, 2):
+            encoded = self._code([str(self.root / "in")], jobs=jobs, overwrite=True)
+            self.assertEqual(len(encoded), 3)
+            self.assertTrue(all(r.error is None and 0 < r.ratio for r in encoded))
+            decoded = self._code([str(self.root / "straw")], decode=True, jobs=jobs, overwrite=True)
+            self.assertEqual(len(decoded), 3)
+            for name, signal in self.signals.items():
+                data, _ = soundfile.read(self.root / "wav" / name, dtype="int16")
+                self.assertTrue(np.array_equal(data, signal), name)
+
+    def test_glob_and_up_to_date(self):
+        results = self._code([str(self.root / "in" / "*.wav")])
+        self.assertListEqual(sorted(r.output_file.name for r in results), ["a.straw", "b.straw"])
+        self.assertTrue(all(r.skipped for r in self._code([str(self.root / "in" / "*.wav")])))
+
+        # a modified input is coded again
+        a = self.root / "in" / "a.wav"
+        os.utime(a, (a.stat().st_atime, a.stat().st_mtime + 10))
+        self.assertListEqual([r.skipped for r in self._code([str(a)])], [False])
+        self.assertRaises(FileNotFoundError, batch.expand_inputs, [str(self.root / "*.flac")], ".wav")
+
+    def test_failure(self):
+        broken = self.root / "in" / "broken.wav"
+        broken.write_bytes(b"not a wav file")
+        results = {r.input_file.name: r for r in self._code([str(self.root / "in")], jobs=2)}
+        self.assertIsNotNone(results["broken.wav"].error)
+        self.assertIsNone(results["a.wav"].error)
+        self.assertEqual(sorted(p.name for p in (self.root / "straw").iterdir()), ["a.straw", "b.straw", "sub"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+import numpy as np
+from bitarray import bitarray
+from bitarray.util import int2ba
+
+from straw.io.ext_bits import BitReader, BitWriter
+
+
+class BitReading(unittest.TestCase):
+    values = [-100, 5, 2047, -2048, 0, -1]
+
+    def _stream(self) -> bytes:
+        sec = bitarray()
+        sec += int2ba(5, length=3)
+        sec += int2ba(-3, length=7, signed=True)
+        sec += int2ba((1 << 35) + 7, length=36)
+        sec.frombytes(chr(300).encode("utf-8"))
+        sec.frombytes(chr(70000).encode("utf-8"))
+        for val in self.values:
+            sec += int2ba(val, length=12, signed=True)
+        sec.frombytes(b"straw")
+        sec.fill()
+        return sec.tobytes()
+
+    def test_scalar_fields(self):
+        reader = BitReader(self._stream())
+        self.assertEqual(reader.get_int(length=3), 5)
+        self.assertEqual(reader.get_int(length=7, signed=True), -3)
+        self.assertEqual(reader.get_int(length=36), (1 << 35) + 7)
+        self.assertEqual(reader.get_int_utf8(), 300)
+        self.assertEqual(reader.get_int_utf8(), 70000)
+
+    def test_arrays_and_bytes(self):
+        reader = BitReader(self._stream())
+        reader.advance(3 + 7 + 36 + 16 + 32)
+        for dtype in (np.int8, np.int16, np.int32, np.int64):
+            pos = reader.get_pos()
+            target = np.zeros(len(self.values), dtype=dtype)
+            reader.get_ints(target, length=12, signed=True)
+            if dtype == np.int8:
+                self.assertListEqual(target.tolist(), np.asarray(self.values).astype(np.int8).tolist())
+            else:
+                self.assertListEqual(target.tolist(), self.values)
+            reader.set_pos(pos)
+
+        reader.advance(12 * len(self.values))
+        self.assertEqual(reader.get_bytes(length=40), b"straw")
+        self.assertFalse(reader.is_eof())
+        reader.skip_padding()
+        self.assertTrue(reader.is_eof())
+
+    def test_eof(self):
+        reader = BitReader(b"\xff")
+        reader.get_int(length=6)
+        self.assertRaises(ValueError, reader.get_int, 3)
+        self.assertRaises(ValueError, reader.get_ints, np.zeros(2, dtype=np.int16), 2)
+
+
+class BitWriting(unittest.TestCase):
+    values = np.asarray([-100, 5, 2047, -2048, 0, -1], dtype=np.int16)
+
+    def test_identical_to_bitarray(self):
+        expected = bitarray()
+        expected += int2ba(5, length=3)
+        expected += int2ba(-3, length=7, signed=True)
+        expected += int2ba((1 << 35) + 7, length=36)
+        for val in (0, 127, 300, 0xd800, 70000):
+            expected.frombytes(chr(val).encode("utf-8", "surrogatepass"))
+        for val in self.values:
+            expected += int2ba(int(val), length=12, signed=True)
+        expected.frombytes(b"straw")
+        expected += bitarray("1011001")
+        expected_len = len(expected)
+        expected.fill()
+
+        sec = BitWriter(capacity=1)
+        sec.write_int(5, length=3)
+        sec.write_int(-3, length=7, signed=True)
+        sec.write_int((1 << 35) + 7, length=36)
+        for val in (0, 127, 300, 0xd800, 70000):
+            sec.write_utf8(val)
+        sec.write_ints(self.values, length=12, signed=True)
+        sec.write_bytes(b"straw")
+        sec.write_bits(bitarray("1011001"), 7)
+        self.assertEqual(len(sec), expected_len)
+        sec.fill()
+
+        self.assertEqual(sec.tobytes(), expected.tobytes())
+        self.assertEqual(bytes(memoryview(sec)), expected.tobytes())
+
+    def test_roundtrip(self):
+        sec = BitWriter()
+        sec.write_int(0, length=8)
+        sec.write_int(1)
+        sec.write_utf8((1 << 36) - 1)
+        sec.write_ints(self.values, length=16, signed=True)
+        sec.fill()
+        sec.set_int(0, 0xab, length=8)
+
+        reader = BitReader(sec)
+        self.assertEqual(reader.get_int(length=8), 0xab)
+        self.assertEqual(reader.get_int(), 1)
+        self.assertEqual(reader.get_int_utf8(), (1 << 36) - 1)
+        target = np.zeros_like(self.values)
+        reader.get_ints(target, length=16, signed=True)
+        self.assertListEqual(target.tolist(), self.values.tolist())
+
+    def test_overflow(self):
+        sec = BitWriter()
+        self.assertRaises(OverflowError, sec.write_int, 8, 3)
+        self.assertRaises(OverflowError, sec.write_int, -5, 3, True)
+        self.assertRaises(OverflowError, sec.write_ints, self.values, 8, True)
+
+
+if __name__ == '__main__':
+    unittest.main()
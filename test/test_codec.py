@@ -0,0 +1,375 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import soundfile
+
+import straw
+from straw.compute import ParallelCompute
+from straw.lpc import steps
+from straw.static import SubframeType
+
+
+class ParallelDecoding(unittest.TestCase):
+    sr = 48000
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        t = np.arange(cls.sr * 2)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / cls.sr) + rng.normal(0, 200, t.shape[0])
+        cls.signal = np.stack([base, base * 0.8 + rng.normal(0, 50, t.shape[0])], axis=1).astype(np.int16)
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.file = Path(cls.tmp.name) / "signal.straw"
+        straw.write(cls.file, cls.signal, cls.sr)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_serial(self):
+        data, sr = straw.read(self.file)
+        self.assertEqual(sr, self.sr)
+        self.assertTrue(np.array_equal(data, self.signal))
+
+    def test_parallel(self):
+        data, sr = straw.read(self.file, jobs=2)
+        self.assertEqual(sr, self.sr)
+        self.assertTrue(np.array_equal(data, self.signal))
+
+    def test_parallel_data(self):
+        serial = straw.Decoder(jobs=1)
+        serial.load_file(self.file)
+        parallel = straw.Decoder(jobs=3)
+        parallel.load_file(self.file)
+        columns = ["seq", "channel", "frame_type", "bps"]
+        self.assertListEqual(serial.get_data()[columns].fillna(-1).values.tolist(),
+                             parallel.get_data()[columns].fillna(-1).values.tolist())
+
+
+class RandomAccess(unittest.TestCase):
+    sr = 48000
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(1)
+        t = np.arange(cls.sr * 4)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / cls.sr) + rng.normal(0, 200, t.shape[0])
+        # delayed channels for the shift correction
+        cls.signal = np.stack([np.roll(base, i * 2) + rng.normal(0, 30, t.shape[0]) for i in range(4)],
+                              axis=1).astype(np.int16)
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.file = Path(cls.tmp.name) / "signal.straw"
+        straw.write(cls.file, cls.signal, cls.sr)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_ranges(self):
+        n = self.signal.shape[0]
+        for start, stop in ((0, 10), (70000, 140000), (n - 5, None), (-100, -50), (None, 3), (5, 5), (n, n + 10)):
+            data, _ = straw.read(self.file, start=start, stop=stop)
+            self.assertTrue(np.array_equal(data, self.signal[start:stop]), f"range {start}:{stop}")
+
+    def test_parallel_range(self):
+        data, _ = straw.read(self.file, start=100000, stop=120000, jobs=2)
+        self.assertTrue(np.array_equal(data, self.signal[100000:120000]))
+
+    def test_decodes_covering_frames_only(self):
+        d = straw.Decoder()
+        d.load_file(self.file, start=150000, stop=150100)
+        self.assertLessEqual(d.get_data()["seq"].nunique(), 2)
+        d.decode()
+        self.assertTrue(np.array_equal(d.get_soundfile_compatible_array(), self.signal[150000:150100]))
+
+    def test_lazy(self):
+        n = self.signal.shape[0]
+        with straw.Decoder(lazy=True, cache_frames=2) as d:
+            d.load_file(self.file)
+            self.assertRaises(RuntimeError, d.decode)
+            for start, stop in ((0, 10), (70000, 140000), (n - 5, None), (-100, -50), (5, 5), (None, None)):
+                self.assertTrue(np.array_equal(d.read(start, stop), self.signal[start:stop]), f"range {start}:{stop}")
+            self.assertLessEqual(len(d._frame_cache), 2)
+        self.assertRaises(RuntimeError, d.read, 0, 10)
+
+    def test_blocks(self):
+        blocks = list(straw.blocks(self.file, blocksize=10000))
+        self.assertTrue(all(block.shape == (10000, 4) for block in blocks[:-1]))
+        self.assertTrue(np.array_equal(np.concatenate(blocks), self.signal))
+
+        pos = 1000
+        for block in straw.blocks(self.file, blocksize=5000, overlap=1000, start=pos, stop=-3000):
+            self.assertTrue(np.array_equal(block, self.signal[pos:pos + block.shape[0]]))
+            pos += block.shape[0] - 1000
+        self.assertEqual(pos + 1000, self.signal.shape[0] - 3000)
+
+    def test_stream_file(self):
+        output = Path(self.tmp.name) / "signal.wav"
+        straw.Decoder().stream_file(self.file, output)
+        data, sr = soundfile.read(output, dtype="int16", always_2d=True)
+        self.assertEqual(sr, self.sr)
+        self.assertTrue(np.array_equal(data, self.signal))
+
+    def test_stream_file_pipelined(self):
+        output = Path(self.tmp.name) / "pipelined.wav"
+        # the blocks are cut on the frame borders, a block holds at least one frame
+        for jobs, blocksize in ((1, 50000), (2, 50000), (1, 1000)):
+            straw.Decoder(jobs=jobs).stream_file(self.file, output, blocksize=blocksize, pipelined=True)
+            data, _ = soundfile.read(output, dtype="int16", always_2d=True)
+            self.assertTrue(np.array_equal(data, self.signal), f"jobs {jobs}, blocksize {blocksize}")
+
+
+class StreamingEncoding(unittest.TestCase):
+    sr = 48000
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(3)
+        t = np.arange(cls.sr * 2)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / cls.sr) + rng.normal(0, 200, t.shape[0])
+        cls.signal = np.stack([np.roll(base, i * 3) * (1 - 0.2 * i) + 10 * i + rng.normal(0, 30, t.shape[0])
+                               for i in range(4)], axis=1).astype(np.int16)
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.wav = Path(cls.tmp.name) / "signal.wav"
+        soundfile.write(cls.wav, cls.signal, cls.sr, subtype="PCM_16")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _encode(self, streamed: bool, pipelined: bool = False, **kwargs) -> Path:
+        file = Path(self.tmp.name) / f"{'streamed' if streamed else 'loaded'}{'_pipelined' if pipelined else ''}.straw"
+        e = straw.Encoder(parallelize=False, **kwargs)
+        if streamed:
+            e.stream_file(self.wav, file, window_frames=3, pipelined=pipelined)
+        else:
+            e.load_file(self.wav)
+            e.encode()
+            e.save_file(file)
+        return file
+
+    def test_identical_to_loaded(self):
+        for corrections in (("shift", "bias"), ("gain", "shift", "bias")):
+            loaded = self._encode(False, do_corrections=corrections).read_bytes()
+            streamed = self._encode(True, do_corrections=corrections).read_bytes()
+            self.assertEqual(loaded, streamed, corrections)
+
+    def test_pipelined(self):
+        for dynamic in (False, True):
+            streamed = self._encode(True, dynamic_blocksize=dynamic).read_bytes()
+            pipelined = self._encode(True, pipelined=True, dynamic_blocksize=dynamic).read_bytes()
+            self.assertEqual(streamed, pipelined, f"dynamic {dynamic}")
+
+    def test_dynamic_blocksize(self):
+        data, _ = straw.read(self._encode(True, dynamic_blocksize=True))
+        self.assertTrue(np.array_equal(data, self.signal))
+
+
+class FrameTables(unittest.TestCase):
+    sr = 48000
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(4)
+        t = np.arange(cls.sr)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / cls.sr) + rng.normal(0, 200, t.shape[0])
+        cls.signal = np.stack([np.roll(base, i) + rng.normal(0, 30, t.shape[0]) for i in range(4)],
+                              axis=1).astype(np.int16)
+
+    def _encode(self, parallelize: bool, **kwargs) -> straw.Encoder:
+        e = straw.Encoder(parallelize=parallelize, **kwargs)
+        e.load_data(self.signal.copy(), self.sr, 16)
+        e.encode()
+        return e
+
+    def test_parallel_identical(self):
+        streams = []
+        for parallelize in (False, True):
+            with tempfile.TemporaryFile() as f:
+                self._encode(parallelize).save_file(f)
+                f.seek(0)
+                streams.append(f.read())
+        self.assertEqual(streams[0], streams[1])
+
+    def test_serialized_by_workers(self):
+        e = self._encode(True)
+        self.assertTrue(all(payload is not None for payload in e._table.payloads))
+        streams = []
+        for _ in range(2):
+            with tempfile.TemporaryFile() as f:
+                e.save_file(f)
+                f.seek(0)
+                streams.append(f.read())
+            # the writer serializes the frames itself
+            e._table.payloads = [None] * e._table.frames
+        self.assertEqual(streams[0], streams[1])
+
+    def test_thread_backend(self):
+        compute = ParallelCompute.get_instance()
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            straw.write(file, self.signal, self.sr)
+            compute.set_backend("threads")
+            try:
+                with tempfile.TemporaryFile() as f:
+                    self._encode(True).save_file(f)
+                    f.seek(0)
+                    self.assertEqual(f.read(), file.read_bytes())
+                data, _ = straw.read(file, jobs=2)
+            finally:
+                compute.set_backend("processes")
+        self.assertTrue(np.array_equal(data, self.signal))
+
+    def test_decode_penalty(self):
+        sizes, cycles = [], []
+        for kwargs in ({}, {"decode_penalty": 0.05, "lpc_order": 8}):
+            e = self._encode(False, **kwargs)
+            self.assertLessEqual(e._table.order.max(), kwargs.get("lpc_order", 32))
+            cycles.append(e._table.decode_cycles())
+            with tempfile.TemporaryDirectory() as tmp:
+                file = Path(tmp) / "signal.straw"
+                e.save_file(file)
+                sizes.append(file.stat().st_size)
+                data, _ = straw.read(file)
+            self.assertTrue(np.array_equal(data, self.signal))
+        self.assertLess(cycles[1], cycles[0])
+        self.assertLess(sizes[1], sizes[0] * 1.05)
+        self.assertRaises(ValueError, straw.Encoder, decode_penalty=-1)
+        self.assertRaises(ValueError, straw.Encoder, lpc_order=33)
+
+    def test_raw_summary(self):
+        # noise gains so little from LPC that the penalty stores every frame raw
+        signal = np.random.default_rng(5).normal(0, 3000, (40000, 2)).astype(np.int16)
+        e = straw.Encoder(parallelize=False, decode_penalty=0.5)
+        e.load_data(signal.copy(), self.sr, 16)
+        e.encode()
+        self.assertTrue((e._table.frame_type == SubframeType.RAW).all())
+        _, _, bits, lpc_frames, coefficients, _ = e._summary()
+        self.assertEqual(bits, 0)
+        self.assertEqual((lpc_frames, coefficients), (0, 0))
+
+
+    def test_lpc_summary(self):
+        # the prediction has no gain for full-scale white noise, only the frames of the tone store coefficients
+        noise = np.random.default_rng(5).integers(-32768, 32768, (4 * 4096, 4)).astype(np.int16)
+        signal = np.concatenate((self.signal[:4 * 4096 + 64], noise))
+        e = straw.Encoder(parallelize=False)
+        e.load_data(signal.copy(), self.sr, 16)
+        e.encode()
+        _, _, _, lpc_frames, coefficients, _ = e._summary()
+        self.assertEqual(lpc_frames, 4)
+        self.assertEqual(coefficients, e._table.order[:4].sum())
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            e.save_file(file)
+            stats = io.StringIO()
+            e.print_stats(file, stats)
+        self.assertIn(f"mean LPC order: {coefficients / 4:.2f}", stats.getvalue())
+
+    def test_debug_view(self):
+        e = self._encode(False)
+        df = e.get_data()
+        frames = -(-self.signal.shape[0] // 4096)
+        self.assertEqual(len(df), frames * 4)
+        self.assertListEqual(df["seq"].tolist(), list(range(frames)) * 4)
+        self.assertTrue(np.array_equal(e.sample_frame(1)["frame"], self.signal[4096:8192, 0] - e.get_params().bias[0]))
+        self.assertEqual(df["stream_len"].sum(), e._table.stream_len.sum())
+
+    def test_decode_odd_channels(self):
+        # the mid-side decorrelation of 3 channels is not iterated
+        signal = np.ascontiguousarray(self.signal[:, :3])
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            straw.write(file, signal, self.sr)
+            for jobs in (1, 2):
+                data, _ = straw.read(file, jobs=jobs)
+                self.assertTrue(np.array_equal(data, signal), f"jobs {jobs}")
+
+    def test_subframe_coefficients(self):
+        # the format allows every LPC subframe to store its own coefficients
+        e = self._encode(False)
+        table, i = e._table, 2
+        self.assertTrue((table.frame_type[i] == SubframeType.LPC_COMMON).all())
+        table.frame_type[i] = SubframeType.LPC
+        qlp, precision, shift = steps.quantize_lpc_cython(steps.compute_lpc(table.frame(i, 1), 8), 12)
+        table.set_qlp(i, qlp, precision, shift, channel=1)
+        for c in range(table.channels):
+            qlp, _, shift = table.get_lpc(i, c)
+            steps.predict_compute_residual(table.frame(i, c), qlp, shift, out=table.residual(i, c, warmup=True))
+            table.k[i, c] = e._ricer.guess_parameter(table.residual(i, c))
+            table.streams[i * table.channels + c] = e._ricer.frame_to_bitstream(table.residual(i, c), table.k[i, c])
+            table.stream_len[i, c] = len(table.streams[i * table.channels + c])
+        table.payloads[i] = None
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            e.save_file(file)
+            for jobs in (1, 2):
+                data, _ = straw.read(file, jobs=jobs)
+                self.assertTrue(np.array_equal(data, self.signal), f"jobs {jobs}")
+
+    def test_raw_fallback(self):
+        # the prediction has no gain for some channels of noise, the whole frame is stored raw
+        signal = np.random.default_rng(15).normal(0, 1000, (4101, 2)).astype(np.int16)
+        e = straw.Encoder(parallelize=False)
+        e.load_data(signal.copy(), self.sr, 16)
+        e.encode()
+        frame_types = e._table.frame_type
+        self.assertTrue(((frame_types == SubframeType.LPC_COMMON).all(axis=1) |
+                         (frame_types != SubframeType.LPC_COMMON).all(axis=1)).all())
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            e.save_file(file)
+            data, _ = straw.read(file)
+        self.assertTrue(np.array_equal(data, signal))
+
+    def test_common_without_coefficients(self):
+        e = self._encode(False)
+        e._table.frame_type[2, 0] = SubframeType.RAW
+        e._table.payloads[2] = None
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            e.save_file(file)
+            self.assertRaisesRegex(ValueError, "precedes the LPC coefficients", straw.read, file)
+
+    def test_full_scale_square(self):
+        # the residuals of low orders and their mid-side transform exceed 16 bits
+        t = np.arange(20000)
+        square = (np.sign(np.sin(2 * np.pi * 1000 * t / self.sr)) * 32767).astype(np.int16)
+        signal = np.stack([square, square], axis=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            straw.write(file, signal.copy(), self.sr)
+            data, _ = straw.read(file)
+        self.assertTrue(np.array_equal(data, signal))
+
+
+class Metadata(unittest.TestCase):
+    sr = 44100
+
+    def test_info(self):
+        rng = np.random.default_rng(2)
+        t = np.arange(self.sr)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / self.sr)
+        signal = np.stack([base + rng.normal(0, 100, t.shape[0]) for _ in range(2)], axis=1).astype(np.int16)
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Path(tmp) / "signal.straw"
+            straw.write(file, signal, self.sr)
+            params = straw.info(file)
+            reader = straw.io.Formatter().load(file, show_progress=False, metadata_only=True)
+
+        self.assertEqual(params.sample_rate, self.sr)
+        self.assertEqual(params.channels, 2)
+        self.assertEqual(params.bits_per_sample, 16)
+        self.assertEqual(params.total_samples, self.sr)
+        self.assertIsNone(reader.get_data())
+        self.assertFalse(hasattr(reader, "_samplebuffer"))
+
+
+if __name__ == '__main__':
+    unittest.main()
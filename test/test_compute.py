@@ -0,0 +1,115 @@
+import unittest
+
+import threading
+import time
+
+from straw.compute import Consumer, ParallelCompute, prefetch
+
+
+def _square(x, offset=0):
+    return x * x + offset
+
+
+def _interval(x):
+    start = time.perf_counter()
+    time.sleep(0.02)
+    return start, time.perf_counter()
+
+
+def _inverse(x):
+    return 1 / x
+
+
+def _nested(x):
+    return sum(ParallelCompute.get_instance().map_list(list(range(x)), _square))
+
+
+class WorkerPool(unittest.TestCase):
+    compute = ParallelCompute.get_instance()
+
+    def tearDown(self):
+        self.compute.set_cpus(None)
+        self.compute.set_backend("processes")
+
+    def test_reused(self):
+        pool = self.compute.get_pool()
+        self.assertListEqual(self.compute.map_list(list(range(10)), _square, offset=1), [x * x + 1 for x in range(10)])
+        self.assertIs(self.compute.get_pool(), pool)
+
+    def test_resized_and_restarted(self):
+        self.compute.set_cpus(2)
+        pool = self.compute.get_pool()
+        self.compute.set_cpus(3)
+        self.assertIsNot(self.compute.get_pool(), pool)
+        self.compute.shutdown()
+        self.assertIsNone(self.compute._pool)
+        self.assertListEqual(self.compute.map_list([1, 2, 3], _square), [1, 4, 9])
+
+    def test_limited_processes(self):
+        self.compute.set_cpus(3)
+        for backend in self.compute.backends:
+            self.compute.set_backend(backend)
+            pool = self.compute.get_pool()
+            intervals = self.compute.map_list(list(range(6)), _interval, processes=1)
+            # the tasks ran one at a time on the shared pool
+            self.assertIs(self.compute.get_pool(), pool)
+            self.assertTrue(all(end <= start for (_, end), (start, _) in zip(intervals, intervals[1:])), backend)
+            self.assertListEqual(sorted(self.compute.map_unordered(list(range(5)), _square, processes=2)),
+                                 [x * x for x in range(5)])
+        self.assertRaises(ZeroDivisionError, self.compute.map_list, [1, 0], _inverse, processes=1)
+
+    def test_threads(self):
+        pool = self.compute.get_pool()
+        self.compute.set_backend("threads")
+        self.assertIsNot(self.compute.get_pool(), pool)
+        self.assertTrue(self.compute.shares_memory)
+        self.assertListEqual(self.compute.map_list(list(range(10)), _square, offset=2), [x * x + 2 for x in range(10)])
+        self.assertRaises(ValueError, self.compute.set_backend, "fibers")
+
+    def test_nested_serial(self):
+        expected = [sum(y * y for y in range(x)) for x in range(6)]
+        for backend in self.compute.backends:
+            self.compute.set_backend(backend)
+            self.compute.set_cpus(2)
+            self.assertListEqual(self.compute.map_list(list(range(6)), _nested), expected, backend)
+
+
+class Pipeline(unittest.TestCase):
+    def test_prefetch(self):
+        threads = []
+
+        def produce():
+            for i in range(20):
+                threads.append(threading.current_thread())
+                yield i
+
+        self.assertListEqual(list(prefetch(produce(), depth=3)), list(range(20)))
+        self.assertNotIn(threading.current_thread(), threads)
+
+        def fail():
+            yield 1
+            raise KeyError("read")
+
+        self.assertRaises(KeyError, list, prefetch(fail()))
+
+    def test_consumer(self):
+        items = []
+        with Consumer(items.append, depth=1) as consumer:
+            for i in range(20):
+                consumer.put(i)
+        self.assertListEqual(items, list(range(20)))
+
+        def fail(item):
+            raise KeyError(item)
+
+        consumer = Consumer(fail, depth=1)
+        for i in range(5):
+            try:
+                consumer.put(i)
+            except KeyError:
+                break
+        self.assertRaises(KeyError, consumer.close)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import straw
+from straw.correctors import ShiftCorrector, estimate_corrections
+from straw.io.params import StreamParams
+
+
+class Shift(unittest.TestCase):
+    @staticmethod
+    def _signal(delays: list, n: int = 100000) -> np.ndarray:
+        rng = np.random.default_rng(6)
+        t = np.arange(n + 20)
+        base = 3000 * np.sin(2 * np.pi * 440 * t / 48000) + rng.normal(0, 300, t.shape[0])
+        return np.stack([np.roll(base, d)[20:] + rng.normal(0, 30, n) for d in delays]).astype(np.int16)
+
+    @staticmethod
+    def _params(signal: np.ndarray) -> StreamParams:
+        params = StreamParams()
+        params.channels, params.total_samples = signal.shape
+        params.alloc_arrays()
+        return params
+
+    def test_lags(self):
+        signal = self._signal([2, 0, 5, 1])
+        params = self._params(signal)
+        ShiftCorrector().apply(signal, params)
+        self.assertEqual(params.leading_channel, 1)
+        self.assertListEqual(params.lags.tolist(), [2, 0, 5, 1])
+        self.assertEqual(len(params.removed_samples_end[2]), 0)
+
+    def test_streamed(self):
+        signal = self._signal([0, 3, 7])
+        params = self._params(signal)
+        ShiftCorrector().apply(signal, params)
+        streamed = self._params(signal)
+        estimate_corrections(lambda: (signal[:, i:i + 7777] for i in range(0, signal.shape[1], 7777)), ("shift",),
+                             streamed)
+        self.assertListEqual(streamed.lags.tolist(), params.lags.tolist())
+
+    def test_limit(self):
+        signal = self._signal([0, 12])
+        params = self._params(signal)
+        ShiftCorrector(limit=ShiftCorrector.max_limit).apply(signal, params)
+        self.assertListEqual(params.lags.tolist(), [0, 12])
+        self.assertRaises(ValueError, ShiftCorrector, ShiftCorrector.max_limit + 1)
+
+        streamed = self._params(signal)
+        estimate_corrections(lambda: iter([signal]), ("shift",), streamed, shift_limit=ShiftCorrector.max_limit)
+        self.assertListEqual(streamed.lags.tolist(), [0, 12])
+
+    def test_encoder_limit(self):
+        signal = np.ascontiguousarray(self._signal([0, 12]).T)
+        for limit, lags in ((None, [0, 8]), (ShiftCorrector.max_limit, [0, 12])):
+            e = straw.Encoder(shift_limit=limit, parallelize=False)
+            e.load_data(signal.copy(), 48000, 16)
+            self.assertListEqual(e.get_params().lags.tolist(), lags, f"limit {limit}")
+            e.encode()
+            with tempfile.TemporaryDirectory() as tmp:
+                file = Path(tmp) / "signal.straw"
+                e.save_file(file)
+                data, _ = straw.read(file)
+            self.assertTrue(np.array_equal(data, signal), f"limit {limit}")
+        self.assertRaises(ValueError, straw.Encoder, shift_limit=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,12 @@ import unittest
 
 import numpy as np
 import pandas as pd
+from scipy.linalg import solve_toeplitz
 
 from straw import lpc
+from straw.codec.encoder import _compute_lpc_table
+from straw.io.frames import FrameTable
+from straw.lpc import steps, ext_lpc
 from straw.static import SubframeType
 from . import resources
 
@@ -40,5 +44,93 @@ class LPCSignalIntegrity(unittest.TestCase):
         self.assertEqual(df.loc[0, "frame_type"], SubframeType.CONSTANT)
 
 
+class BatchedLPC(unittest.TestCase):
+    lpc_order = 20
+    lpc_precision = 12  # bits
+
+    signal, sr = resources.get_signal()
+
+    def test_levinson(self):
+        rng = np.random.default_rng(0)
+        autoc = np.asarray([steps._autocorr(s, self.lpc_order + 1)
+                            for s in np.cumsum(rng.normal(size=(8, 1024)), axis=1)])
+        autoc[3] = 0
+        lpc_c = np.empty((8, self.lpc_order))
+        singular = ext_lpc.levinson(autoc, lpc_c)
+        self.assertListEqual(singular.tolist(), [i == 3 for i in range(8)])
+        for i in (0, 1, 2, 4, 5, 6, 7):
+            expected = solve_toeplitz(autoc[i, :-1], autoc[i, 1:], check_finite=False)
+            self.assertTrue(np.array_equal(lpc_c[i], expected))
+
+    def test_table(self):
+        signal = np.tile(self.signal, 8)
+        samples = np.stack([signal, np.roll(signal, 3) // 2, -signal]).astype(np.int32)
+        samples[1, 1000:1500] = 0
+        limits = [0, 500, 1000, 1500, 2000, 2300, samples.shape[1]]
+        table = FrameTable(samples, np.zeros(3), limits, max_order=self.lpc_order)
+        selected = np.ones(table.frames, dtype=bool)
+        selected[1] = False
+
+        lpc_c, orders = _compute_lpc_table(table, self.lpc_order, selected=selected)
+        self.assertListEqual(orders.tolist(), [self.lpc_order, 0, 0, self.lpc_order, self.lpc_order, self.lpc_order])
+        for i in np.flatnonzero(orders):
+            expected = steps.compute_lpc([table.frame(i, c) for c in range(table.channels)], self.lpc_order)
+            np.testing.assert_allclose(lpc_c[i], expected, rtol=1e-9, atol=1e-12)
+            self.assertTrue(np.array_equal(steps.quantize_lpc_cython(lpc_c[i], self.lpc_precision)[0],
+                                           steps.quantize_lpc_cython(expected, self.lpc_precision)[0]))
+
+        lpc_c, orders = _compute_lpc_table(table, 32, selected=selected, bits_per_sample=16,
+                                           precision=self.lpc_precision)
+        self.assertTrue(np.all((orders[[0, 3, 4, 5]] >= 1) & (orders[[0, 3, 4, 5]] <= 32)))
+        self.assertFalse(orders[[1, 2]].any())
+        for i in np.flatnonzero(orders):
+            expected = steps.compute_lpc([table.frame(i, c) for c in range(table.channels)], orders[i])
+            np.testing.assert_allclose(lpc_c[i, :orders[i]], expected, rtol=1e-9, atol=1e-12)
+            self.assertFalse(lpc_c[i, orders[i]:].any())
+
+    def test_order_selection(self):
+        # an order 2 process gains nothing from higher orders
+        rng = np.random.default_rng(0)
+        noise = rng.normal(0, 100, 4096)
+        signal = np.zeros(4096)
+        for n in range(2, 4096):
+            signal[n] = 1.6 * signal[n - 1] - 0.8 * signal[n - 2] + noise[n]
+        autoc = steps._autocorr(signal / (1 << 15), 33)[None]
+        errors = np.empty((1, 32))
+        ext_lpc.levinson_errors(autoc, errors)
+        self.assertTrue(np.all(np.diff(errors[0]) <= 0))
+        bits = steps.estimate_lpc_bits(errors, np.asarray([4096]), 1, 16, self.lpc_precision)
+        self.assertEqual(np.argmin(bits[0]) + 1, 2)
+
+
+class SpecializedKernels(unittest.TestCase):
+    def test_identical_to_generic(self):
+        rng = np.random.default_rng(0)
+        for dtype, amplitude in ((np.int16, 1 << 14), (np.int32, 1 << 23)):
+            for order in list(range(1, 33)) + [40]:
+                qlp = rng.integers(-2048, 2048, order).astype(np.int32)
+                # strided frames, like the channels of the samplebuffer
+                samples = rng.integers(-amplitude, amplitude, (777, 2)).astype(dtype)
+                specialized, generic = np.zeros_like(samples), np.zeros_like(samples)
+                ext_lpc.compute_residual(samples[:, 1], specialized[:, 1], qlp, 11)
+                ext_lpc.compute_residual_generic(samples[:, 1], generic[:, 1], qlp, 11)
+                self.assertTrue(np.array_equal(specialized, generic), f"residual {dtype.__name__} order {order}")
+
+                # small coefficients restore 16-bit frames with 32-bit sums
+                for coefficients in (qlp, qlp // 64):
+                    specialized, generic = samples.copy(), samples.copy()
+                    ext_lpc.restore_signal(specialized[:, 1], coefficients, 11)
+                    ext_lpc.restore_signal_generic(generic[:, 1], coefficients, 11)
+                    self.assertTrue(np.array_equal(specialized, generic), f"restore {dtype.__name__} order {order}")
+
+    def test_roundtrip(self):
+        signal = np.tile(LPCSignalIntegrity.signal, 4).astype(np.int16)
+        for order in (3, 8, 13, 20, 32):
+            qlp, _, shift = steps.quantize_lpc_cython(steps.compute_lpc(signal, order), 12)
+            residual = signal.copy()
+            ext_lpc.compute_residual(signal, residual, qlp, shift)
+            ext_lpc.restore_signal(residual, qlp, shift)
+            self.assertTrue(np.array_equal(residual, signal), f"order {order}")
+
 if __name__ == '__main__':
     unittest.main()
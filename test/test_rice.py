@@ -47,5 +47,68 @@ class Rice(unittest.TestCase):
 
         self.assertListEqual(frame.tolist(), decoded.tolist())
 
+    def _assert_same_encoding(self, frame, k, buffer_size):
+        reference = np.zeros(buffer_size, dtype=np.uint8)
+        bits = np.zeros(buffer_size, dtype=np.uint8)
+        reference_len = rice.ext_rice.encode_frame_bitwise(reference, frame, k, self.r.responsiveness, True)
+        bits_len = rice.ext_rice.encode_frame(bits, frame, k, self.r.responsiveness, True)
+        self.assertEqual(reference_len, bits_len)
+        if bits_len != -1:
+            self.assertEqual(reference.tobytes(), bits.tobytes())
+
+    def test_kernels_identical(self):
+        frames = [resources.get_signal()[0], resources.get_problematic_residual1(),
+                  resources.get_problematic_residual2()]
+        for frame in frames:
+            for k in (0, self.k, 7, 15):
+                self._assert_same_encoding(frame, k, frame.nbytes)
+                self._assert_same_encoding(frame, k, frame.nbytes * 4)
+
+    def test_kernels_identical_random(self):
+        rng = np.random.default_rng(0)
+        for scale in (1, 30, 1000, 20000):
+            frame = np.clip(rng.laplace(0, scale, 4096), -32768, 32767).astype(np.int16)
+            self._assert_same_encoding(frame, int(self.r.guess_parameter(frame)), frame.nbytes * 2)
+
+    def _assert_same_decoding(self, frame, k, adaptive, offset):
+        buffer = np.zeros(frame.nbytes * 8, dtype=np.uint8)
+        bits_len = rice.ext_rice.encode_frame(buffer, frame, k, self.r.responsiveness, adaptive)
+        if bits_len == -1:
+            return
+        # Place the frame at an unaligned position, followed by unrelated data
+        stream = np.packbits(np.concatenate([np.ones(offset, dtype=np.uint8), np.unpackbits(buffer)[:bits_len],
+                                             np.ones(70, dtype=np.uint8)]))
+
+        reference = np.zeros_like(frame)
+        decoded = np.zeros_like(frame)
+        reference_len = rice.ext_rice.decode_frame_bitwise(reference, stream, k, self.r.responsiveness, adaptive,
+                                                           offset)
+        decoded_len = rice.ext_rice.decode_frame(decoded, stream, k, self.r.responsiveness, adaptive, offset)
+        self.assertEqual(reference_len, bits_len)
+        self.assertEqual(decoded_len, bits_len)
+        self.assertListEqual(reference.tolist(), frame.tolist())
+        self.assertListEqual(decoded.tolist(), frame.tolist())
+
+    def test_decoders_identical(self):
+        frames = [resources.get_signal()[0], resources.get_problematic_residual1(),
+                  resources.get_problematic_residual2()]
+        for frame in frames:
+            for k, offset in ((0, 0), (self.k, 3), (7, 13), (15, 7)):
+                self._assert_same_decoding(frame, k, True, offset)
+                self._assert_same_decoding(frame, k, False, offset)
+
+    def test_decoders_identical_random(self):
+        rng = np.random.default_rng(0)
+        for scale in (1, 30, 1000, 20000):
+            frame = np.clip(rng.laplace(0, scale, 4096), -32768, 32767).astype(np.int16)
+            self._assert_same_decoding(frame, int(self.r.guess_parameter(frame)), True, int(rng.integers(0, 8)))
+
+    def test_decode_truncated(self):
+        frame = resources.get_problematic_residual1()
+        buffer = np.zeros(frame.nbytes * 8, dtype=np.uint8)
+        bits_len = rice.ext_rice.encode_frame(buffer, frame, self.k, self.r.responsiveness, True)
+        self.assertRaises(ValueError, rice.ext_rice.decode_frame, np.zeros_like(frame), buffer[:bits_len // 8 - 1],
+                          self.k, self.r.responsiveness, True)
+
 if __name__ == '__main__':
     unittest.main()